@@ -0,0 +1,158 @@
+"""Shared helpers for the benchmark scripts in this folder.
+
+Each benchmark produces a dictionary mapping benchmark names to
+timing statistics, in seconds. Results can be saved as JSON and
+compared against a stored baseline; a benchmark whose median time
+exceeds the baseline median by more than the threshold (a fraction,
+e.g. 0.2 for 20%) is reported as a regression, and the script exits
+with a nonzero status.
+
+"""
+from __future__ import print_function
+import json
+import os
+import platform
+import re
+import sys
+import time
+
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def console_scripts():
+    """Console scripts declared in setup.py.
+
+    Returns
+    -------
+     scripts : dict
+        Maps script name to (module, function).
+
+    """
+    with open(os.path.join(REPO_DIR, 'setup.py'), 'r') as f:
+        setup = f.read()
+
+    entry_re = r"'(\w+)\s*=\s*([\w.]+)\s*:\s*(\w+)'"
+    return {name: (module, func)
+            for name, module, func in re.findall(entry_re, setup)}
+
+
+def add_arguments(parser, repeat=5):
+    """Add the arguments common to all benchmark scripts."""
+    parser.add_argument('-o', '--output', type=str,
+                        help='Save results to this JSON file')
+    parser.add_argument('-b', '--baseline', type=str,
+                        help='Compare results against this JSON file')
+    parser.add_argument('-t', '--threshold', type=float, default=0.2,
+                        help='Allowed slowdown relative to the baseline'
+                        ' (default 0.2, i.e. 20%%)')
+    parser.add_argument('-r', '--repeat', type=int, default=repeat,
+                        help='Number of timed runs per benchmark')
+    parser.add_argument('-k', '--select', type=str,
+                        help='Only run benchmarks whose name contains this string')
+
+
+def timeit(func, repeat=5, number=1):
+    """Time func, which is called number times per run.
+
+    Returns
+    -------
+     stats : dict
+        Median and minimum time per call, in seconds, and the number
+        of runs.
+
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter() if hasattr(time, 'perf_counter') else time.time()
+        for _ in range(number):
+            func()
+        stop = time.perf_counter() if hasattr(time, 'perf_counter') else time.time()
+        times.append((stop - start) / number)
+
+    return summarize(times)
+
+
+def summarize(times):
+    times = sorted(times)
+    n = len(times)
+    if n % 2:
+        median = times[n // 2]
+    else:
+        median = 0.5 * (times[n // 2 - 1] + times[n // 2])
+
+    return {'median': median, 'min': times[0], 'repeat': n}
+
+
+def compare(results, baseline, threshold):
+    """Regressions relative to a baseline.
+
+    Returns
+    -------
+     regressions : list
+        (name, median, baseline median) for each benchmark more than
+        threshold slower than the baseline. Benchmarks missing from
+        the baseline are ignored.
+
+    """
+    regressions = []
+    for name, stats in sorted(results.items()):
+        if name not in baseline:
+            continue
+        base = baseline[name]['median']
+        if stats['median'] > (1. + threshold) * base:
+            regressions.append((name, stats['median'], base))
+
+    return regressions
+
+
+def report(results, args):
+    """Print, save, and compare results as directed by args.
+
+    Returns
+    -------
+     status : int
+        Exit status: 1 if there are regressions, 0 otherwise.
+
+    """
+    for name, stats in sorted(results.items()):
+        print('{0:<50s} {1:10.3f} ms (min {2:.3f} ms)'.format(
+            name, 1000. * stats['median'], 1000. * stats['min']))
+
+    if args.output:
+        document = {
+            'meta': {
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')
+            },
+            'results': results
+        }
+        with open(args.output, 'w') as f:
+            json.dump(document, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)['results']
+
+        regressions = compare(results, baseline, args.threshold)
+        for name, median, base in regressions:
+            msg = 'REGRESSION {0:s}: {1:.3f} ms vs. baseline {2:.3f} ms'
+            print(msg.format(name, 1000. * median, 1000. * base))
+        if regressions:
+            return 1
+
+    return 0
+
+
+def select(benchmarks, args):
+    """Benchmarks (a dict keyed by name) matching args.select."""
+    if not args.select:
+        return benchmarks
+    return {k: v for k, v in benchmarks.items() if args.select in k}
+
+
+def setup_path():
+    """Make the homebrew_calc in this repository importable."""
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
@@ -0,0 +1,62 @@
+"""Cold-start import time of each console script.
+
+Each run starts a fresh interpreter and times importing the module
+and function behind a console script (as declared in setup.py), which
+is what the user waits for before the script does anything. Also
+reports which heavy dependencies (cvxpy, scipy) the import pulled in.
+
+Usage:
+  python benchmarks/import_time.py -o import_time.json
+  python benchmarks/import_time.py -b import_time.json -t 0.25
+
+"""
+from __future__ import print_function
+import argparse
+import json
+import subprocess
+import sys
+from harness import REPO_DIR, add_arguments, console_scripts, report, select, summarize
+
+
+HEAVY_MODULES = ('cvxpy', 'scipy')
+
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+from {module:s} import {func:s}
+elapsed = time.perf_counter() - start
+heavy = sorted(set(m.split('.')[0] for m in sys.modules) & set({heavy!r}))
+print(json.dumps({{'elapsed': elapsed, 'heavy': heavy}}))
+'''
+
+
+def time_import(module, func, repeat):
+    code = PROBE.format(module=module, func=func, heavy=HEAVY_MODULES)
+    times = []
+    heavy = []
+    for _ in range(repeat):
+        out = subprocess.check_output([sys.executable, '-c', code], cwd=REPO_DIR)
+        probe = json.loads(out.decode('utf-8'))
+        times.append(probe['elapsed'])
+        heavy = probe['heavy']
+
+    return summarize(times), heavy
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    results = {}
+    for name, (module, func) in sorted(select(console_scripts(), args).items()):
+        stats, heavy = time_import(module, func, args.repeat)
+        results['import:' + name] = stats
+        if heavy:
+            print('{0:s} imports {1:s}'.format(name, ', '.join(heavy)))
+
+    return report(results, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""Hot paths of water_composition on synthetic workloads.
+
+Times get_targets, salt_additions, mash_ph, balance_eq, and the full
+water_composition.execute, varying the length of the grain bill, the
+number of candidate waters, and the number of minerals with
+constraints. Workloads are generated from a fixed seed, so runs are
+comparable across machines and commits. Timings are steady state: the
+process-wide caches (unit parser, catalog, water model, compiled salt
+optimizer, charge table) are warmed up before timing, but the on-disk
+solution cache is bypassed, so every salt_additions call solves.
+Stages run quiet, so nothing is formatted or printed.
+
+Usage:
+  python benchmarks/water.py -o water.json
+  python benchmarks/water.py -b water.json -t 0.25 -k salt_additions
+
+"""
+from __future__ import print_function
+import argparse
+import os
+import sys
+import numpy as np
+from harness import add_arguments, report, select, setup_path, timeit
+
+setup_path()
+from homebrew_calc import water_composition
+from homebrew_calc.batch import default_config
+from homebrew_calc.ph_model import get_charge_table
+from homebrew_calc.units import get_unit_parser
+
+
+GRAIN_BILLS = (2, 8, 32)
+WATERS = (1, 64, 1024)
+CONSTRAINTS = (0, 3, 6)
+
+# Mineral constraints, of which the first few are used.
+MINERAL_CONSTRAINTS = (
+    ('calcium', {'minimum': 50, 'maximum': 200}),
+    ('sulfate', {'minimum': 50, 'maximum': 500}),
+    ('chloride', {'minimum': 50, 'maximum': 200}),
+    ('sodium', {'maximum': 100}),
+    ('magnesium', {'maximum': 40}),
+    ('alkalinity', {'maximum': 250})
+)
+
+# Specialty malts added, in turn, to a Maris Otter base.
+SPECIALTY_MALTS = (
+    'Crystal 40L', 'Munich', 'Chocolate Malt', 'American Wheat Malt',
+    'CaraRed', 'Victory Malt', 'Crystal 120L', 'German Pilsner',
+    'Acidulated Malt', 'Roast Barley', 'Honey Malt', 'Vienna'
+)
+
+SEED = 2016
+
+
+def make_config(num_waters, seed=SEED):
+    """Bundled configuration, with num_waters candidate waters: distilled
+    water, and random municipal water reports.
+
+    """
+    config = default_config()
+    config['unit_parser'] = get_unit_parser(config.get('units', None))
+    config['Solution Cache'] = False
+
+    rng = np.random.RandomState(seed)
+    high = {'calcium': 150., 'magnesium': 40., 'sulfate': 250.,
+            'sodium': 80., 'chloride': 150., 'alkalinity': 300.}
+    waters = {'distilled': config['water']['water']['distilled']}
+    for i in range(num_waters - 1):
+        report = {k: round(float(rng.uniform(0.05, 1.) * v), 1)
+                  for (k, v) in sorted(high.items())}
+        report['pH'] = round(float(rng.uniform(6.5, 8.5)), 2)
+        waters['report{0:04d}'.format(i)] = report
+
+    config['water'] = dict(config['water'], water=waters)
+    return config
+
+
+def make_recipe(num_malts=8, num_constraints=None):
+    """Recipe with num_malts grist components and, unless None, the
+    first num_constraints mineral constraints.
+
+    """
+    malts = [{'name': 'Maris Otter', 'mass': '9 pounds'}]
+    for i in range(num_malts - 1):
+        malts.append({'name': SPECIALTY_MALTS[i % len(SPECIALTY_MALTS)],
+                      'mass': '{0:d} ounces'.format(2 + i % 7)})
+
+    profile = {
+        'saltAdditions': {'Food-grade Chalk': '0 grams'},
+        'target': {'calcium': 60, 'sulfate': 80, 'chloride': 90,
+                   'residualAlkalinity': -20}
+    }
+    if num_constraints is not None:
+        profile['mineralConstraints'] = dict(MINERAL_CONSTRAINTS[:num_constraints])
+
+    return {
+        'Malt': malts,
+        'Mash Water Volume': '{0:.06f} gallons'.format(0.3 * num_malts + 3.),
+        'Original Gravity': 1.055,
+        'Water Profile': profile
+    }
+
+
+def benchmarks():
+    """Benchmark setup functions, keyed by name. Each returns the
+    function to time.
+
+    """
+    def get_targets(num_waters, num_constraints):
+        config = make_config(num_waters)
+        recipe_config = make_recipe(num_constraints=num_constraints)
+        return lambda: water_composition.get_targets(config, recipe_config)
+
+    def salt_additions(num_waters, num_constraints):
+        config = make_config(num_waters)
+        recipe_config = make_recipe(num_constraints=num_constraints)
+        return lambda: water_composition.salt_additions(config, recipe_config, quiet=True)
+
+    def mash_ph(num_malts):
+        config, recipe_config = mash_setup(num_malts)
+        return lambda: water_composition.mash_ph(config, recipe_config, quiet=True)
+
+    def balance_eq(num_malts):
+        config, recipe_config = mash_setup(num_malts)
+        this_dir = os.path.dirname(water_composition.__file__)
+        data = get_charge_table(os.path.join(this_dir, 'resources',
+                                             config['water']['files']['mmole']))
+        return lambda: water_composition.balance_eq(5.4, data, config, recipe_config)
+
+    def execute(num_malts, num_waters):
+        config = make_config(num_waters)
+        recipe_config = make_recipe(num_malts)
+        return lambda: water_composition.execute(config, dict(recipe_config), quiet=True)
+
+    def mash_setup(num_malts):
+        config = make_config(1)
+        recipe_config = make_recipe(num_malts)
+        water_composition.salt_additions(config, recipe_config, quiet=True)
+        return config, recipe_config
+
+    out = {}
+    for w in WATERS:
+        for c in CONSTRAINTS:
+            suffix = '[waters={0:d},constraints={1:d}]'.format(w, c)
+            out['get_targets' + suffix] = (get_targets, (w, c))
+            out['salt_additions' + suffix] = (salt_additions, (w, c))
+
+    for m in GRAIN_BILLS:
+        suffix = '[malts={0:d}]'.format(m)
+        out['mash_ph' + suffix] = (mash_ph, (m,))
+        out['balance_eq' + suffix] = (balance_eq, (m,))
+        for w in WATERS:
+            out['execute[malts={0:d},waters={1:d}]'.format(m, w)] = (execute, (m, w))
+
+    return out
+
+
+def calibrate(func, target=0.05):
+    """Number of calls per timed run for a run to take about target
+    seconds (after a warm-up call).
+
+    """
+    stats = timeit(func, repeat=1, number=1)
+    return max(1, int(target / max(stats['min'], 1e-9)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    results = {}
+    for name, (setup, params) in sorted(select(benchmarks(), args).items()):
+        func = setup(*params)
+        number = calibrate(func)
+        results[name] = timeit(func, repeat=args.repeat, number=number)
+
+    return report(results, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,3 +3,14 @@ from .water_composition import *
 from .hop_composition import *
 from .yeast_composition import *
 from .brew_day import *
+from .catalog import *
+from .units import *
+from .ph_model import *
+from .salt_optimizer import *
+from .batch import *
+from .water_model import *
+from .mash_thermal import *
+from .results import *
+from .report import *
+from .calibration import *
+from .pipeline import *
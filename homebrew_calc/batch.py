@@ -0,0 +1,252 @@
+from __future__ import print_function
+from collections import namedtuple
+import copy
+import json
+import os
+import traceback
+import uuid
+
+
+BatchResult = namedtuple('BatchResult', [
+    'index', 'recipe', 'recipe_config', 'result', 'output', 'error'
+])
+BatchResult.__doc__ = """Outcome of one recipe of a batch.
+
+ index : int
+    Position of the recipe in the batch.
+ recipe : str or dict
+    The recipe as given (file name or recipe dictionary).
+ recipe_config : dict or None
+    The recipe, with the fields appended by water_composition; None
+    if it failed.
+ result : WaterResult or None
+    Result of water_composition (see
+    water_composition.water_result); None if it failed.
+ output : str
+    Report of the result (see report.render), if requested, else
+    the empty string.
+ error : str or None
+    Traceback, if the recipe failed.
+
+"""
+
+
+def water_batch_main():
+    """Entry point for water_batch command line script.
+
+    Returns the exit status: 1 if any recipe failed, else 0.
+
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('recipes', type=str, nargs='+',
+                        help='Recipe JSON files, or directories of them')
+    parser.add_argument('-o', '--output', type=str,
+                        help='Output directory, where recipes keep their paths relative'
+                        ' to the directory containing them all (default: print summaries only)')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='Number of worker processes (default: one per core)')
+    parser.add_argument('--chunk-size', type=int, default=1,
+                        help='Recipes per task (default: 1)')
+    parser.add_argument('--unordered', action='store_true',
+                        help='Report recipes as they finish')
+
+    args = parser.parse_args()
+    recipes = []
+    for path in args.recipes:
+        if os.path.isdir(path):
+            recipes.extend(sorted(os.path.join(path, f) for f in os.listdir(path)
+                                  if f.endswith('.json')))
+        else:
+            recipes.append(path)
+
+    if args.output and not os.path.isdir(args.output):
+        os.makedirs(args.output)
+
+    names = _output_names(recipes)
+    failures = 0
+    for res in water_batch(recipes, max_workers=args.jobs, chunksize=args.chunk_size,
+                           ordered=not args.unordered, render=False):
+        if res.error is not None:
+            failures += 1
+            print('{0:s}: failed'.format(res.recipe))
+            print(res.error)
+            continue
+
+        print('{0:s}: {1:s}'.format(res.recipe, _summary(res.recipe_config)))
+        if args.output:
+            output_file = os.path.join(args.output, names[res.recipe])
+            if not os.path.isdir(os.path.dirname(output_file)):
+                os.makedirs(os.path.dirname(output_file))
+            with open(output_file, 'w') as outfile:
+                json.dump(res.recipe_config, outfile, indent=2, sort_keys=True)
+
+    return 1 if failures else 0
+
+
+def water_batch(recipes, config=None, max_workers=None, chunksize=1, ordered=True,
+                render=True):
+    """Run water_composition on many recipes, in a pool of processes.
+
+    Each worker process sets up the configuration once, on its first
+    chunk: the unit parser, ingredient catalog, water model, charge
+    table, and compiled salt optimizers are shared by all the recipes
+    it processes. Recipes are scheduled in chunks of chunksize, and a
+    recipe that fails does not affect the others. Without
+    concurrent.futures (Python 2 without the futures backport), the
+    chunks run one after the other in this process. Nothing is
+    printed.
+
+    Parameters
+    ----------
+     recipes : array_like
+        Recipes, either as JSON file names or as dictionaries.
+     config : dict or None
+        Configuration, as for water_composition.execute (without
+        'Output'). Defaults to the configuration bundled with
+        homebrew_calc, as used by the water_composition script.
+     max_workers : int or None
+        Number of worker processes. Defaults to the number of cores.
+     chunksize : int
+        Number of recipes per task. Larger chunks mean less
+        scheduling overhead but coarser load balancing. Defaults to 1.
+     ordered : bool
+        If True (the default), results are yielded in the order of
+        recipes; otherwise, as soon as they are ready.
+     render : bool
+        Whether to render the report of each recipe (the output of
+        the BatchResult). Defaults to True.
+
+    Yields
+    ------
+     result : BatchResult
+        One per recipe.
+
+    """
+    if config is None:
+        config = default_config()
+
+    recipes = list(recipes)
+    chunks = [[(i, recipes[i]) for i in range(i, min(i + chunksize, len(recipes)))]
+              for i in range(0, len(recipes), max(chunksize, 1))]
+    # Identifies the configuration of this batch, so workers set it up
+    # only once, however many of its chunks they run.
+    token = uuid.uuid4().hex
+
+    try:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+    except ImportError:
+        for chunk in chunks:
+            for res in _run_chunk(token, config, chunk, render):
+                yield res
+        return
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_run_chunk, token, config, chunk, render)
+                   for chunk in chunks]
+        for future in (futures if ordered else as_completed(futures)):
+            for res in future.result():
+                yield res
+
+
+def default_config():
+    """Configuration bundled with homebrew_calc, with the malt and
+    water configurations, as used by the water_composition script
+    and by water_batch.
+
+    """
+    this_dir, this_filename = os.path.split(__file__)
+    resources = os.path.join(this_dir, 'resources')
+    config = json.load(open(os.path.join(resources, 'homebrew.json'), 'r'))
+    config['water'] = json.load(open(os.path.join(resources, config['files']['water']), 'r'))
+    config['malt'] = json.load(open(os.path.join(resources, config['files']['malt']), 'r'))
+    if 'units' in config['files']:
+        config['units'] = os.path.join(resources, config['files']['units'])
+
+    return config
+
+
+def _output_names(recipes):
+    """Output file name of each recipe file: its path relative to the
+    deepest directory containing all of them, so recipes with the same
+    name in different directories do not overwrite each other.
+
+    """
+    paths = [os.path.abspath(recipe) for recipe in recipes]
+    common = os.path.commonprefix([os.path.dirname(path) + os.sep for path in paths])
+    common = common[:common.rfind(os.sep) + 1]
+    return dict((recipe, os.path.relpath(path, common))
+                for recipe, path in zip(recipes, paths))
+
+
+# (token, config) of the batch this process last set up.
+_worker_config = (None, None)
+
+
+def _setup_worker(token, config):
+    """Configuration of the batch identified by token, set up on first
+    use in this process.
+
+    """
+    from .catalog import get_catalog
+    from .units import get_unit_parser
+    from .water_model import get_water_model
+
+    global _worker_config
+    if _worker_config[0] == token:
+        return _worker_config[1]
+
+    config = dict(config)
+    config.pop('Output', None)
+    config['unit_parser'] = get_unit_parser(config.get('units', None))
+    get_catalog(config)
+    get_water_model(config)
+    _worker_config = (token, config)
+    return config
+
+
+def _run_chunk(token, config, chunk, render=True):
+    config = _setup_worker(token, config)
+    return [_run_recipe(config, i, recipe, render) for (i, recipe) in chunk]
+
+
+def _run_recipe(config, index, recipe, render=True):
+    from .report import render as render_report
+    from .water_composition import water_result
+
+    try:
+        if isinstance(recipe, dict):
+            recipe_config = copy.deepcopy(recipe)
+        else:
+            with open(recipe, 'r') as f:
+                recipe_config = json.load(f)
+
+        # Shallow copy: stages add per-recipe entries, like the mineral
+        # profile, but share the unit parser, catalog, etc.
+        result = water_result(dict(config), recipe_config)
+        output = render_report(result) + '\n' if render else ''
+        return BatchResult(index, recipe, _jsonable(recipe_config), result,
+                           output, None)
+    except Exception:
+        return BatchResult(index, recipe, None, None, '', traceback.format_exc())
+
+
+def _jsonable(x):
+    """Convert numpy values appended by the stages to plain Python."""
+    if isinstance(x, dict):
+        return {k: _jsonable(v) for k, v in x.items()}
+    elif isinstance(x, (list, tuple)):
+        return [_jsonable(v) for v in x]
+    elif hasattr(x, 'tolist'):
+        return x.tolist()
+    return x
+
+
+def _summary(recipe_config):
+    parts = []
+    if 'Salts' in recipe_config:
+        parts.append('{0:d} salts'.format(len(recipe_config['Salts'])))
+    if 'Mash pH' in recipe_config:
+        parts.append('mash pH {0:.03f}'.format(recipe_config['Mash pH']))
+    return ', '.join(parts) or 'ok'
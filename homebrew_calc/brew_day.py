@@ -1,9 +1,12 @@
 from __future__ import print_function
 import json
 import os
-import sys
-from unit_parser import unit_parser
+from .units import get_unit_parser
 from .malt_composition import specific_gravity_to_gravity_points
+from .mash_thermal import heat_loss_coefficient, simulate_mash
+from .report import render
+from .results import (BoilResult, BrewDayResult, InfusionMashResult, LauterResult,
+                      MashStepResult, StepMashResult)
 
 
 def main():
@@ -21,45 +24,74 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('recipe', type=str, help='Recipe JSON')
     parser.add_argument('-o', '--output', type=str, help='Output file')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Print nothing')
 
     args = parser.parse_args()
     recipe_config = json.load(open(args.recipe, 'r'))
     if args.output:
         config['Output'] = args.output
 
-    execute(config, recipe_config)
+    execute(config, recipe_config, quiet=args.quiet)
 
 
-def execute(config, recipe_config):
+def execute(config, recipe_config, quiet=False):
+    """ Brew day instructions: mash, lauter, and boil.
+
+    Computes the brew_day_result, prints its report (see
+    report.render) unless quiet, and, if config['Output'] is given,
+    saves the recipe to that file. Returns both config and
+    recipe_config.
+    """
+    result = brew_day_result(config, recipe_config)
+    if not quiet:
+        print(render(result))
+
+    if 'Output' in config:
+        with open(config['Output'], 'w') as outfile:
+            json.dump(recipe_config, outfile, indent=2, sort_keys=True)
+
+    return config, recipe_config
+
+
+def brew_day_result(config, recipe_config):
+    """ Brew day calculations, without printing anything.
+
+    Returns a results.BrewDayResult, with the mash, lauter, and boil
+    results.
+    """
     if 'Mash' not in recipe_config or 'type' not in recipe_config['Mash']:
         raise ValueError('Mash information not provided')
 
-    if 'units' in config:
-        config['unit_parser'] = unit_parser(config['units'])
-    else:
-        config['unit_parser'] = unit_parser()
+    config['unit_parser'] = get_unit_parser(config.get('units', None))
+    profile = get_equipment_profile(config)
 
     if recipe_config['Mash']['type'] == 'Infusion':
-        config, recipe_config = infusion_mash(config, recipe_config)
+        mash = _infusion_mash(profile, recipe_config)
     elif recipe_config['Mash']['type'] == 'Step':
-        config, recipe_config = step_mash(config, recipe_config)
+        mash = _step_mash(profile, recipe_config)
     else:
         raise ValueError('Mash type not supported.')
 
-    print('')
-    config, recipe_config = lauter(config, recipe_config)
-    print('')
-    config, recipe_config = boil(config, recipe_config)
+    return BrewDayResult(mash=mash, lauter=_lauter(profile, recipe_config),
+                         boil=_boil(profile, recipe_config))
 
-    if 'Output' in config:
-        with open(config['Output'], 'w') as outfile:
-            json.dump(recipe_config, outfile, indent=2, sort_keys=True)
 
+def step_mash(config, recipe_config, quiet=False):
+    """ Mash with multiple steps.
+
+    config may be the configuration or its EquipmentProfile (see
+    get_equipment_profile).
+    """
+    result = _step_mash(get_equipment_profile(config), recipe_config)
+    if not quiet:
+        print(render(result))
+
+    return config, recipe_config
 
-def step_mash(config, recipe_config):
-    """ Mash with multiple steps. """
 
-    up = config['unit_parser']
+def _step_mash(profile, recipe_config):
+    up = profile.unit_parser
+    result = StepMashResult(steps=[])
 
     if 'steps' not in recipe_config['Mash']:
         raise ValueError('Steps not specified; exiting.')
@@ -74,9 +106,13 @@ def step_mash(config, recipe_config):
     mash_temp = fahrenheit_to_celsius(first_step['temperature'])
     mash_duration = up.convert(first_step['duration'], 'hours')
 
-    ambient_temp, mwv, gtm, water_density, water_specific_heat, mttm, hlttm, hldt, hlit, mcr, sparge_temp, boiling_temp = get_common_params(config, recipe_config)
+    ambient_temp, mwv, gtm = profile.recipe_params(recipe_config, result.warnings)
+    mttm = profile.mashtun_thermal_mass
+    hldt = profile.kettle_transfer_heat_loss
+    hlit = profile.mashtun_heat_loss
+    boiling_temp = profile.boiling_temperature
 
-    mwtm = mwv * water_density * water_specific_heat # calories per degC
+    mwtm = profile.water_thermal_mass(mwv) # calories per degC
 
     if 'Water Temperature in Kettle' in first_step:
         wtika = fahrenheit_to_celsius(first_step['Water Temperature in Kettle'])
@@ -110,39 +146,15 @@ def step_mash(config, recipe_config):
     else:
         wtitwg = (wtitaa * (mttm + mwtm) + ambient_temp * gtm) / (mttm + mwtm + gtm)
 
-    mtf = wtitwg - mcr * mash_duration
-
-    msg = 'Heat mash water ({0:.2f} gallons) to {1:.1f} degF.'
-    mwv_gal = up.convert(mwv, 'liters', 'gallons')
-    print(msg.format(mwv_gal, celsius_to_fahrenheit(wtik)))
-    if wtika is not None:
-        msg = 'Actual temperature achieved: {0:.1f} degF.'
-        print(msg.format(celsius_to_fahrenheit(wtika)))
-
-    msg = 'After adding to mash tun (before adding grain),'
-    msg += ' temperature is predicted to be {0:.1f} degF.'
-    print(msg.format(celsius_to_fahrenheit(wtit)))
-    msg = 'Allow water to cool to {0:.1f} degF before adding grain.'
-    print(msg.format(celsius_to_fahrenheit(wtita)))
-    if wtitaa is not None:
-        msg = 'Actual temperature: {0:.1f} degF.'
-        print(msg.format(celsius_to_fahrenheit(wtitaa)))
-
-    msg = 'After adding grain and stirring, temperature is'
-    msg += ' predicted to be {0:.1f} degF.'
-    print(msg.format(celsius_to_fahrenheit(wtitwg)))
-
-    msg = 'After {0:.0f} minutes, mash temp is expected to decrease to {1:.1f} degF.'
-    md_min = up.convert(mash_duration, 'hours', 'minutes')
-    print(msg.format(md_min, celsius_to_fahrenheit(mtf)))
-    if mtfa is not None:
-        msg = 'Actual temperature: {0:.1f} degF.'
-        print(msg.format(celsius_to_fahrenheit(mtfa)))
-    else:
-        mtfa = mtf
-
     # Combined thermal mass
     ctm = mttm + mwtm + gtm
+    mhl = profile.mash_heat_loss(ctm, mash_temp, ambient_temp)
+    mtf = mash_cooling(wtitwg, mash_duration, ctm, mhl, ambient_temp)
+
+    _first_step_result(result, up, mwv, wtik, wtika, wtit, wtita, wtitaa, wtitwg,
+                       mash_duration, mtf, mtfa)
+    if mtfa is None:
+        mtfa = mtf
 
     for step in steps[1:]:
         step_temp = fahrenheit_to_celsius(step['temperature'])
@@ -152,62 +164,72 @@ def step_mash(config, recipe_config):
         # mash_temp * ctm - mtfa * ctm = bt * swtm - mash_temp * swtm
         # (mash_temp - mtfa) * ctm = (bt - mash_temp) * swtm
         swtm = ctm * (step_temp - mtfa) / (boiling_temp - step_temp)
-        swv = swtm / (water_specific_heat * water_density)
+        swv = swtm / (profile.water_specific_heat * profile.water_density)
         ctm += swtm
 
-        msg = 'To bring mash up to {0:.1f} degF, add {1:.1f} gallons boiling water.'
-        swv_gal = up.convert(swv, 'liters', 'gallons')
-        print(msg.format(celsius_to_fahrenheit(step_temp), swv_gal))
+        step_result = MashStepResult(temperature=celsius_to_fahrenheit(step_temp),
+                                     infusion_volume=up.convert(swv, 'liters', 'gallons'))
 
         if 'Achieved Mash Temperature' in step:
-            msg = 'Temperature achieved: {0:.1f} degF'
-            print(msg.format(step['Achieved Mash Temperature']))
+            step_result.achieved_temperature = step['Achieved Mash Temperature']
             step_temp = fahrenheit_to_celsius(step['Achieved Mash Temperature'])
 
-        mtf = step_temp - mcr * step_duration
-
-        msg = 'After {0:.0f} minutes, temperature is'
-        msg += ' predicted to drop to {1:.1f} degF.'
-        sd_min = up.convert(step_duration, 'hours', 'minutes')
-        print(msg.format(sd_min, celsius_to_fahrenheit(mtf)))
+        mtf = mash_cooling(step_temp, step_duration, ctm, mhl, ambient_temp)
+        step_result.duration = up.convert(step_duration, 'hours', 'minutes')
+        step_result.final_temperature = celsius_to_fahrenheit(mtf)
 
         if 'Final Mash Temperature' in step:
-            msg = 'Actual temperature: {0:.1f} degF'
-            print(msg.format(step['Final Mash Temperature']))
+            step_result.actual_final_temperature = step['Final Mash Temperature']
             mtfa = fahrenheit_to_celsius(step['Final Mash Temperature'])
         else:
             mtfa = mtf
 
+        result.steps.append(step_result)
+
+    sparge_temp = profile.sparge_temperature
     swtm = ctm * (sparge_temp - mtfa) / (boiling_temp - sparge_temp)
-    swv = swtm / (water_specific_heat * water_density)
+    swv = swtm / (profile.water_specific_heat * profile.water_density)
 
-    msg = 'To mash out at {0:.1f} degF, add {1:.1f} gallons boiling water.'
-    swv_gal = up.convert(swv, 'liters', 'gallons')
-    print(msg.format(celsius_to_fahrenheit(sparge_temp), swv_gal))
+    result.mash_out_temperature = celsius_to_fahrenheit(sparge_temp)
+    result.mash_out_volume = up.convert(swv, 'liters', 'gallons')
+    return result
 
-    return config, recipe_config
 
+def infusion_mash(config, recipe_config, quiet=False):
+    """ Simple infusion mash.
+
+    config may be the configuration or its EquipmentProfile (see
+    get_equipment_profile).
+    """
+    result = _infusion_mash(get_equipment_profile(config), recipe_config)
+    if not quiet:
+        print(render(result))
+
+    return config, recipe_config
 
-def infusion_mash(config, recipe_config):
-    """ Simple infusion mash. """
 
-    up = config['unit_parser']
+def _infusion_mash(profile, recipe_config):
+    up = profile.unit_parser
+    result = InfusionMashResult()
 
     if 'temperature' in recipe_config['Mash']:
         mash_temp = fahrenheit_to_celsius(recipe_config['Mash']['temperature'])
     else:
-        print('Mash temperature not specified.')
-        sys.exit()
+        raise ValueError('Mash temperature not specified.')
 
     if 'duration' in recipe_config['Mash']:
         mash_duration = up.convert(recipe_config['Mash']['duration'], 'hours')
     else:
         mash_duration = 1
-        print('Mash duration not specified, assuming {0:.1f} hours.'.format(mash_duration))
+        result.assume('Mash duration not specified, assuming {0:.1f} hours.'.format(mash_duration))
 
-    ambient_temp, mwv, gtm, water_density, water_specific_heat, mttm, hlttm, hldt, hlit, mcr, sparge_temp, boiling_temp = get_common_params(config, recipe_config)
+    ambient_temp, mwv, gtm = profile.recipe_params(recipe_config, result.warnings)
+    mttm = profile.mashtun_thermal_mass
+    hldt = profile.kettle_transfer_heat_loss
+    hlit = profile.mashtun_heat_loss
+    boiling_temp = profile.boiling_temperature
 
-    mwtm = mwv * water_density * water_specific_heat # calories per degC
+    mwtm = profile.water_thermal_mass(mwv) # calories per degC
 
     if 'Brew Day' in recipe_config and 'Water Temperature in Kettle' in recipe_config['Brew Day']:
         wtika = fahrenheit_to_celsius(recipe_config['Brew Day']['Water Temperature in Kettle'])
@@ -241,42 +263,32 @@ def infusion_mash(config, recipe_config):
     else:
         wtitwg = (wtitaa * (mttm + mwtm) + ambient_temp * gtm) / (mttm + mwtm + gtm)
 
-    mtf = wtitwg - mcr * mash_duration
-
+    mhl = profile.mash_heat_loss(mttm + mwtm + gtm, mash_temp, ambient_temp)
+    mtf = mash_cooling(wtitwg, mash_duration, mttm + mwtm + gtm, mhl, ambient_temp)
 
-    print('Heat mash water ({0:.2f} gallons) to {1:.1f} degF.'.format(up.convert(mwv, 'liters', 'gallons'), celsius_to_fahrenheit(wtik)))
-    if wtika is not None:
-        print('Actual temperature achieved: {0:.1f} degF.'.format(celsius_to_fahrenheit(wtika)))
-
-    print('After adding to mash tun (before adding grain), temperature is predicted to be {0:.1f} degF.'.format(celsius_to_fahrenheit(wtit)))
-    print('Allow water to cool to {0:.1f} degF before adding grain.'.format(celsius_to_fahrenheit(wtita)))
-    if wtitaa is not None:
-        print('Actual temperature: {0:.1f} degF.'.format(celsius_to_fahrenheit(wtitaa)))
-
-    print('After adding grain and stirring, temperature is predicted to be {0:.1f} degF.'.format(celsius_to_fahrenheit(wtitwg)))
-
-    print('After {0:.0f} minutes, mash temp is expected to decrease to {1:.1f} degF.'.format(up.convert(mash_duration, 'hours', 'minutes'), celsius_to_fahrenheit(mtf)))
-    if mtfa is not None:
-        print('Actual temperature: {0:.1f} degF.'.format(celsius_to_fahrenheit(mtfa)))
+    _first_step_result(result, up, mwv, wtik, wtika, wtit, wtita, wtitaa, wtitwg,
+                       mash_duration, mtf, mtfa)
 
     if 'Sparge and Mash-out Water Volume' in recipe_config:
         smwv = up.convert(recipe_config['Sparge and Mash-out Water Volume'], 'gallons')
-        print('Begin heating sparge and mash-out water: {0:.2f} gallons.'.format(smwv))
+        result.sparge_water_volume = smwv
         smwv = up.convert(smwv, 'gallons', 'liters')
+        sparge_temp = profile.sparge_temperature
         if mtfa is None:
             mowtm = (mttm + mwtm + gtm) * (sparge_temp - mtf) / (boiling_temp - sparge_temp)
         else:
             mowtm = (mttm + mwtm + gtm) * (sparge_temp - mtfa) / (boiling_temp - sparge_temp)
 
-        mowv = mowtm / (water_specific_heat * water_density)
+        mowv = mowtm / (profile.water_specific_heat * profile.water_density)
 
         swv = smwv - mowv
-        swtm = swv * water_density * water_specific_heat
-        swt = (hlttm * (sparge_temp - ambient_temp) + swtm * sparge_temp) / swtm
+        swtm = profile.water_thermal_mass(swv)
+        swt = (profile.hot_liquor_tank_thermal_mass * (sparge_temp - ambient_temp) + swtm * sparge_temp) / swtm
 
-        print('When water reaches {0:.1f} degF, transfer {1:.1f} gallons to the hot liquor tank.'.format(celsius_to_fahrenheit(swt), up.convert(swv, 'liters', 'gallons')))
-        print('Bring remaining (mash-out) water, {0:.1f} gallons, to a boil.'.format(up.convert(mowv, 'liters', 'gallons')))
-        print('Add mash-out water to mash, bringing temperature up to {0:.1f} degF.'.format(celsius_to_fahrenheit(sparge_temp)))
+        result.sparge_transfer_temperature = celsius_to_fahrenheit(swt)
+        result.sparge_transfer_volume = up.convert(swv, 'liters', 'gallons')
+        result.mash_out_volume = up.convert(mowv, 'liters', 'gallons')
+        result.mash_out_temperature = celsius_to_fahrenheit(sparge_temp)
 
     if 'Brew Day' not in recipe_config:
         recipe_config['Brew Day'] = {}
@@ -290,21 +302,49 @@ def infusion_mash(config, recipe_config):
     if mtfa is None:
         recipe_config['Brew Day']['Final Mash Temperature'] = celsius_to_fahrenheit(mtf)
 
-    return config, recipe_config
+    return result
 
 
-def lauter(config, recipe_config):
-    """ Collect pre-boil wort. """
+def _first_step_result(result, up, mwv, wtik, wtika, wtit, wtita, wtitaa, wtitwg,
+                       mash_duration, mtf, mtfa):
+    """ Fill in the strike water and first step fields of a MashResult. """
+    result.mash_water_volume = up.convert(mwv, 'liters', 'gallons')
+    result.kettle_temperature = celsius_to_fahrenheit(wtik)
+    result.tun_temperature = celsius_to_fahrenheit(wtit)
+    result.strike_temperature = celsius_to_fahrenheit(wtita)
+    result.mash_temperature = celsius_to_fahrenheit(wtitwg)
+    result.duration = up.convert(mash_duration, 'hours', 'minutes')
+    result.final_temperature = celsius_to_fahrenheit(mtf)
+    if wtika is not None:
+        result.actual_kettle_temperature = celsius_to_fahrenheit(wtika)
+    if wtitaa is not None:
+        result.actual_strike_temperature = celsius_to_fahrenheit(wtitaa)
+    if mtfa is not None:
+        result.actual_final_temperature = celsius_to_fahrenheit(mtfa)
+
+
+def lauter(config, recipe_config, quiet=False):
+    """ Collect pre-boil wort.
+
+    config may be the configuration or its EquipmentProfile (see
+    get_equipment_profile).
+    """
+    result = _lauter(get_equipment_profile(config), recipe_config)
+    if not quiet:
+        print(render(result))
+
+    return config, recipe_config
 
-    up = config['unit_parser']
+
+def _lauter(profile, recipe_config):
+    up = profile.unit_parser
 
     if 'Pre-Boil Volume' not in recipe_config or 'Pre-Boil Gravity' not in recipe_config:
         raise ValueError('Pre-Boil Volume not in config; try running water_composition first.')
 
     pbv = up.convert(recipe_config['Pre-Boil Volume'], 'gallons')
     pbg = recipe_config['Pre-Boil Gravity']
-    print('Collect {0:.2f} gallons of wort.'.format(pbv))
-    print('Pre-boil gravity should be {0:.03f}.'.format(pbg))
+    result = LauterResult(pre_boil_volume=pbv, pre_boil_gravity=pbg)
 
     if 'Brew Day' in recipe_config and 'Pre-Boil Volume' in recipe_config['Brew Day'] and 'Pre-Boil Volume' in recipe_config['Brew Day']:
         apbv = up.convert(recipe_config['Brew Day']['Pre-Boil Volume'], 'gallons')
@@ -315,17 +355,14 @@ def lauter(config, recipe_config):
 
         if 'Brewhouse Efficiency' in recipe_config:
             planned_efficiency = recipe_config['Brewhouse Efficiency']
-        elif 'Brewhouse Efficiency' in config:
-            planned_efficiency = config['Brewhouse Efficiency']
         else:
-            planned_efficiency = 0.7
-
-        print('Actual wort collected during lauter: {0:.2f} gallons.'.format(apbv))
-        print('Actual pre-boil gravity: {0:.03f}.'.format(apbg))
+            planned_efficiency = profile.brewhouse_efficiency
 
         efficiency = planned_efficiency * agp / gp
-        print('Efficiency: {0:.02f}'.format(efficiency))
         recipe_config['Brew Day']['Brewhouse Efficiency'] = efficiency
+        result.actual_pre_boil_volume = apbv
+        result.actual_pre_boil_gravity = apbg
+        result.efficiency = efficiency
     else:
         if 'Brew Day' not in recipe_config:
             recipe_config['Brew Day'] = {}
@@ -336,13 +373,25 @@ def lauter(config, recipe_config):
         if 'Pre-Boil Gravity' not in recipe_config['Brew Day']:
             recipe_config['Brew Day']['Pre-Boil Gravity'] = pbg
 
-    return config, recipe_config
+    return result
+
 
+def boil(config, recipe_config, quiet=False):
+    """ Boil wort.
 
-def boil(config, recipe_config):
-    """ Boil wort. """
+    config may be the configuration or its EquipmentProfile (see
+    get_equipment_profile).
+    """
+    result = _boil(get_equipment_profile(config), recipe_config)
+    if not quiet:
+        print(render(result))
+
+    return config, recipe_config
 
-    up = config['unit_parser']
+
+def _boil(profile, recipe_config):
+    up = profile.unit_parser
+    result = BoilResult(hop_additions=[])
 
     if 'Hops' in recipe_config:
         hops = recipe_config['Hops']
@@ -350,39 +399,27 @@ def boil(config, recipe_config):
             if 'addition type' in hop and hop['addition type'] == 'fwh':
                 if 'mass' in hop and 'name' in hop and 'type' in hop:
                     mass = up.convert(hop['mass'], 'ounces')
-                    variety = hop['name']
-                    pellets = hop['type']
-                    print('Add {0:.2f}oz {1:s} {2:s} during lautering process (first wort hopping).'.format(mass, variety, pellets))
+                    result.hop_additions.append(('fwh', mass, hop['name'], hop['type']))
 
         time_additions = []
         for hop in hops:
             if 'boil_time' in hop and 'mass' in hop and 'name' in hop and 'type' in hop:
                 boil_time = up.convert(hop['boil_time'], 'minutes')
                 mass = up.convert(hop['mass'], 'ounces')
-                variety = hop['name']
-                pellets = hop['type']
-                time_additions.append({'boil_time': boil_time, 'mass': mass, 'variety': variety, 'pellets': pellets})
-
-        time_additions = sorted(time_additions, key=lambda k: k['boil_time'], reverse=True)
-        for hop in time_additions:
-            if hop['boil_time'] == 1:
-                plural = ''
-            else:
-                plural = 's'
+                time_additions.append((boil_time, mass, hop['name'], hop['type']))
 
-            print('Add {0:.2f}oz {2:s} {3:s} at {1:.0f} minute{4:s}.'.format(hop['mass'], hop['boil_time'], hop['variety'], hop['pellets'], plural))
+        time_additions = sorted(time_additions, key=lambda k: k[0], reverse=True)
+        result.hop_additions.extend(time_additions)
 
         for hop in hops:
             if 'addition type' in hop and hop['addition type'] == 'flameout':
                 if 'mass' in hop and 'name' in hop and 'type' in hop:
                     mass = up.convert(hop['mass'], 'ounces')
-                    variety = hop['name']
-                    pellets = hop['type']
-                    print('Add {0:.2f}oz {1:s} {2:s} at flameout.'.format(mass, variety, pellets))
+                    result.hop_additions.append(('flameout', mass, hop['name'], hop['type']))
 
     if ('Pre-Boil Volume' not in recipe_config or
         'Pre-Boil Gravity' not in recipe_config):
-        return config, recipe_config
+        return result
 
     pre_bv = up.convert(recipe_config['Pre-Boil Volume'], 'gallons')
     pre_bg = recipe_config['Pre-Boil Gravity']
@@ -396,10 +433,8 @@ def boil(config, recipe_config):
 
         if 'Boil Time' in recipe_config:
             boil_time = up.convert(recipe_config['Boil Time'], 'hours')
-        elif 'Boil Time' in config:
-            boil_time = up.convert(config['Boil Time'], 'hours')
         else:
-            boil_time = 1.0
+            boil_time = profile.boil_time
 
         post_bv = up.convert(recipe_config['Brew Day']['Post-Boil Volume'], 'gallons')
         og = recipe_config['Brew Day']['Original Gravity']
@@ -408,10 +443,8 @@ def boil(config, recipe_config):
 
         if 'Brewhouse Efficiency' in recipe_config:
             planned_efficiency = recipe_config['Brewhouse Efficiency']
-        elif 'Brewhouse Efficiency' in config:
-            planned_efficiency = config['Brewhouse Efficiency']
         else:
-            planned_efficiency = 0.7
+            planned_efficiency = profile.brewhouse_efficiency
 
         efficiency = planned_efficiency * post_gp / pre_gp
         recipe_config['Brew Day']['Brewhouse Efficiency'] = efficiency
@@ -419,10 +452,10 @@ def boil(config, recipe_config):
         evaporation_rate = (actual_pre_bv - post_bv) / boil_time
         recipe_config['Brew Day']['Evaporation Rate'] = '{0:.06f} gallons_per_hour'.format(evaporation_rate)
 
-        print('Actual post-boil volume: {0:.02f} gallons'.format(post_bv))
-        print('Evaporation rate: {0:.02f} gallons per hour'.format(evaporation_rate))
-        print('Original gravity: {0:.03f}'.format(og))
-        print('Efficiency: {0:.02f}'.format(efficiency))
+        result.post_boil_volume = post_bv
+        result.evaporation_rate = evaporation_rate
+        result.original_gravity = og
+        result.efficiency = efficiency
     elif ('Brew Day' in recipe_config
           and 'Pre-Boil Volume' in recipe_config['Brew Day']
           and 'Pre-Boil Gravity' in recipe_config['Brew Day']):
@@ -433,110 +466,314 @@ def boil(config, recipe_config):
 
         if 'Boil Time' in recipe_config:
             boil_time = up.convert(recipe_config['Boil Time'], 'hours')
-        elif 'Boil Time' in config:
-            boil_time = up.convert(config['Boil Time'], 'hours')
         else:
-            boil_time = 1.0
+            boil_time = profile.boil_time
 
         if 'Evaporation Rate' in recipe_config:
             evaporation_rate = up.convert(recipe_config['Evaporation Rate'], 'gallons_per_hour')
-        elif 'Evaporation Rate' in config:
-            evaporation_rate = up.convert(config['Evaporation Rate'], 'gallons_per_hour')
         else:
-            evaporation_rate = 1.75
+            evaporation_rate = profile.evaporation_rate
 
         post_boil_volume = pre_boil_volume - evaporation_rate * boil_time
         og = 1 + pre_gp * pre_boil_volume / post_boil_volume
 
-        print('Predicted original gravity: {0:.03f}'.format(og))
+        result.original_gravity = og
         recipe_config['Brew Day']['Original Gravity'] = og
     else:
         if 'Original Gravity' in recipe_config:
-            print('Predicted original gravity: {0:.03f}'.format(recipe_config['Original Gravity']))
+            result.original_gravity = recipe_config['Original Gravity']
+
+    return result
+
+
+# Configuration parameters an EquipmentProfile is built from.
+EQUIPMENT_PARAMETERS = (
+    'Water Density',
+    'Water Specific Heat',
+    'Grain Specific Heat',
+    'Mashtun Thermal Mass',
+    'Hot Liquor Tank Thermal Mass',
+    'Heat Loss During Kettle Transfer',
+    'Heat Loss in Mashtun',
+    'Mash Cooling Rate',
+    'Mashtun Heat Loss Coefficient',
+    'Sparge Temperature',
+    'Boiling Temperature',
+    'Boil Time',
+    'Evaporation Rate',
+    'Brewhouse Efficiency'
+)
+
+
+class EquipmentProfile(object):
+    """Equipment parameters of a configuration, converted once.
+
+    The mash, lauter, and boil calculations take their equipment
+    parameters from here rather than from the configuration, so the
+    parameters are looked up, defaulted, and converted through the
+    unit parser once per configuration instead of once per recipe
+    (see get_equipment_profile). Parameters the recipe may override
+    (the boil time, evaporation rate, and efficiency) hold the
+    configured value.
+
+    Parameters
+    ----------
+     config : dict
+        Configuration, with its 'unit_parser' (see brew_day.execute).
+
+    Attributes
+    ----------
+     unit_parser : CachedUnitParser
+        For the recipe's quantities.
+     water_density : float
+        In kilograms per liter.
+     water_specific_heat, grain_specific_heat : float
+        In calories per kilogram per degC.
+     mashtun_thermal_mass, hot_liquor_tank_thermal_mass : float
+        In calories per degC.
+     kettle_transfer_heat_loss : float
+        Temperature drop of the mash water during transfer from the
+        kettle to the mash tun, in degC.
+     mashtun_heat_loss : float
+        Temperature drop in the mash tun before adding grain, in degC.
+     mash_cooling_rate : float
+        In degC per hour.
+     heat_loss_coefficient : float or None
+        Of the mash tun, in calories per hour per degC, if configured
+        (see mash_heat_loss).
+     sparge_temperature, boiling_temperature : float
+        In degC.
+     boil_time : float
+        In hours.
+     evaporation_rate : float
+        In gallons per hour.
+     brewhouse_efficiency : float
+     warnings : list
+        Messages about the defaults assumed for parameters not
+        configured.
 
-    return config, recipe_config
+    """
+    __slots__ = ('unit_parser', 'water_density', 'water_specific_heat',
+                 'grain_specific_heat', 'mashtun_thermal_mass',
+                 'hot_liquor_tank_thermal_mass', 'kettle_transfer_heat_loss',
+                 'mashtun_heat_loss', 'mash_cooling_rate', 'heat_loss_coefficient',
+                 'sparge_temperature', 'boiling_temperature', 'boil_time',
+                 'evaporation_rate', 'brewhouse_efficiency', 'warnings')
+
+    def __init__(self, config):
+        up = config['unit_parser']
+        self.unit_parser = up
+        self.warnings = []
+
+        if 'Water Density' in config:
+            self.water_density = up.convert(config['Water Density'], 'kilograms_per_liter')
+        else:
+            self.water_density = 1. # kilograms per liter
 
+        if 'Water Specific Heat' in config:
+            self.water_specific_heat = up.convert(config['Water Specific Heat'], "calories_per_kilogram_degC")
+        else:
+            self.water_specific_heat = 1000. # calories per kg per degC
 
-def get_common_params(config, recipe_config):
-    up = config['unit_parser']
+        if 'Grain Specific Heat' in config:
+            self.grain_specific_heat = up.convert(config['Grain Specific Heat'], "calories_per_kilogram_degC")
+        else:
+            self.grain_specific_heat = 396.8068 # calories per kg per degC
 
-    if 'Brew Day' in recipe_config and 'temperature' in recipe_config['Brew Day']:
-        ambient_temp = fahrenheit_to_celsius(recipe_config['Brew Day']['temperature'])
-    else:
-        ambient_temp = fahrenheit_to_celsius(65)
-        print('Ambient temperature on brew day not specified; assuming {0:.0f} degF.'.format(celsius_to_fahrenheit(ambient_temp)))
+        if 'Mashtun Thermal Mass' in config:
+            self.mashtun_thermal_mass = up.convert(config['Mashtun Thermal Mass'], "calories_per_degC")
+        else:
+            self.mashtun_thermal_mass = 1362.152 # calories per degC
 
-    if 'Mash Water Volume' in recipe_config:
-        mwv = up.convert(recipe_config['Mash Water Volume'], 'liters')
-    else:
-        raise ValueError('Mash Water Volume not specified, try running malt_composition first.')
+        if 'Hot Liquor Tank Thermal Mass' in config:
+            self.hot_liquor_tank_thermal_mass = up.convert(config['Hot Liquor Tank Thermal Mass'], "calories_per_degC")
+        else:
+            self.warnings.append('Assuming Hot Liquor Tank Thermal Mass is the same as the Mashtun Thermal Mass.')
+            self.hot_liquor_tank_thermal_mass = self.mashtun_thermal_mass
 
-    grain_mass = 0.
-    if 'Malt' in recipe_config:
-        for malt in recipe_config['Malt']:
-            if 'mass' in malt:
-                grain_mass += up.convert(malt['mass'], 'kilograms')
+        # Heat loss during transfer from brew kettle to mash tun
+        if 'Heat Loss During Kettle Transfer' in config:
+            self.kettle_transfer_heat_loss = up.convert(config['Heat Loss During Kettle Transfer'], "degC")
+        else:
+            self.kettle_transfer_heat_loss = up.convert(5.2, "degF", "degC")
 
-    if grain_mass == 0:
-        raise ValueError("No grain mass specified. That's a weak beer!")
+        # Heat Loss In Tun: temperature drop before adding grain (error margin)
+        if 'Heat Loss in Mashtun' in config:
+            self.mashtun_heat_loss = up.convert(config['Heat Loss in Mashtun'], "degC")
+        else:
+            self.mashtun_heat_loss = up.convert(1, "degF", "degC")
 
-    if 'Water Density' in config:
-        water_density = up.convert(config['Water Density'], 'kilograms_per_liter')
-    else:
-        water_density = 1. # kilograms per liter
+        if 'Mash Cooling Rate' in config:
+            self.mash_cooling_rate = up.convert(config['Mash Cooling Rate'], "degC_per_hour")
+        else:
+            self.mash_cooling_rate = up.convert(4, "degF_per_hour", "degC_per_hour")
 
-    if 'Water Specific Heat' in config:
-        water_specific_heat = up.convert(config['Water Specific Heat'], "calories_per_kilogram_degC")
-    else:
-        water_specific_heat = 1000. # calories per kg per degC
+        if 'Mashtun Heat Loss Coefficient' in config:
+            self.heat_loss_coefficient = up.convert(config['Mashtun Heat Loss Coefficient'], "calories_per_hour_degC")
+        else:
+            self.heat_loss_coefficient = None
 
-    if 'Grain Specific Heat' in config:
-        grain_specific_heat = up.convert(config['Grain Specific Heat'], "calories_per_kilogram_degC")
-    else:
-        grain_specific_heat = 396.8068 # calories per kg per degC
+        if 'Sparge Temperature' in config:
+            self.sparge_temperature = fahrenheit_to_celsius(config['Sparge Temperature'])
+        else:
+            self.sparge_temperature = fahrenheit_to_celsius(170)
+            self.warnings.append('Assuming Sparge Temperature is {0:.1f} degF.'.format(celsius_to_fahrenheit(self.sparge_temperature)))
 
-    if 'Mashtun Thermal Mass' in config:
-        mttm = up.convert(config['Mashtun Thermal Mass'], "calories_per_degC")
-    else:
-        mttm = 1362.152 # calories per degC
+        if 'Boiling Temperature' in config:
+            self.boiling_temperature = fahrenheit_to_celsius(config['Boiling Temperature'])
+        else:
+            self.boiling_temperature = fahrenheit_to_celsius(212)
+            self.warnings.append('Assuming Boiling Temperature is {0:.1f} degF.'.format(celsius_to_fahrenheit(self.boiling_temperature)))
 
-    if 'Hot Liquor Tank Thermal Mass' in config:
-        hlttm = up.convert(config['Hot Liquor Tank Thermal Mass'], "calories_per_degC")
-    else:
-        print('Assuming Hot Liquor Tank Thermal Mass is the same as the Mashtun Thermal Mass.')
-        hlttm = mttm
+        if 'Boil Time' in config:
+            self.boil_time = up.convert(config['Boil Time'], 'hours')
+        else:
+            self.boil_time = 1.0
 
-    # Heat loss during transfer from brew kettle to mash tun
-    if 'Heat Loss During Kettle Transfer' in config:
-        hldt = up.convert(config['Heat Loss During Kettle Transfer'], "degC")
-    else:
-        hldt = up.convert(5.2, "degF", "degC")
+        if 'Evaporation Rate' in config:
+            self.evaporation_rate = up.convert(config['Evaporation Rate'], 'gallons_per_hour')
+        else:
+            self.evaporation_rate = 1.75
 
-    # Heat Loss In Tun: temperature drop before adding grain (error margin)
-    if 'Heat Loss in Mashtun' in config:
-        hlit = up.convert(config['Heat Loss in Mashtun'], "degC")
-    else:
-        hlit = up.convert(1, "degF", "degC")
+        self.brewhouse_efficiency = config.get('Brewhouse Efficiency', 0.7)
 
-    if 'Mash Cooling Rate' in config:
-        mcr = up.convert(config['Mash Cooling Rate'], "degC_per_hour")
-    else:
-        mcr = up.convert(4, "degF_per_hour", "degC_per_hour")
+    def recipe_params(self, recipe_config, warnings):
+        """ Ambient temperature (degC), mash water volume (liters), and
+        grain thermal mass (calories per degC) of a recipe.
 
-    if 'Sparge Temperature' in config:
-        sparge_temp = fahrenheit_to_celsius(config['Sparge Temperature'])
-    else:
-        sparge_temp = fahrenheit_to_celsius(170)
-        print('Assuming Sparge Temperature is {0:.1f} degF.'.format(celsius_to_fahrenheit(sparge_temp)))
+        Messages about assumed defaults, of the recipe and then of the
+        equipment, are appended to warnings.
+        """
+        up = self.unit_parser
+        if 'Brew Day' in recipe_config and 'temperature' in recipe_config['Brew Day']:
+            ambient_temp = fahrenheit_to_celsius(recipe_config['Brew Day']['temperature'])
+        else:
+            ambient_temp = fahrenheit_to_celsius(65)
+            warnings.append('Ambient temperature on brew day not specified; assuming {0:.0f} degF.'.format(celsius_to_fahrenheit(ambient_temp)))
+
+        if 'Mash Water Volume' in recipe_config:
+            mwv = up.convert(recipe_config['Mash Water Volume'], 'liters')
+        else:
+            raise ValueError('Mash Water Volume not specified, try running malt_composition first.')
 
-    if 'Boiling Temperature' in config:
-        boiling_temp = fahrenheit_to_celsius(config['Boiling Temperature'])
+        grain_mass = 0.
+        if 'Malt' in recipe_config:
+            for malt in recipe_config['Malt']:
+                if 'mass' in malt:
+                    grain_mass += up.convert(malt['mass'], 'kilograms')
+
+        if grain_mass == 0:
+            raise ValueError("No grain mass specified. That's a weak beer!")
+
+        warnings.extend(self.warnings)
+        return ambient_temp, mwv, grain_mass * self.grain_specific_heat
+
+    def water_thermal_mass(self, volume):
+        """ Thermal mass of volume liters of water, in calories per degC. """
+        return volume * self.water_density * self.water_specific_heat
+
+    def mash_heat_loss(self, thermal_mass, mash_temp, ambient_temp):
+        """ Heat loss coefficient of the mash tun (see mash_heat_loss). """
+        if self.heat_loss_coefficient is not None:
+            return self.heat_loss_coefficient
+
+        return heat_loss_coefficient(thermal_mass, self.mash_cooling_rate, mash_temp, ambient_temp)
+
+
+def get_equipment_profile(config):
+    """ EquipmentProfile for config, built on first use and cached in
+    config['equipment_profile'] (together with the parameters it was
+    built from, so a configuration modified since gets a new one).
+
+    An EquipmentProfile is returned as is, so the mash, lauter, and
+    boil functions take either.
+    """
+    if isinstance(config, EquipmentProfile):
+        return config
+
+    if 'unit_parser' not in config:
+        config['unit_parser'] = get_unit_parser(config.get('units', None))
+
+    key = (config['unit_parser'],) + tuple(config.get(name, None) for name in EQUIPMENT_PARAMETERS)
+    entry = config.get('equipment_profile', None)
+    if entry is not None and entry[0] == key:
+        return entry[1]
+
+    profile = EquipmentProfile(config)
+    config['equipment_profile'] = (key, profile)
+    return profile
+
+
+def get_common_params(config, recipe_config, warnings=None):
+    """ Equipment and recipe parameters shared by the mash calculations.
+
+    Messages about assumed defaults are appended to warnings, or, if
+    None, printed. Superseded by EquipmentProfile, which the mash
+    calculations use instead of this tuple.
+    """
+    report = warnings is None
+    if report:
+        warnings = []
+
+    profile = get_equipment_profile(config)
+    ambient_temp, mwv, gtm = profile.recipe_params(recipe_config, warnings)
+
+    if report:
+        for msg in warnings:
+            print(msg)
+
+    return (ambient_temp, mwv, gtm, profile.water_density, profile.water_specific_heat,
+            profile.mashtun_thermal_mass, profile.hot_liquor_tank_thermal_mass,
+            profile.kettle_transfer_heat_loss, profile.mashtun_heat_loss,
+            profile.mash_cooling_rate, profile.sparge_temperature, profile.boiling_temperature)
+
+
+def mash_temperature_curve(config, recipe_config, time_step=1. / 60):
+    """ Predicted mash temperature over the whole mash schedule.
+
+    Covers the recipe's infusion or step mash, from the moment the grain
+    is stirred in at the (first) mash temperature, with later steps
+    reached by boiling water infusions. Returns a MashCurve (see
+    simulate_mash) for the one schedule, with temperatures in degC and
+    times in hours.
+    """
+    profile = get_equipment_profile(config)
+    up = profile.unit_parser
+    mash = recipe_config['Mash']
+    if 'steps' in mash:
+        steps = mash['steps']
     else:
-        boiling_temp = fahrenheit_to_celsius(212)
-        print('Assuming Boiling Temperature is {0:.1f} degF.'.format(celsius_to_fahrenheit(boiling_temp)))
+        steps = [{'temperature': mash['temperature'],
+                  'duration': mash.get('duration', '1 hours')}]
+
+    step_temps = [fahrenheit_to_celsius(step['temperature']) for step in steps]
+    step_durations = [up.convert(step['duration'], 'hours') for step in steps]
+
+    ambient_temp, mwv, gtm = profile.recipe_params(recipe_config, [])
+    ctm = profile.mashtun_thermal_mass + profile.water_thermal_mass(mwv) + gtm
+    mhl = profile.mash_heat_loss(ctm, step_temps[0], ambient_temp)
+    return simulate_mash(step_temps, step_durations, ctm, mhl, ambient_temp,
+                         profile.boiling_temperature, time_step)
+
+
+def mash_heat_loss(config, thermal_mass, cooling_rate, mash_temp, ambient_temp):
+    """ Heat loss coefficient of the mash tun, in calories per hour per degC.
+
+    Taken from the 'Mashtun Heat Loss Coefficient' of the configuration
+    if given, else chosen so that a mash of the given thermal mass at
+    mash_temp initially cools at cooling_rate (the 'Mash Cooling Rate').
+    """
+    profile = get_equipment_profile(config)
+    if profile.heat_loss_coefficient is not None:
+        return profile.heat_loss_coefficient
+
+    return heat_loss_coefficient(thermal_mass, cooling_rate, mash_temp, ambient_temp)
+
 
-    gtm = grain_mass * grain_specific_heat
-    return ambient_temp, mwv, gtm, water_density, water_specific_heat, mttm, hlttm, hldt, hlit, mcr, sparge_temp, boiling_temp
+def mash_cooling(start_temp, duration, thermal_mass, heat_loss, ambient_temp):
+    """ Mash temperature after cooling for duration hours from start_temp. """
+    curve = simulate_mash([start_temp], [duration], thermal_mass, heat_loss, ambient_temp)
+    return curve.final_temperatures[0, 0]
 
 
 def fahrenheit_to_celsius(degf, difference=False):
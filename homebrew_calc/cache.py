@@ -0,0 +1,212 @@
+from __future__ import print_function
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+
+try:
+    _STRING_TYPES = (bytes, unicode)
+except NameError:
+    _STRING_TYPES = (bytes, str)
+
+
+def cache_dir():
+    """Directory for homebrew_calc's on-disk caches.
+
+    Uses the HOMEBREW_CALC_CACHE_DIR environment variable if set, and
+    otherwise a homebrew_calc folder in the user cache directory
+    ($XDG_CACHE_HOME, or ~/.cache). Setting HOMEBREW_CALC_CACHE_DIR
+    to the empty string disables on-disk caching.
+
+    Returns
+    -------
+     path : str or None
+        Cache directory (not necessarily existing yet), or None if
+        on-disk caching is disabled.
+
+    """
+    if 'HOMEBREW_CALC_CACHE_DIR' in os.environ:
+        return os.environ['HOMEBREW_CALC_CACHE_DIR'] or None
+
+    base = os.environ.get('XDG_CACHE_HOME', None)
+    if not base:
+        base = os.path.join(os.path.expanduser('~'), '.cache')
+
+    return os.path.join(base, 'homebrew_calc')
+
+
+def atomic_write(path, data):
+    """Write bytes to path, via a temporary file so readers never see
+    a partial write. Failures (e.g. a read-only cache directory) are
+    silently ignored, since caches are only an optimization.
+
+    """
+    tmp = '{0:s}.{1:d}.tmp'.format(path, os.getpid())
+    try:
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        with open(tmp, 'wb') as f:
+            f.write(data)
+
+        if hasattr(os, 'replace'):
+            os.replace(tmp, path)
+        else:
+            os.rename(tmp, path)
+    except (IOError, OSError):
+        try:
+            os.remove(tmp)
+        except (IOError, OSError):
+            pass
+
+
+def content_key(*parts):
+    """Canonical hash of parts, for content-addressed caches.
+
+    Each part may be None, a string (text, or UTF-8 encoded bytes,
+    which hash alike), or anything convertible to a float array (numbers, lists, arrays); arrays are hashed by shape
+    and value, so equal inputs give the same key regardless of their
+    original type.
+
+    Returns
+    -------
+     key : str
+        Hexadecimal SHA-256 digest.
+
+    """
+    h = hashlib.sha256()
+    for part in parts:
+        if part is None:
+            h.update(b'n;')
+        elif isinstance(part, _STRING_TYPES):
+            if isinstance(part, bytes):
+                part = part.decode('utf-8')
+            h.update(u's{0:d}:{1:s};'.format(len(part), part).encode('utf-8'))
+        else:
+            a = np.ascontiguousarray(part, dtype=float)
+            h.update('a{0!r};'.format(a.shape).encode('utf-8'))
+            h.update(a.tobytes())
+
+    return h.hexdigest()
+
+
+class SolutionCache(object):
+    """Persistent, size-bounded cache of solutions, one JSON file each.
+
+    Entries are stored as <key>.json in directory, where key is a
+    content hash of the inputs (see content_key). Reading an entry
+    touches its file, and once there are more than max_entries files,
+    the least recently used ones are removed. Like the other on-disk
+    caches, it never raises on I/O errors: a corrupt or unreadable
+    entry is a miss, and a failed write is ignored.
+
+    Parameters
+    ----------
+     directory : str
+        Directory holding the entries (created when needed).
+     max_entries : int
+        Maximum number of entries. Defaults to 1024.
+
+    """
+    def __init__(self, directory, max_entries=1024):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._count = None
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def get(self, key):
+        """Entry for key (a dict), or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, 'r') as f:
+                value = json.load(f)
+            os.utime(path, None)
+        except (IOError, OSError, ValueError):
+            return None
+
+        return value
+
+    def put(self, key, value):
+        """Store value (a JSON-serializable dict) under key."""
+        atomic_write(self._path(key), json.dumps(value).encode('utf-8'))
+        with self._lock:
+            if self._count is None:
+                self._count = len(self._entries())
+            else:
+                self._count += 1
+
+            if self._count > self.max_entries:
+                self._evict()
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            for name in self._entries():
+                _remove(os.path.join(self.directory, name))
+            self._count = 0
+
+    def _entries(self):
+        try:
+            return [x for x in os.listdir(self.directory) if x.endswith('.json')]
+        except OSError:
+            return []
+
+    def _evict(self):
+        # Evict down to 90% of capacity, so the directory is scanned
+        # once per max_entries / 10 insertions, not on every one.
+        entries = []
+        for name in self._entries():
+            path = os.path.join(self.directory, name)
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except OSError:
+                pass
+
+        entries.sort()
+        excess = len(entries) - int(0.9 * self.max_entries)
+        for mtime, path in entries[:max(excess, 0)]:
+            _remove(path)
+        self._count = len(entries) - max(excess, 0)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+_solution_caches = {}
+_solution_caches_lock = threading.Lock()
+
+
+def get_solution_cache(name, max_entries=1024):
+    """Process-wide shared SolutionCache, in a folder of cache_dir().
+
+    Parameters
+    ----------
+     name : str
+        Name of the folder, e.g. 'water'.
+     max_entries : int
+        Maximum number of entries (used when the cache is created).
+
+    Returns
+    -------
+     cache : SolutionCache or None
+        None if on-disk caching is disabled (see cache_dir).
+
+    """
+    directory = cache_dir()
+    if directory is None:
+        return None
+
+    directory = os.path.join(directory, name)
+    with _solution_caches_lock:
+        if directory not in _solution_caches:
+            _solution_caches[directory] = SolutionCache(directory, max_entries)
+        return _solution_caches[directory]
@@ -0,0 +1,454 @@
+from __future__ import print_function
+from collections import namedtuple
+import json
+import os
+import numpy as np
+from .brew_day import celsius_to_fahrenheit, fahrenheit_to_celsius, get_equipment_profile
+from .malt_composition import specific_gravity_to_gravity_points
+
+
+Calibration = namedtuple('Calibration', [
+    'parameters', 'diagnostics', 'recipes', 'skipped'
+])
+Calibration.__doc__ = """Equipment parameters fitted to brew day measurements.
+
+ parameters : dict
+    Fitted value of each configuration parameter, formatted as in
+    homebrew.json (e.g. '1450.0 calories_per_degC'). Only parameters
+    with observations are present.
+ diagnostics : dict
+    For each fitted parameter, a dictionary with the number of
+    'observations', the 'previous' and fitted 'value' and its
+    'standard error' (in the units of the parameter), and the root
+    mean square residual of the model, with the previous and the
+    fitted value, as 'rms before' and 'rms after' (in the
+    'residual units').
+ recipes : int
+    Number of recipes that contributed observations.
+ skipped : list
+    (recipe, error message) of each recipe that could not be used.
+
+"""
+
+
+# Parameters calibrated, and their units in the profile.
+_PARAMETERS = [
+    ('Evaporation Rate', 'gallons_per_hour'),
+    ('Brewhouse Efficiency', None),
+    ('Mashtun Thermal Mass', 'calories_per_degC'),
+    ('Mashtun Heat Loss Coefficient', 'calories_per_hour_degC'),
+    ('Mash Cooling Rate', 'degF_per_hour'),
+]
+
+
+def calibrate_equipment_main():
+    """Entry point for calibrate_equipment command line script.
+
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('recipes', type=str, nargs='+',
+                        help='Recipe JSON files with Brew Day measurements, or directories of them')
+    parser.add_argument('-c', '--config', type=str,
+                        help='Equipment profile to start from (default: the bundled homebrew.json)')
+    parser.add_argument('-o', '--output', type=str,
+                        help='Output file for the updated profile (default: print the fit only)')
+
+    args = parser.parse_args()
+    recipes = []
+    for path in args.recipes:
+        if os.path.isdir(path):
+            recipes.extend(sorted(os.path.join(path, f) for f in os.listdir(path)
+                                  if f.endswith('.json')))
+        else:
+            recipes.append(path)
+
+    profile = args.config or _default_profile()
+    config = _load_profile(profile)
+    calibration = calibrate_equipment(config, recipes)
+
+    for recipe, error in calibration.skipped:
+        print('{0:s}: skipped ({1:s})'.format(recipe, error))
+
+    print('Calibrated with {0:d} recipes'.format(calibration.recipes))
+    for name, units in _PARAMETERS:
+        if name not in calibration.diagnostics:
+            print('{0:s}: not enough observations'.format(name))
+            continue
+
+        diag = calibration.diagnostics[name]
+        print('{0:s}: {1:s} (was {2:.4g}, standard error {3:.2g}, n = {4:d}, '
+              'rms {5:.3g} -> {6:.3g} {7:s})'.format(
+                  name, str(calibration.parameters[name]), diag['previous'],
+                  diag['standard error'], diag['observations'], diag['rms before'],
+                  diag['rms after'], diag['residual units']))
+    print('Heat Loss During Kettle Transfer: not calibrated (not measured on brew day)')
+
+    if args.output:
+        write_equipment_profile(calibration, args.output, profile)
+
+
+def calibrate_equipment(config, recipes):
+    """Fit equipment parameters to the measurements of many brew days.
+
+    The measurements in the 'Brew Day' section of each recipe (and in
+    the steps of a step mash) are compared with the predictions of
+    brew_day for the same recipe, and the parameters are chosen to
+    minimize the squared differences over all recipes at once:
+
+      'Evaporation Rate'
+         From the measured 'Pre-Boil Volume' and 'Post-Boil Volume'
+         and the 'Boil Time'.
+      'Brewhouse Efficiency'
+         From the measured 'Post-Boil Volume' and 'Original Gravity',
+         against the gravity points planned at the recipe's
+         efficiency.
+      'Mashtun Thermal Mass' and 'Mashtun Heat Loss Coefficient'
+         Jointly, from the 'Water Temperature in Mashtun' (strike
+         temperature) and 'Final Mash Temperature' of infusion mashes
+         and of the first step of step mashes, and the 'Achieved Mash
+         Temperature' and 'Final Mash Temperature' of later steps:
+         the tun's thermal mass sets how far an infusion raises the
+         mash, and the heat loss coefficient how fast the mash cools
+         (see mash_thermal.simulate_mash). The equivalent 'Mash
+         Cooling Rate', at the median mash of the recipes, is
+         reported too.
+
+    The first two are linear least squares problems, solved in closed
+    form; the mash tun is fit with scipy.optimize.least_squares.
+    Parameters without observations are not fit. The 'Heat Loss
+    During Kettle Transfer' (and 'Heat Loss in Mashtun') cannot be
+    calibrated, as the temperature of the water once in the mash
+    tun, before it is left to cool to the strike temperature, is not
+    recorded.
+
+    brew_day fills in the predicted values of measurements that are
+    missing from a recipe, so recipes saved by brew_day before brew
+    day agree with the configuration they were computed with; only
+    recipes with actual measurements should be given.
+
+    Parameters
+    ----------
+     config : dict
+        Configuration (the equipment profile to start from), as for
+        brew_day.execute.
+     recipes : array_like
+        Recipes, either as JSON file names or as dictionaries, after
+        malt_composition and water_composition (for the 'Mash Water
+        Volume' and the planned 'Pre-Boil Volume' and 'Pre-Boil
+        Gravity').
+
+    Returns
+    -------
+     calibration : Calibration
+
+    """
+    profile = get_equipment_profile(dict(config))
+
+    obs = _Observations()
+    skipped = []
+    used = 0
+    for recipe in recipes:
+        try:
+            if isinstance(recipe, dict):
+                recipe_config = recipe
+            else:
+                with open(recipe, 'r') as f:
+                    recipe_config = json.load(f)
+
+            if obs.add(profile, recipe_config):
+                used += 1
+        except (IOError, KeyError, TypeError, ValueError) as e:
+            skipped.append((recipe if not isinstance(recipe, dict) else
+                            recipe.get('Name', 'recipe'), str(e)))
+
+    parameters = {}
+    diagnostics = {}
+
+    if len(obs.boil_time) > 0:
+        diag = _linear_fit(np.array(obs.boil_time), np.array(obs.boil_off),
+                           profile.evaporation_rate)
+        diag['residual units'] = 'gallons'
+        diagnostics['Evaporation Rate'] = diag
+
+    if len(obs.planned_points) > 0:
+        diag = _linear_fit(np.array(obs.planned_points), np.array(obs.points),
+                           profile.brewhouse_efficiency)
+        diag['residual units'] = 'gravity points'
+        diagnostics['Brewhouse Efficiency'] = diag
+
+    if len(obs.cooling) + len(obs.infusion) >= 2:
+        diagnostics.update(_fit_mashtun(profile, obs))
+
+    for name, units in _PARAMETERS:
+        if name not in diagnostics:
+            continue
+        if units is None:
+            parameters[name] = round(diagnostics[name]['value'], 4)
+        else:
+            parameters[name] = '{0:s} {1:s}'.format(_fixed(diagnostics[name]['value']), units)
+
+    return Calibration(parameters, diagnostics, used, skipped)
+
+
+def write_equipment_profile(calibration, output, profile=None):
+    """Write an equipment profile updated with a calibration.
+
+    Parameters
+    ----------
+     calibration : Calibration
+        Result of calibrate_equipment.
+     output : str
+        File to write the profile to.
+     profile : str or None
+        Profile (homebrew.json) to update; the other parameters are
+        kept as is. Defaults to the one bundled with homebrew_calc.
+        The diagnostics of the fit are saved under 'Calibration'.
+
+    """
+    with open(profile or _default_profile(), 'r') as f:
+        config = json.load(f)
+
+    config.update(calibration.parameters)
+    config['Calibration'] = dict(recipes=calibration.recipes,
+                                 skipped=len(calibration.skipped),
+                                 **calibration.diagnostics)
+
+    with open(output, 'w') as outfile:
+        json.dump(config, outfile, indent=2)
+
+
+class _Observations(object):
+    """Brew day measurements, and the quantities needed to predict
+    them, accumulated over recipes.
+
+    Temperatures are in degC, thermal masses in calories per degC,
+    and times in hours. A cooling observation is a mash starting at
+    T0 and cooling for a duration, ending at final. T0 is either
+    measured, or, when the strike water temperature is, the
+    temperature once the grain is added,
+
+      T0 = (start * (mttm + water) + ambient * grain) / (mttm + water + grain),
+
+    with water and grain the thermal masses of the mash water and the
+    grain (grain is 0 when T0 is measured). The thermal mass of the
+    mash is that of the tun plus mass. An infusion observation is an
+    infusion of boiling water into a mash of thermal mass tun plus
+    mass, at start, achieving achieved.
+
+    """
+
+    def __init__(self):
+        self.boil_time, self.boil_off = [], []
+        self.planned_points, self.points = [], []
+        # (start, water, grain, mass, ambient, duration, final, heat loss as brewed)
+        self.cooling = []
+        # (start, mass, infusion, boiling, achieved)
+        self.infusion = []
+
+    def add(self, profile, recipe_config):
+        """Add the observations of a recipe, brewed with the equipment
+        profile; return whether there were any. If the recipe raises,
+        none of its observations are kept."""
+        if 'Brew Day' not in recipe_config:
+            return False
+
+        lists = (self.boil_time, self.boil_off, self.planned_points, self.points,
+                 self.cooling, self.infusion)
+        lengths = [len(l) for l in lists]
+        try:
+            self._add_recipe(profile, recipe_config)
+        except Exception:
+            for l, n in zip(lists, lengths):
+                del l[n:]
+            raise
+
+        return lengths != [len(l) for l in lists]
+
+    def _add_recipe(self, profile, recipe_config):
+        up = profile.unit_parser
+        brew_day = recipe_config['Brew Day']
+
+        if 'Boil Time' in recipe_config:
+            boil_time = up.convert(recipe_config['Boil Time'], 'hours')
+        else:
+            boil_time = profile.boil_time
+
+        if 'Pre-Boil Volume' in brew_day and 'Post-Boil Volume' in brew_day:
+            pre_bv = up.convert(brew_day['Pre-Boil Volume'], 'gallons')
+            post_bv = up.convert(brew_day['Post-Boil Volume'], 'gallons')
+            self.boil_time.append(boil_time)
+            self.boil_off.append(pre_bv - post_bv)
+
+        if ('Post-Boil Volume' in brew_day and 'Original Gravity' in brew_day
+                and 'Pre-Boil Volume' in recipe_config and 'Pre-Boil Gravity' in recipe_config):
+            planned_efficiency = recipe_config.get(
+                'Brewhouse Efficiency', profile.brewhouse_efficiency)
+            pre_gp = specific_gravity_to_gravity_points(
+                recipe_config['Pre-Boil Gravity'],
+                up.convert(recipe_config['Pre-Boil Volume'], 'gallons'))
+            self.planned_points.append(pre_gp / planned_efficiency)
+            self.points.append(specific_gravity_to_gravity_points(
+                brew_day['Original Gravity'], up.convert(brew_day['Post-Boil Volume'], 'gallons')))
+
+        if 'Mash' in recipe_config and 'Mash Water Volume' in recipe_config:
+            self._add_mash(profile, recipe_config)
+
+    def _add_mash(self, profile, recipe_config):
+        up = profile.unit_parser
+        mash = recipe_config['Mash']
+        if mash.get('type') == 'Step':
+            steps = mash['steps']
+            first = steps[0]
+        else:
+            steps = [dict(mash, duration=mash.get('duration', '1 hours'))]
+            first = recipe_config['Brew Day']
+
+        ambient_temp, mwv, gtm = profile.recipe_params(recipe_config, [])
+        mttm = profile.mashtun_thermal_mass
+        boiling_temp = profile.boiling_temperature
+        mwtm = profile.water_thermal_mass(mwv)
+        mash_temp = fahrenheit_to_celsius(steps[0]['temperature'])
+        mhl = profile.mash_heat_loss(mttm + mwtm + gtm, mash_temp, ambient_temp)
+
+        if 'Water Temperature in Mashtun' in first and 'Final Mash Temperature' in first:
+            self.cooling.append((
+                fahrenheit_to_celsius(first['Water Temperature in Mashtun']), mwtm, gtm,
+                mwtm + gtm, ambient_temp, up.convert(steps[0]['duration'], 'hours'),
+                fahrenheit_to_celsius(first['Final Mash Temperature']), mhl))
+
+        # Later steps, with the infusions as brewed (computed with the
+        # equipment profile, from the previous step's final temperature).
+        mass = mwtm + gtm
+        previous = steps[0]
+        for step in steps[1:]:
+            if 'Final Mash Temperature' not in previous:
+                break
+
+            mtfa = fahrenheit_to_celsius(previous['Final Mash Temperature'])
+            step_temp = fahrenheit_to_celsius(step['temperature'])
+            swtm = (mttm + mass) * (step_temp - mtfa) / (boiling_temp - step_temp)
+            if 'Achieved Mash Temperature' in step:
+                achieved = fahrenheit_to_celsius(step['Achieved Mash Temperature'])
+                self.infusion.append((mtfa, mass, swtm, boiling_temp, achieved))
+            mass += swtm
+
+            if 'Achieved Mash Temperature' in step and 'Final Mash Temperature' in step:
+                self.cooling.append((
+                    achieved, mass, 0., mass, ambient_temp, up.convert(step['duration'], 'hours'),
+                    fahrenheit_to_celsius(step['Final Mash Temperature']), mhl))
+            previous = step
+
+
+def _linear_fit(x, y, previous):
+    """Least squares fit of y = value * x, by the value."""
+    sxx = np.dot(x, x)
+    value = np.dot(x, y) / sxx
+    residuals = y - value * x
+    num = len(x)
+    if num > 1:
+        standard_error = np.sqrt(np.dot(residuals, residuals) / (num - 1) / sxx)
+    else:
+        standard_error = np.nan
+
+    return {'observations': num, 'previous': previous, 'value': float(value),
+            'standard error': float(standard_error),
+            'rms before': _rms(y - previous * x), 'rms after': _rms(residuals)}
+
+
+def _mashtun_residuals(params, cooling, infusion):
+    """Predicted minus measured temperatures, in degC, of the cooling
+    and infusion observations (see _Observations), for a mash tun of
+    thermal mass params[0] and heat loss coefficient params[1] (or,
+    if None, the heat loss as brewed)."""
+    mttm, mhl = params
+    start, water, grain, mass, ambient, duration, final, mhl_brewed = cooling.T
+    if mhl is None:
+        mhl = mhl_brewed
+    T0 = (start * (mttm + water) + ambient * grain) / (mttm + water + grain)
+    predicted = ambient + (T0 - ambient) * np.exp(-mhl * duration / (mttm + mass))
+
+    start, mass, swtm, boiling, achieved = infusion.T
+    ctm = mttm + mass
+    achieved_predicted = (ctm * start + swtm * boiling) / (ctm + swtm)
+    return np.concatenate((predicted - final, achieved_predicted - achieved))
+
+
+def _fit_mashtun(profile, obs):
+    from scipy.optimize import least_squares
+
+    cooling = np.array(obs.cooling, dtype=float).reshape(-1, 8)
+    infusion = np.array(obs.infusion, dtype=float).reshape(-1, 5)
+
+    mttm = profile.mashtun_thermal_mass
+    mhl = np.median(cooling[:, -1]) if len(cooling) else 0.
+
+    before = _mashtun_residuals((mttm, None), cooling, infusion)
+    fit = least_squares(_mashtun_residuals, [mttm, max(mhl, 1.)], args=(cooling, infusion),
+                        bounds=([0., 0.], [np.inf, np.inf]), x_scale='jac')
+
+    num = len(fit.fun)
+    if num > 2:
+        variance = np.dot(fit.fun, fit.fun) / (num - 2)
+        standard_errors = np.sqrt(np.diag(np.linalg.pinv(np.dot(fit.jac.T, fit.jac))) * variance)
+    else:
+        standard_errors = np.full(2, np.nan)
+
+    rms_before = celsius_to_fahrenheit(_rms(before), difference=True)
+    rms_after = celsius_to_fahrenheit(_rms(fit.fun), difference=True)
+    diagnostics = {
+        'Mashtun Thermal Mass': {
+            'observations': num, 'previous': mttm, 'value': float(fit.x[0]),
+            'standard error': float(standard_errors[0]),
+            'rms before': rms_before, 'rms after': rms_after, 'residual units': 'degF'},
+    }
+    if len(cooling):
+        # Initial cooling rate of the median mash, for reference.
+        start, water, grain, mass, ambient, duration, final, mhl_brewed = cooling.T
+
+        def median_ratio(mttm):
+            T0 = (start * (mttm + water) + ambient * grain) / (mttm + water + grain)
+            return np.median((T0 - ambient) / (mttm + mass))
+
+        ratio = median_ratio(fit.x[0])
+        previous_ratio = median_ratio(mttm)
+        diagnostics['Mashtun Heat Loss Coefficient'] = {
+            'observations': num, 'previous': mhl, 'value': float(fit.x[1]),
+            'standard error': float(standard_errors[1]),
+            'rms before': rms_before, 'rms after': rms_after, 'residual units': 'degF'}
+        diagnostics['Mash Cooling Rate'] = {
+            'observations': num,
+            'previous': celsius_to_fahrenheit(mhl * previous_ratio, difference=True),
+            'value': celsius_to_fahrenheit(float(fit.x[1] * ratio), difference=True),
+            'standard error': celsius_to_fahrenheit(float(standard_errors[1] * ratio), difference=True),
+            'rms before': rms_before, 'rms after': rms_after, 'residual units': 'degF'}
+
+    return diagnostics
+
+
+def _fixed(value, digits=6):
+    """value to digits significant figures, in fixed-point notation,
+    which (unlike exponent notation) the unit parser can read back."""
+    return np.format_float_positional(value, precision=digits, unique=False,
+                                      fractional=False, trim='-')
+
+
+def _rms(residuals):
+    return float(np.sqrt(np.mean(np.square(residuals))))
+
+
+def _default_profile():
+    this_dir, this_filename = os.path.split(__file__)
+    return os.path.join(this_dir, 'resources', 'homebrew.json')
+
+
+def _load_profile(profile):
+    """Configuration from an equipment profile, with the unit
+    definitions bundled with homebrew_calc."""
+    this_dir, this_filename = os.path.split(__file__)
+    with open(profile, 'r') as f:
+        config = json.load(f)
+    if 'units' in config.get('files', {}):
+        config['units'] = os.path.join(this_dir, 'resources', config['files']['units'])
+    return config
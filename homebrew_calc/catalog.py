@@ -0,0 +1,262 @@
+from __future__ import print_function
+import numpy as np
+
+
+# Integer codes for the 'type' of a malt. Malts without a type, or
+# with a type not listed here, get code 0.
+MALT_TYPE_CODES = {
+    'base': 1,
+    'crystal': 2,
+    'roast': 3
+}
+
+# Per-malt property arrays held by a Catalog.
+MALT_COLUMNS = (
+    'ppg',
+    'lovibond',
+    'distilled_ph',
+    'buffering_capacity',
+    'acidity',
+    'acid',
+    'malt_type'
+)
+
+# Recipe-level malt parameters that override the catalog.
+MALT_OVERRIDES = frozenset([
+    'ppg',
+    'extract potential',
+    'degrees lovibond',
+    'distilled pH',
+    'buffering capacity',
+    'acidity',
+    'type'
+])
+
+
+class Catalog(object):
+    """Integer-indexed ingredient catalog.
+
+    The catalog is built once from the malt, hop, and water
+    configurations (typically malt.json, hops.json, and water.json),
+    assigning each ingredient an integer id and storing each property
+    as an array indexed by id. Defaults that would otherwise be
+    re-derived on every lookup (ppg from extract potential, acidity of
+    crystal malts from their color, etc.) are resolved up front.
+
+    Unknown malts and hops are assigned a sentinel id one past the
+    last known ingredient, so arrays can be indexed without special
+    cases; the sentinel row holds the values used when nothing is
+    known about an ingredient.
+
+    Parameters
+    ----------
+     malt : dict or None
+        Malt configuration, keyed by malt name (see malt.json).
+     hops : dict or None
+        Hop configuration, keyed by hop name (see hops.json).
+     water : dict or None
+        Water configuration (see water.json).
+
+    Malt Properties
+    ---------------
+     ppg : array
+        Gravity points per pound per gallon (from 'ppg', or from
+        'extract potential' relative to sucrose; 0 if neither).
+     lovibond : array
+        Degrees Lovibond (0 if not specified).
+     distilled_ph : array
+        Distilled water pH of base malts (0 for acidic malts).
+     buffering_capacity : array
+        Buffering capacity of base malts, in mEq/kg (0 for acidic
+        malts, NaN if a base malt does not specify it).
+     acidity : array
+        Acidity of acidic malts, in mEq/kg. Crystal malts without an
+        explicit acidity use 0.45 * degrees lovibond + 6.
+     acid : array
+        True for malts that contribute acidity to the mash, False for
+        base malts characterized by distilled pH and buffering
+        capacity.
+     malt_type : array
+        Integer type code (see MALT_TYPE_CODES).
+
+    Hop Properties
+    --------------
+     alpha_acids : array
+        Alpha acid content, as a fraction (e.g. 0.045 for a 4.5% AA
+        hop); NaN if not specified.
+
+    Water Properties
+    ----------------
+     water_ph : array
+        pH of each candidate water source; NaN if not specified.
+
+    """
+    def __init__(self, malt=None, hops=None, water=None):
+        malt = malt or {}
+        hops = hops or {}
+        water = water or {}
+
+        if 'Sucrose' in malt and 'ppg' in malt['Sucrose']:
+            self.sucrose_ppg = malt['Sucrose']['ppg']
+        else:
+            self.sucrose_ppg = 46
+
+        self.malt_names = sorted(malt.keys())
+        self.malt_ids = {k: i for (i, k) in enumerate(self.malt_names)}
+        self.unknown_malt = len(self.malt_names)
+        num_malts = self.unknown_malt + 1
+
+        self.ppg = np.zeros((num_malts,))
+        self.lovibond = np.zeros((num_malts,))
+        self.distilled_ph = np.zeros((num_malts,))
+        self.buffering_capacity = np.zeros((num_malts,))
+        self.acidity = np.zeros((num_malts,))
+        self.acid = np.ones((num_malts,), dtype=bool)
+        self.malt_type = np.zeros((num_malts,), dtype=int)
+        columns = {k: getattr(self, k) for k in MALT_COLUMNS}
+        for i, name in enumerate(self.malt_names):
+            self._resolve_malt(columns, i, malt[name])
+
+        self.hop_names = sorted(hops.keys())
+        self.hop_ids = {k: i for (i, k) in enumerate(self.hop_names)}
+        self.unknown_hop = len(self.hop_names)
+        self.alpha_acids = np.full((self.unknown_hop + 1,), np.nan)
+        for i, name in enumerate(self.hop_names):
+            if 'alpha acids' in hops[name]:
+                self.alpha_acids[i] = hops[name]['alpha acids'] / 100.
+
+        waters = water.get('water', {})
+        self.water_names = sorted(waters.keys())
+        self.water_ids = {k: i for (i, k) in enumerate(self.water_names)}
+        self.water_ph = np.array([waters[w].get('pH', np.nan)
+                                  for w in self.water_names], dtype=float)
+
+        self.salt_names = sorted(water.get('salts', {}).keys())
+        self.salt_ids = {k: i for (i, k) in enumerate(self.salt_names)}
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a catalog from config['malt'], config['hop'], and
+        config['water'], whichever are present.
+
+        """
+        return cls(config.get('malt', None),
+                   config.get('hop', None),
+                   config.get('water', None))
+
+    def malt_id(self, name):
+        """Id of a malt, or unknown_malt if not in the catalog."""
+        return self.malt_ids.get(name, self.unknown_malt)
+
+    def hop_id(self, name):
+        """Id of a hop, or unknown_hop if not in the catalog."""
+        return self.hop_ids.get(name, self.unknown_hop)
+
+    def malt_properties(self, malts):
+        """Properties of the grist components of a recipe.
+
+        Parameters
+        ----------
+         malts : array_like
+            Array of grist components, as in the 'Malt' array of a
+            recipe. Properties specified there override the catalog.
+
+        Returns
+        -------
+         properties : dict
+            Dictionary of arrays, one entry per grist component, with
+            keys 'id', 'ppg', 'lovibond', 'distilled_ph',
+            'buffering_capacity', 'acidity', 'acid', and 'malt_type'
+            (see class documentation).
+
+        """
+        ids = np.array([self.malt_id(m.get('name', None)) for m in malts],
+                       dtype=int)
+        properties = {k: getattr(self, k)[ids] for k in MALT_COLUMNS}
+        properties['id'] = ids
+
+        for i, m in enumerate(malts):
+            if MALT_OVERRIDES.intersection(m):
+                self._resolve_malt(properties, i, m)
+
+        return properties
+
+    def hop_alpha_acids(self, hops):
+        """Alpha acid content of the hop additions of a recipe.
+
+        Parameters
+        ----------
+         hops : array_like
+            Array of hop additions, as in the 'Hops' array of a
+            recipe. An 'alpha acids' entry there (in percent)
+            overrides the catalog.
+
+        Returns
+        -------
+         alpha_acids : array
+            Alpha acid content of each addition, as a fraction; NaN
+            if not known.
+
+        """
+        ids = np.array([self.hop_id(h.get('name', None)) for h in hops],
+                       dtype=int)
+        alpha_acids = self.alpha_acids[ids]
+        for i, h in enumerate(hops):
+            if 'alpha acids' in h:
+                alpha_acids[i] = h['alpha acids'] / 100.
+
+        return alpha_acids
+
+    def _resolve_malt(self, columns, i, m):
+        """Resolve the properties of malt m into row i of columns.
+
+        Row i is assumed to already hold the fallback values: the
+        defaults when building the catalog, or the catalog entry when
+        applying recipe-level overrides. Properties specified in m
+        take precedence, in the same order as always: ppg over
+        extract potential; distilled pH over acidity over the color
+        of crystal malts.
+
+        """
+        if 'ppg' in m:
+            columns['ppg'][i] = m['ppg']
+        elif 'extract potential' in m:
+            columns['ppg'][i] = m['extract potential'] * self.sucrose_ppg
+
+        if 'degrees lovibond' in m:
+            columns['lovibond'][i] = m['degrees lovibond']
+
+        if 'type' in m:
+            columns['malt_type'][i] = MALT_TYPE_CODES.get(m['type'], 0)
+
+        if 'distilled pH' in m:
+            acid = False
+            acidity = 0.
+            distilled_ph = m['distilled pH']
+            buffering_capacity = m.get('buffering capacity', np.nan)
+        elif 'acidity' in m:
+            acid = True
+            acidity = m['acidity']
+            distilled_ph = buffering_capacity = 0.
+        elif m.get('type', None) == 'crystal' and 'degrees lovibond' in m:
+            acid = True
+            acidity = 0.45 * m['degrees lovibond'] + 6
+            distilled_ph = buffering_capacity = 0.
+        else:
+            return
+
+        columns['acid'][i] = acid
+        columns['acidity'][i] = acidity
+        columns['distilled_ph'][i] = distilled_ph
+        columns['buffering_capacity'][i] = buffering_capacity
+
+
+def get_catalog(config):
+    """Catalog for config, built on first use and cached in
+    config['catalog'].
+
+    """
+    if 'catalog' not in config:
+        config['catalog'] = Catalog.from_config(config)
+
+    return config['catalog']
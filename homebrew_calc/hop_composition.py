@@ -2,30 +2,73 @@ from __future__ import print_function
 import json
 import sys
 import os
-import math
-from unit_parser import unit_parser
+import numpy as np
+from .units import get_unit_parser
+from .catalog import get_catalog
+from .report import render
+from .results import HopResult
 
 
 FIRST_WORT_HOPPING = 'first wort hopping'
 FLAMEOUT = 'flameout'
 
+# Integer codes for the addition types, used in place of the strings
+# above when evaluating many hop additions at once. Anything that is
+# not first wort hopping or flameout (including dry hops, which have
+# no boil time) is a regular, timed addition.
+TIMED_CODE = 0
+FIRST_WORT_HOPPING_CODE = 1
+FLAMEOUT_CODE = 2
+ADDITION_TYPE_CODES = {
+    FIRST_WORT_HOPPING: FIRST_WORT_HOPPING_CODE,
+    FLAMEOUT: FLAMEOUT_CODE
+}
+
+
+def addition_type_code(addition_type):
+    """Integer code(s) for hop addition type(s).
+
+    Parameters
+    ----------
+     addition_type : string, None, or array_like
+        Type of hop addition, as accepted by hop_utilization, or an
+        array of such types (strings or integer codes).
+
+    Returns
+    -------
+     code : int or array
+        TIMED_CODE, FIRST_WORT_HOPPING_CODE, or FLAMEOUT_CODE, or an
+        integer array of these codes.
+
+    """
+    if addition_type is None:
+        return TIMED_CODE
+
+    addition_type = np.asarray(addition_type)
+    if addition_type.dtype.kind in 'iub':
+        return addition_type.astype(int)[()]
+
+    codes = [ADDITION_TYPE_CODES.get(a, TIMED_CODE)
+             for a in addition_type.ravel().tolist()]
+    return np.array(codes, dtype=int).reshape(addition_type.shape)[()]
+
 
 def bigness_factor(wort_gravity):
     """Wort 'bigness factor' for hop utilization.
 
     Parameters
     ----------
-     wort_gravity : float
+     wort_gravity : float or array_like
         Average specific gravity of wort during boil.
 
     Returns
     -------
-     bigness_factor : float
+     bigness_factor : float or array
         Multiplicative factor for hop utilization based on wort
         gravity.
 
     """
-    return 1.65 * (0.000125 ** (wort_gravity - 1))
+    return 1.65 * (0.000125 ** (np.asarray(wort_gravity) - 1))
 
 
 def boil_time_factor(boil_time_minutes):
@@ -33,16 +76,16 @@ def boil_time_factor(boil_time_minutes):
 
     Parameters
     ----------
-     boil_time_minutes : float
+     boil_time_minutes : float or array_like
         Amount of time hops spend in the boil, in minutes.
 
     Returns
     -------
-     boil_time_factor : float
+     boil_time_factor : float or array
         Multiplicative factor for hop utilization based on boil time.
 
     """
-    return (1 - math.exp(-0.04 * boil_time_minutes)) / 4.15
+    return (1 - np.exp(-0.04 * np.asarray(boil_time_minutes))) / 4.15
 
 
 def hop_utilization(wort_gravity, boil_time_minutes, addition_type=None):
@@ -50,32 +93,30 @@ def hop_utilization(wort_gravity, boil_time_minutes, addition_type=None):
 
     Parameters
     ----------
-     wort_gravity : float
+     wort_gravity : float or array_like
         Average specific gravity of wort during boil.
-     boil_time_minutes : float
+     boil_time_minutes : float or array_like
         Amount of time hops spend in the boil, in minutes.
-     addition_type : string or None
+     addition_type : string, None, or array_like
         Type of hop addition. Currently supported options include
         'first wort hopping', 'flameout', or regular, timed hop
         additions. Any addition type other than 'first wort hopping'
         and 'flameout' will be interpreted as a regular, timed
-        addition, e.g. a 20-minute addition.
+        addition, e.g. a 20-minute addition. May also be an array of
+        addition types or of integer codes (see addition_type_code).
 
     Returns
     -------
-     utilization : float
+     utilization : float or array
         Hop utilization.
 
     """
-    if addition_type is not None and addition_type == FLAMEOUT:
-        return 0.13
-
-    bf = bigness_factor(wort_gravity)
-    btf = boil_time_factor(boil_time_minutes)
-    if addition_type is not None and addition_type == FIRST_WORT_HOPPING:
-        return 1.1 * bf * btf
-    else:
-        return bf * btf
+    code = addition_type_code(addition_type)
+    utilization = bigness_factor(wort_gravity) * boil_time_factor(boil_time_minutes)
+    utilization = np.where(code == FIRST_WORT_HOPPING_CODE,
+                           1.1 * utilization, utilization)
+    utilization = np.where(code == FLAMEOUT_CODE, 0.13, utilization)
+    return utilization[()]
 
 
 def ibu_contribution(alpha_acids, mass_oz, boil_vol_gal, utilization,
@@ -84,29 +125,101 @@ def ibu_contribution(alpha_acids, mass_oz, boil_vol_gal, utilization,
 
     Parameters
     ----------
-     alpha_acids : float
+     alpha_acids : float or array_like
         Alpha acid content of hop, e.g. 0.045 for a 4.5% AA hop.
-     mass_oz : float
+     mass_oz : float or array_like
         Weight of hops, in ounces.
-     boil_vol_gal : float
+     boil_vol_gal : float or array_like
         Average volume of boil, in gallons.
-     utilization : float
+     utilization : float or array_like
         Hop utilization.
-     hop_type : string
-        Either 'pellets' or 'whole' (defaults to 'pellets').
+     hop_type : string or array_like
+        Either 'pellets' or 'whole' (defaults to 'pellets'). May also
+        be an array of such strings, or a boolean array that is True
+        for pellets and False for whole hops.
 
     Returns
     -------
-     ibus : float
+     ibus : float or array
         IBU contribution of this addition.
 
     """
 
-    ibus = utilization * alpha_acids * mass_oz * 7490 / boil_vol_gal
-    if hop_type == 'pellets':
-        return ibus / 0.9
+    ibus = (np.asarray(utilization) * alpha_acids * mass_oz * 7490
+            / boil_vol_gal)
+    hop_type = np.asarray(hop_type)
+    if hop_type.dtype.kind == 'b':
+        pellets = hop_type
     else:
-        return ibus
+        pellets = hop_type == 'pellets'
+
+    return np.where(pellets, ibus / 0.9, ibus)[()]
+
+
+def batch_ibus(wort_gravity, boil_time_minutes, addition_type, alpha_acids,
+               mass_oz, boil_vol_gal, pellets=True, recipe=None,
+               num_recipes=None):
+    """IBUs of many hop additions, across many recipes, at once.
+
+    Parameters
+    ----------
+     wort_gravity : float or array_like
+        Average specific gravity of wort during boil. If recipe is
+        specified, this is per recipe; otherwise, per addition.
+     boil_time_minutes : array_like
+        Amount of time each addition spends in the boil, in minutes.
+     addition_type : array_like
+        Addition type of each addition, as strings or integer codes
+        (see addition_type_code).
+     alpha_acids : array_like
+        Alpha acid content of each addition, e.g. 0.045 for a 4.5% AA
+        hop.
+     mass_oz : array_like
+        Weight of each addition, in ounces.
+     boil_vol_gal : float or array_like
+        Average volume of boil, in gallons. If recipe is specified,
+        this is per recipe; otherwise, per addition.
+     pellets : bool or array_like
+        True for pellets, False for whole hops. Defaults to True.
+     recipe : array_like or None
+        Index of the recipe to which each addition belongs. If None,
+        all additions are treated as belonging to a single recipe.
+     num_recipes : int or None
+        Number of recipes. Defaults to one more than the largest
+        recipe index.
+
+    Returns
+    -------
+     ibus : array
+        IBU contribution of each addition.
+     total_ibus : float or array
+        Total IBUs of each recipe (a float if recipe is None).
+
+    """
+    boil_time_minutes = np.asarray(boil_time_minutes, dtype=float)
+    if recipe is not None:
+        recipe = np.asarray(recipe, dtype=int)
+        wort_gravity = np.asarray(wort_gravity, dtype=float)
+        boil_vol_gal = np.asarray(boil_vol_gal, dtype=float)
+        if wort_gravity.ndim > 0:
+            wort_gravity = wort_gravity[recipe]
+        if boil_vol_gal.ndim > 0:
+            boil_vol_gal = boil_vol_gal[recipe]
+
+    utilization = hop_utilization(wort_gravity, boil_time_minutes,
+                                  addition_type_code(addition_type))
+    ibus = ibu_contribution(alpha_acids, mass_oz, boil_vol_gal, utilization,
+                            np.asarray(pellets, dtype=bool))
+    ibus = np.broadcast_to(ibus, boil_time_minutes.shape)
+
+    if recipe is None:
+        return ibus, ibus.sum()
+
+    if num_recipes is None:
+        num_recipes = recipe.max() + 1 if len(recipe) > 0 else 0
+
+    total_ibus = np.bincount(recipe, weights=ibus, minlength=num_recipes)
+    return ibus, total_ibus
 
 
 def main():
@@ -129,18 +242,23 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('recipe', type=str, help='Recipe JSON')
     parser.add_argument('-o', '--output', type=str, help='Output file')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Print nothing')
 
     args = parser.parse_args()
     recipe_config = json.load(open(args.recipe, 'r'))
     if args.output:
         config['Output'] = args.output
 
-    execute(config, recipe_config)
+    execute(config, recipe_config, quiet=args.quiet)
 
 
-def execute(config, recipe_config):
+def execute(config, recipe_config, quiet=False):
     """Calculations relevent to hop characteristics.
 
+    Computes the hop_result, prints its report (see report.render)
+    unless quiet, and, if config['Output'] is given, saves the
+    recipe to that file.
+
     Note: required parameters are in either config or
     recipe_config. Where applicable, if a parameter is specified in
     both config and recipe_config, the latter overrides the former.
@@ -180,11 +298,10 @@ def execute(config, recipe_config):
 
     Returns
     -------
-
-     This function does not return anything. Instead it prints the
-     contribution of each hop addition to the IBUs of the final
-     product, then the total IBUs. The latter are appended to
-     recipe_config, and if requested, saved to file.
+     This function appends the total IBUs to recipe_config and
+     returns both config (unmodified) and recipe_config. The report
+     shows the contribution of each hop addition to the IBUs of the
+     final product, then the total IBUs.
 
     Fields Appended to recipe_config
     --------------------------------
@@ -192,11 +309,33 @@ def execute(config, recipe_config):
         Estimated bitterness level of beer.
 
     """
+    result = hop_result(config, recipe_config)
+    if not quiet:
+        print(render(result))
 
-    if 'units' in config:
-        up = unit_parser(config['units'])
-    else:
-        up = unit_parser()
+    if 'Output' in config:
+        with open(config['Output'], 'w') as outfile:
+            json.dump(recipe_config, outfile, indent=2, sort_keys=True)
+
+    return config, recipe_config
+
+
+def hop_result(config, recipe_config):
+    """Hop calculations, without printing anything.
+
+    Parameters
+    ----------
+     config, recipe_config : dict
+        As in execute. The fields documented there are appended to
+        recipe_config.
+
+    Returns
+    -------
+     result : results.HopResult
+
+    """
+    up = get_unit_parser(config.get('units', None))
+    result = HopResult(additions=[])
 
     if 'Average Gravity' in recipe_config:
         wort_gravity = recipe_config['Average Gravity']
@@ -212,10 +351,12 @@ def execute(config, recipe_config):
     else:
         water_volume = 5.25
         msg = 'Pitchable volume not specified, assuming {0:.02f} gallons'
-        print(msg.format(water_volume))
+        result.assume(msg.format(water_volume))
+
+    hop_alpha_acids = get_catalog(config).hop_alpha_acids(recipe_config['Hops'])
 
     total_ibus = 0.
-    for hop in recipe_config['Hops']:
+    for i, hop in enumerate(recipe_config['Hops']):
         boil_time = 0.
         if 'boil_time' in hop:
             boil_time = up.convert(hop['boil_time'], 'minutes')
@@ -234,36 +375,24 @@ def execute(config, recipe_config):
             msg = 'Mass not specified for {0:s}; exiting.'
             raise ValueError(msg.format(hop.get('name', '')))
 
-        if 'alpha acids' in hop:
-            alpha_acids = hop['alpha acids'] / 100.
-        elif ('name' in hop and hop['name'] in config['hop']
-              and 'alpha acids' in config['hop'][hop['name']]):
-            alpha_acids = config['hop'][hop['name']]['alpha acids'] / 100.
-        elif utilization > 0:
-            msg = 'Alpha Acids not specified for {0:s}; exiting.'
-            raise ValueError(msg.format(hop.get('name', '')))
+        alpha_acids = hop_alpha_acids[i]
+        if np.isnan(alpha_acids):
+            if utilization > 0:
+                msg = 'Alpha Acids not specified for {0:s}; exiting.'
+                raise ValueError(msg.format(hop.get('name', '')))
+            alpha_acids = 0.
 
         ibus = ibu_contribution(alpha_acids, mass, water_volume, utilization,
                                 hop.get('type', 'pellets'))
 
-        if 'boil_time' in hop:
-            msg = '{time:.0f}-minute addition: {ibu:0.1f} IBUs'
-            print(msg.format(time=boil_time, ibu=ibus))
-        elif 'addition type' in hop and hop['addition type'] == FIRST_WORT_HOPPING:
-            print('First-wort hopping addition: {ibu:0.1f} IBUs'.format(ibu=ibus))
-        elif 'addition type' in hop and hop['addition type'] == FLAMEOUT:
-            print('Flameout hopping addition: {ibu:0.1f} IBUs'.format(ibu=ibus))
-
+        addition_type = None if 'boil_time' in hop else hop.get('addition type', None)
+        result.additions.append((addition_type, boil_time, ibus))
         total_ibus += ibus
 
     recipe_config['IBUs'] = total_ibus
-    print('Total IBUs: {0:.1f}'.format(recipe_config['IBUs']))
-
-    if 'Output' in config:
-        with open(config['Output'], 'w') as outfile:
-            json.dump(recipe_config, outfile, indent=2, sort_keys=True)
-
-    return config, recipe_config
+    result.pitchable_volume = water_volume
+    result.ibus = total_ibus
+    return result
 
 
 if __name__ == '__main__':
@@ -2,7 +2,11 @@ from __future__ import print_function
 import json
 import sys
 import os
-from unit_parser import unit_parser
+import numpy as np
+from .units import get_unit_parser
+from .catalog import get_catalog
+from .report import render
+from .results import MaltResult
 
 
 def gravity_points_to_specific_gravity(gravity_points, vol_gal):
@@ -82,18 +86,23 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('recipe', type=str, help='Recipe JSON')
     parser.add_argument('-o', '--output', type=str, help='Output file')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Print nothing')
 
     args = parser.parse_args()
     recipe_config = json.load(open(args.recipe, 'r'))
     if args.output:
         config['Output'] = args.output
 
-    execute(config, recipe_config)
+    execute(config, recipe_config, quiet=args.quiet)
 
 
-def execute(config, recipe_config):
+def execute(config, recipe_config, quiet=False):
     """Calculations relevant to malt characteristics.
 
+    Computes the malt_result, prints its report (see report.render)
+    unless quiet, and, if config['Output'] is given, saves the
+    recipe to that file.
+
     Note: required parameters are in either config or
     recipe_config. Where applicable, if a parameter is specified in
     both config and recipe_config, the latter overrides the former.
@@ -147,9 +156,8 @@ def execute(config, recipe_config):
 
     Returns
     -------
-     This function does not return anything. Instead it prints the
-     below parameters to STDOUT, and, if requested, appends them to
-     the recipe_config before printing to file.
+     This function appends the below parameters to recipe_config and
+     returns both config (unmodified) and recipe_config.
 
     Fields Appended to recipe_config
     --------------------------------
@@ -161,10 +169,33 @@ def execute(config, recipe_config):
         Predicted SRM (color) of wort.
 
     """
-    if 'units' in config:
-        up = unit_parser(config['units'])
-    else:
-        up = unit_parser()
+    result = malt_result(config, recipe_config)
+    if not quiet:
+        print(render(result))
+
+    if 'Output' in config:
+        with open(config['Output'], 'w') as outfile:
+            json.dump(recipe_config, outfile, indent=2, sort_keys=True)
+
+    return config, recipe_config
+
+
+def malt_result(config, recipe_config):
+    """Malt calculations, without printing anything.
+
+    Parameters
+    ----------
+     config, recipe_config : dict
+        As in execute. The fields documented there are appended to
+        recipe_config.
+
+    Returns
+    -------
+     result : results.MaltResult
+
+    """
+    up = get_unit_parser(config.get('units', None))
+    result = MaltResult()
 
     if 'Brewhouse Efficiency' in recipe_config:
         brewhouse_efficiency = recipe_config['Brewhouse Efficiency']
@@ -173,7 +204,7 @@ def execute(config, recipe_config):
     else:
         brewhouse_efficiency = 0.7
         msg = 'Brewhouse efficiency not specified; assuming {0:.0f}%'
-        print(msg.format(100. * brewhouse_efficiency))
+        result.assume(msg.format(100. * brewhouse_efficiency))
 
     if 'Pitchable Volume' in recipe_config:
         pitchable_volume = up.convert(recipe_config['Pitchable Volume'], 'gallons')
@@ -182,45 +213,25 @@ def execute(config, recipe_config):
     else:
         pitchable_volume = 5.25
         msg = 'Pitchable volume not specified, assuming {0:.02f} gallons'
-        print(msg.format(pitchable_volume))
+        result.assume(msg.format(pitchable_volume))
 
-    if 'Sucrose' in config['malt'] and 'ppg' in config['malt']['Sucrose']:
-        sucrose_ppg = config['malt']['Sucrose']['ppg']
-    else:
-        sucrose_ppg = 46
+    properties = get_catalog(config).malt_properties(recipe_config['Malt'])
+    ppg = properties['ppg']
+    degL = properties['lovibond']
 
     total_mass = 0.
     gravity_points = 0.
     mcu = 0.
 
-    for malt in recipe_config['Malt']:
+    for i, malt in enumerate(recipe_config['Malt']):
         if 'mass' in malt:
             mass = up.convert(malt['mass'], 'pounds')
             total_mass += mass
         else:
             mass = 0.
 
-        if 'ppg' in malt:
-            ppg = malt['ppg']
-        elif 'extract potential' in malt:
-            ppg = malt['extract potential'] * sucrose_ppg
-        elif malt['name'] in config['malt'] and 'ppg' in config['malt'][malt['name']]:
-            ppg = config['malt'][malt['name']]['ppg']
-        elif malt['name'] in config['malt'] and 'extract potential' in config['malt'][malt['name']]:
-            ppg = config['malt'][malt['name']]['extract potential'] * sucrose_ppg
-        else:
-            ppg = 0.
-
-        gravity_points += brewhouse_efficiency * ppg * mass
-
-        if 'degrees lovibond' in malt:
-            degL = malt['degrees lovibond']
-        elif malt['name'] in config['malt'] and 'degrees lovibond' in config['malt'][malt['name']]:
-            degL = config['malt'][malt['name']]['degrees lovibond']
-        else:
-            degL = 0.
-
-        mcu += degL * mass
+        gravity_points += brewhouse_efficiency * ppg[i] * mass
+        mcu += degL[i] * mass
 
     if 'Water to Grist Ratio' in recipe_config:
         wtgr = up.convert(recipe_config['Water to Grist Ratio'], 'gallons_per_pound')
@@ -230,7 +241,7 @@ def execute(config, recipe_config):
         wtgr = up.convert(1.2, 'quarts_per_pound', 'gallons_per_pound')
         msg = 'Water to Grist Ratio not specified,'
         msg += ' assuming 1.2 quarts_per_pound'
-        print(msg)
+        result.assume(msg)
 
     water_volume = '{0:.6f} gallons'.format(wtgr * total_mass)
     if (('Preferred Units' in config
@@ -245,15 +256,148 @@ def execute(config, recipe_config):
     recipe_config['Original Gravity'] = og
     recipe_config['SRM'] = wort_srm(mcu, pitchable_volume)
 
-    # print('Mash Water Volume: {0:s}'.format(recipe_config['Mash Water Volume']))
-    print('Original Gravity: {0:.03f}'.format(og))
-    print('SRM: {0:.0f}'.format(recipe_config['SRM']))
+    result.brewhouse_efficiency = brewhouse_efficiency
+    result.pitchable_volume = pitchable_volume
+    result.water_to_grist_ratio = wtgr
+    result.grain_mass = total_mass
+    result.mash_water_volume = wtgr * total_mass
+    result.original_gravity = og
+    result.srm = recipe_config['SRM']
+    return result
 
-    if 'Output' in config:
-        with open(config['Output'], 'w') as outfile:
-            json.dump(recipe_config, outfile, indent=2, sort_keys=True)
 
-    return config, recipe_config
+def compile_grain_bills(config, recipe_configs, up=None):
+    """Compile the grain bills of many recipes into a mass matrix.
+
+    Each distinct grist component (a malt name together with any
+    properties overridden in the recipe) becomes a column of a sparse
+    recipe-by-malt mass matrix, and its properties are resolved only
+    once, no matter how many recipes use it.
+
+    Parameters
+    ----------
+     config : dict
+        Configuration; config['malt'] describes known malts (see
+        catalog.Catalog).
+     recipe_configs : array_like
+        Array of recipes, each with a 'Malt' array as described in
+        execute.
+     up : CachedUnitParser or None
+        Unit parser used to convert masses. If None, the shared parser
+        for config['units'] is used.
+
+    Returns
+    -------
+     masses : scipy.sparse.csr_matrix
+        Recipe-by-malt matrix of masses, in pounds.
+     properties : 2d array
+        Malt-by-property matrix. The columns are ppg and degrees
+        Lovibond.
+     malts : list
+        The grist component (as a dict) corresponding to each column
+        of masses.
+
+    """
+    from scipy import sparse
+
+    if up is None:
+        up = get_unit_parser(config.get('units', None))
+
+    malt_dict = {}
+    malts = []
+    rows = []
+    cols = []
+    data = []
+    for i, recipe_config in enumerate(recipe_configs):
+        for malt in recipe_config['Malt']:
+            if 'mass' not in malt:
+                continue
+
+            key = (malt.get('name', None),
+                   malt.get('ppg', None),
+                   malt.get('extract potential', None),
+                   malt.get('degrees lovibond', None))
+            if key not in malt_dict:
+                malt_dict[key] = len(malts)
+                malts.append(malt)
+
+            rows.append(i)
+            cols.append(malt_dict[key])
+            data.append(up.convert(malt['mass'], 'pounds'))
+
+    masses = sparse.csr_matrix((data, (rows, cols)),
+                               shape=(len(recipe_configs), len(malts)))
+    properties = get_catalog(config).malt_properties(malts)
+    properties = np.column_stack((properties['ppg'], properties['lovibond']))
+    return masses, properties, malts
+
+
+def batch_execute(config, recipe_configs):
+    """Malt calculations for many recipes at once.
+
+    Computes the same quantities as execute, for every recipe, via a
+    single product of the recipe-by-malt mass matrix with the
+    malt-by-property matrix (see compile_grain_bills). Parameters
+    missing from a recipe are taken from config, or from the same
+    defaults as execute, without printing anything.
+
+    Parameters
+    ----------
+     config : dict
+        Configuration, as in execute.
+     recipe_configs : array_like
+        Array of recipes, as in execute.
+
+    Returns
+    -------
+     results : dict
+        Dictionary of arrays, with one entry per recipe:
+         'Original Gravity' : predicted specific gravity of wort
+            before pitching yeast.
+         'SRM' : predicted SRM (color) of wort.
+         'Total Grist Mass' : total mass of the grain bill, in pounds.
+         'Mash Water Volume' : amount of mash water needed, in
+            gallons.
+
+    """
+    up = get_unit_parser(config.get('units', None))
+
+    masses, properties, malts = compile_grain_bills(config, recipe_configs, up)
+
+    num_recipes = len(recipe_configs)
+    brewhouse_efficiency = np.empty((num_recipes,))
+    pitchable_volume = np.empty((num_recipes,))
+    wtgr = np.empty((num_recipes,))
+    for i, recipe_config in enumerate(recipe_configs):
+        brewhouse_efficiency[i] = _recipe_parameter(
+            'Brewhouse Efficiency', config, recipe_config, 0.7)
+        pitchable_volume[i] = up.convert(_recipe_parameter(
+            'Pitchable Volume', config, recipe_config, '5.25 gallons'), 'gallons')
+        wtgr[i] = up.convert(_recipe_parameter(
+            'Water to Grist Ratio', config, recipe_config, '1.2 quarts_per_pound'),
+                             'gallons_per_pound')
+
+    grist = masses.dot(properties)
+    total_mass = np.asarray(masses.sum(axis=1)).ravel()
+    gravity_points = brewhouse_efficiency * grist[:, 0]
+    mcu = grist[:, 1]
+
+    return {
+        'Original Gravity': gravity_points_to_specific_gravity(gravity_points,
+                                                               pitchable_volume),
+        'SRM': wort_srm(mcu, pitchable_volume),
+        'Total Grist Mass': total_mass,
+        'Mash Water Volume': wtgr * total_mass
+    }
+
+
+def _recipe_parameter(key, config, recipe_config, default):
+    if key in recipe_config:
+        return recipe_config[key]
+    elif key in config:
+        return config[key]
+    else:
+        return default
 
 
 if __name__ == '__main__':
@@ -0,0 +1,175 @@
+from __future__ import print_function
+from collections import namedtuple
+import numpy as np
+
+
+MashCurve = namedtuple('MashCurve', [
+    'times', 'temperatures', 'infusions', 'final_temperatures'
+])
+MashCurve.__doc__ = """Simulated temperature of one or more mash schedules.
+
+ times : array
+    Time since the start of the first step, in hours.
+ temperatures : 2d array
+    Schedule-by-time array of mash temperatures, in degC; NaN after
+    a schedule has ended. The times do not run past the end of the
+    longest schedule, so the end of a schedule may fall between
+    them (see final_temperatures).
+ infusions : 2d array
+    Schedule-by-step array of the thermal mass of the water infused
+    at the start of each step, in calories per degC (0 for the first
+    step, and for steps needing no infusion).
+ final_temperatures : 2d array
+    Schedule-by-step array of the mash temperature at the end of
+    each step, in degC.
+
+"""
+
+
+def simulate_mash(step_temperatures, step_durations, thermal_mass, heat_loss,
+                  ambient_temperature, infusion_temperature=100.,
+                  time_step=1. / 60):
+    """Simulate the temperature of many mash schedules at once.
+
+    The mash (grain, water, and tun, as one lumped thermal mass) loses
+    heat to its surroundings in proportion to the temperature
+    difference,
+
+      thermal_mass * dT/dt = -heat_loss * (T - ambient_temperature),
+
+    so it cools exponentially towards the ambient temperature, faster
+    when the mash is hotter or smaller. The first step starts at its
+    temperature (the strike water having been chosen to hit it); each
+    later step starts with an infusion of water at
+    infusion_temperature, just enough to bring the mash up to the
+    step temperature, which adds to the thermal mass. A mash already
+    at or above the step temperature gets no infusion.
+
+    Between output times, and around infusions, the temperature is
+    advanced with the exact solution of the cooling equation, so the
+    result does not depend on time_step, which only sets the
+    resolution of the curves. All schedules advance together, with
+    NumPy operations over the schedules.
+
+    Parameters
+    ----------
+     step_temperatures : array_like
+        Schedule-by-step array (or, for one schedule, an array per
+        step) of step temperatures, in degC. Schedules with fewer
+        steps may be padded with steps of zero duration and NaN
+        temperature, which are skipped.
+     step_durations : array_like
+        Duration of each step, in hours, in the same shape.
+     thermal_mass : array_like
+        Thermal mass of the mash at the start of the first step, per
+        schedule (or one for all), in calories per degC.
+     heat_loss : array_like
+        Heat loss coefficient of the mash tun, per schedule (or one
+        for all), in calories per hour per degC (see
+        heat_loss_coefficient).
+     ambient_temperature : array_like
+        Ambient temperature, per schedule (or one for all), in degC.
+     infusion_temperature : array_like
+        Temperature of the infused water, in degC. Defaults to 100.
+     time_step : float
+        Time between points of the curves, in hours. Defaults to one
+        minute.
+
+    Returns
+    -------
+     curve : MashCurve
+
+    """
+    step_temperatures = np.atleast_2d(np.asarray(step_temperatures, dtype=float))
+    step_durations = np.atleast_2d(np.asarray(step_durations, dtype=float))
+    num_schedules, num_steps = step_temperatures.shape
+    shape = (num_schedules,)
+    capacity = np.broadcast_to(np.asarray(thermal_mass, dtype=float), shape).copy()
+    heat_loss = np.broadcast_to(np.asarray(heat_loss, dtype=float), shape)
+    ambient = np.broadcast_to(np.asarray(ambient_temperature, dtype=float), shape)
+    infusion_temperature = np.broadcast_to(
+        np.asarray(infusion_temperature, dtype=float), shape)
+
+    ends = np.cumsum(step_durations, axis=1)
+    total = ends[:, -1]
+    num_points = int(np.floor(total.max() / time_step + 1e-9)) + 1
+    times = np.arange(num_points) * time_step
+
+    temperatures = np.full((num_schedules, num_points), np.nan)
+    infusions = np.zeros((num_schedules, num_steps))
+    final_temperatures = np.full((num_schedules, num_steps), np.nan)
+
+    rows = np.arange(num_schedules)
+    T = step_temperatures[:, 0].copy()
+    step = np.zeros(shape, dtype=int)
+    clock = np.zeros(shape)
+    active = np.ones(shape, dtype=bool)
+    temperatures[:, 0] = T
+
+    def cool(mask, until):
+        decay = np.exp(-heat_loss[mask] * (until - clock[mask]) / capacity[mask])
+        T[mask] = ambient[mask] + (T[mask] - ambient[mask]) * decay
+        clock[mask] = until
+
+    def end_steps(t):
+        # Step boundaries up to t, possibly several per schedule.
+        while True:
+            boundary = ends[rows, np.minimum(step, num_steps - 1)]
+            hit = active & (boundary <= t + 1e-12)
+            if not hit.any():
+                return
+
+            cool(hit, boundary[hit])
+            final_temperatures[hit, step[hit]] = T[hit]
+            step[hit] += 1
+            active[hit & (step >= num_steps)] = False
+
+            start = hit & active
+            target = step_temperatures[rows[start], step[start]]
+            T_start = T[start]
+            added = capacity[start] * (target - T_start) / (
+                infusion_temperature[start] - target)
+            added = np.where(np.isfinite(added) & (added > 0), added, 0.)
+            infusions[start, step[start]] = added
+            T[start] = (capacity[start] * T_start
+                        + added * infusion_temperature[start]) / (capacity[start] + added)
+            capacity[start] += added
+
+    for k in range(1, num_points):
+        t = times[k]
+        end_steps(t)
+        cool(active, t)
+        temperatures[active, k] = T[active]
+        # Schedules ending exactly at t have their final temperature.
+        ended = ~active & (np.abs(total - t) <= 1e-12)
+        temperatures[ended, k] = final_temperatures[ended, -1]
+
+    end_steps(total.max())
+
+    return MashCurve(times, temperatures, infusions, final_temperatures)
+
+
+def heat_loss_coefficient(thermal_mass, cooling_rate, mash_temperature,
+                          ambient_temperature):
+    """Heat loss coefficient of a mash tun, from its cooling rate.
+
+    Parameters
+    ----------
+     thermal_mass : array_like
+        Thermal mass of the mash, in calories per degC.
+     cooling_rate : array_like
+        Rate at which the mash cools at mash_temperature, in degC per
+        hour (e.g. the 'Mash Cooling Rate' of the configuration).
+     mash_temperature : array_like
+        Mash temperature, in degC.
+     ambient_temperature : array_like
+        Ambient temperature, in degC.
+
+    Returns
+    -------
+     heat_loss : array_like
+        Heat loss coefficient, in calories per hour per degC (see
+        simulate_mash).
+
+    """
+    return cooling_rate * thermal_mass / (mash_temperature - ambient_temperature)
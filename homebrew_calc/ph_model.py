@@ -0,0 +1,652 @@
+from __future__ import print_function
+import hashlib
+import io
+import os
+import threading
+import numpy as np
+from .catalog import MALT_OVERRIDES, get_catalog
+
+
+BASELINE_PH = 4.3
+
+
+class ChargeTable(object):
+    """Charge per mmole of carbonate species as a function of pH.
+
+    The table (resources/mmole_data.txt) is piecewise linear in pH.
+    Evaluating it is a single np.interp call on arrays of pH, so batch
+    calculations and solver iterations need neither the file system
+    nor interpolator objects.
+
+    Parameters
+    ----------
+     data : 2d array
+        pH (first column) and charge per mmole (second column), with
+        pH increasing.
+
+    """
+    def __init__(self, data):
+        data = np.asarray(data, dtype=float)
+        self.ph = np.ascontiguousarray(data[:, 0])
+        self.charge = np.ascontiguousarray(data[:, 1])
+        self.slope = np.diff(self.charge) / np.diff(self.ph)
+
+    @classmethod
+    def from_file(cls, filename):
+        """Load a table from a comma-separated text file.
+
+        If a sidecar with the same name and a .npz extension (see
+        save) sits next to the file, and was saved from a text file
+        with the same content, the sidecar is loaded instead, skipping
+        the text parsing. The text file need not exist in that case;
+        an edited text file takes precedence over its (stale) sidecar.
+
+        """
+        sidecar = os.path.splitext(filename)[0] + '.npz'
+        if not os.path.isfile(filename):
+            with np.load(sidecar) as f:
+                return cls(f['data'])
+
+        with open(filename, 'rb') as f:
+            text = f.read()
+        if os.path.isfile(sidecar):
+            with np.load(sidecar) as f:
+                if str(f['source']) == hashlib.sha256(text).hexdigest():
+                    return cls(f['data'])
+        return cls(np.genfromtxt(io.BytesIO(text), delimiter=','))
+
+    def save(self, filename, source=None):
+        """Save the table as a .npz sidecar (see from_file).
+
+        Parameters
+        ----------
+         filename : str
+            File to save the sidecar to.
+         source : str or None
+            Text file the table was loaded from. The sidecar is only
+            used in its place while the content of the text file is
+            unchanged; without a source, it is only used when the text
+            file is missing.
+
+        """
+        if source is None:
+            digest = ''
+        else:
+            with open(source, 'rb') as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+        np.savez(filename, data=np.column_stack((self.ph, self.charge)),
+                 source=np.array(digest))
+
+    def __call__(self, pH):
+        """Charge per mmole at pH (scalar or array)."""
+        return np.interp(pH, self.ph, self.charge)
+
+    def derivative(self, pH):
+        """Derivative of the charge per mmole at pH (scalar or array).
+
+        Zero outside the table, where the charge is held constant.
+
+        """
+        pH = np.asarray(pH, dtype=float)
+        i = np.searchsorted(self.ph, pH, side='right') - 1
+        slope = self.slope[np.clip(i, 0, len(self.slope) - 1)]
+        inside = (pH >= self.ph[0]) & (pH <= self.ph[-1])
+        return np.where(inside, slope, 0.)[()]
+
+
+_charge_tables = {}
+_charge_tables_lock = threading.Lock()
+
+
+def get_charge_table(filename):
+    """Process-wide shared charge table.
+
+    The table is loaded (see ChargeTable.from_file) on the first
+    request for a file, and shared by every later one. If the file
+    (or, without it, its sidecar) is modified, it is loaded again on
+    the next request.
+
+    Parameters
+    ----------
+     filename : str
+        Location of the charge table, e.g. resources/mmole_data.txt.
+
+    Returns
+    -------
+     table : ChargeTable
+
+    """
+    path = os.path.abspath(filename)
+    if os.path.isfile(path):
+        stat = os.stat(path)
+    else:
+        stat = os.stat(os.path.splitext(path)[0] + '.npz')
+    stamp = (stat.st_mtime, stat.st_size)
+    with _charge_tables_lock:
+        entry = _charge_tables.get(path, None)
+        if entry is None or entry[0] != stamp:
+            entry = (stamp, ChargeTable.from_file(path))
+            _charge_tables[path] = entry
+        return entry[1]
+
+
+class MashPHModel(object):
+    """Mash pH balance equation for one recipe, compiled once.
+
+    The balance equation (see water_composition.mash_ph) weighs the
+    alkalinity of the mash water against the acidity of the grist at a
+    candidate mash pH. Everything in it except the candidate pH is
+    fixed by the recipe, so we gather the per-malt arrays, unit
+    conversions, and charge curve once, and reduce the equation to
+
+      balance(pH) = k * charge(pH) - B * pH + offset
+
+    where charge is the piecewise-linear charge per mmole of
+    carbonate species, B is the total buffering of the base malts,
+    and k and offset collect the water chemistry. Since balance is
+    itself piecewise linear, its derivative is piecewise constant,
+    and a bracketed Newton iteration finds the root in a handful of
+    evaluations.
+
+    Parameters
+    ----------
+     mineral_profile : array_like
+        Mineral profile of the mash water, in ppm, in the order used
+        by get_targets (calcium, magnesium, sulfate, sodium, chloride,
+        alkalinity).
+     water_volume : float
+        Mash water volume, in liters.
+     lactic_acid_volume : float
+        Volume of (88%) lactic acid added to the mash, in milliliters.
+     malt_mass : array_like
+        Mass of each grist component, in kilograms.
+     acid : array_like
+        For each grist component, True if it contributes acidity,
+        False if it is a base malt (see catalog.Catalog).
+     distilled_ph : array_like
+        Distilled water pH of each base malt.
+     buffering_capacity : array_like
+        Buffering capacity of each base malt, in mEq/kg.
+     acidity : array_like
+        Acidity of each acidic malt, in mEq/kg.
+     brewing_water_ph : float
+        pH of the brewing water.
+     charge_data : ChargeTable or 2d array
+        Charge per mmole (second column) as a function of pH (first
+        column).
+     acidulated_delta : float
+        Reduction in mash pH attributed to acidulated malt, applied
+        after solving the balance equation. Defaults to 0.
+
+    """
+    def __init__(self, mineral_profile, water_volume, lactic_acid_volume,
+                 malt_mass, acid, distilled_ph, buffering_capacity, acidity,
+                 brewing_water_ph, charge_data, acidulated_delta=0.):
+        if not isinstance(charge_data, ChargeTable):
+            charge_data = ChargeTable(charge_data)
+        self.charge_table = charge_data
+        self.acidulated_delta = acidulated_delta
+        self.charge_water = charge_data(brewing_water_ph)
+        self.k_lactic = _lactic_acid_coefficient(charge_data, brewing_water_ph)
+        self.k, self.B, self.offset = _balance_coefficients(
+            charge_data, mineral_profile, water_volume, lactic_acid_volume,
+            np.asarray(malt_mass, dtype=float), acid, distilled_ph,
+            buffering_capacity, acidity, brewing_water_ph)
+
+    @classmethod
+    def from_recipe(cls, config, recipe_config, charge_data):
+        """Compile the balance equation of a recipe.
+
+        Parameters
+        ----------
+         config : dict
+            Configuration, including the 'unit_parser', the
+            'mineral_profile' achieved by salt_additions, and the
+            'water' and 'malt' catalogs.
+         recipe_config : dict
+            Recipe, including 'Malt', 'Mash Water Volume', and
+            optionally 'Lactic Acid'.
+         charge_data : ChargeTable or 2d array
+            Charge per mmole as a function of pH.
+
+        Returns
+        -------
+         model : MashPHModel
+
+        """
+        water_volume, lactic_acid_volume, malts, malt_mass = _mash_inputs(
+            config['unit_parser'], recipe_config)
+
+        catalog = get_catalog(config)
+        brewing_water_ph = catalog.water_ph[catalog.water_ids['distilled']]
+        properties = _malt_properties(catalog, malts)
+
+        return cls(config['mineral_profile'], water_volume, lactic_acid_volume,
+                   malt_mass, properties['acid'], properties['distilled_ph'],
+                   properties['buffering_capacity'], properties['acidity'],
+                   brewing_water_ph, charge_data,
+                   acidulated_delta(config, recipe_config))
+
+    def charge_at(self, pH):
+        """Charge per mmole at pH (scalar or array)."""
+        return self.charge_table(pH)
+
+    def balance(self, pH):
+        """Mash pH misbalance at pH (scalar or array).
+
+        Positive values mean the mash pH is higher than pH.
+
+        """
+        pH = np.asarray(pH, dtype=float)
+        return (self.k * self.charge_at(pH) - self.B * pH + self.offset)[()]
+
+    def derivative(self, pH):
+        """Derivative of balance with respect to pH (scalar or array)."""
+        return self.k * self.charge_table.derivative(pH) - self.B
+
+    def solve(self, low=4.5, high=8.5, tol=1e-6, max_iter=100, full_output=False):
+        """Solve the balance equation for the mash pH.
+
+        Uses Newton's method, safeguarded so the iterate never leaves
+        the bracket [low, high]: when a Newton step would leave it, we
+        take a false-position step between the bracket endpoints
+        instead (which is exact once the bracket lies within one
+        linear piece of the balance equation), falling back on
+        bisection. If the balance does not change sign over the
+        bracket, the endpoint nearest the root is returned, as
+        bisection would.
+
+        Parameters
+        ----------
+         low, high : float
+            Bracket for the mash pH. Defaults to 4.5 and 8.5.
+         tol : float
+            Tolerance on the mash pH. Defaults to 1e-6.
+         max_iter : int
+            Maximum number of iterations.
+         full_output : bool
+            If True, also return the number of balance evaluations.
+
+        Returns
+        -------
+         pH : float
+            Mash pH, before any acidulated malt adjustment.
+         evaluations : int
+            Number of balance evaluations (only if full_output).
+
+        """
+        b_low = self.balance(low)
+        b_high = self.balance(high)
+        evaluations = 2
+        if b_low <= 0:
+            pH = low
+        elif b_high > 0:
+            pH = high
+        else:
+            pH = 0.5 * (low + high)
+            for _ in range(max_iter):
+                b = self.balance(pH)
+                evaluations += 1
+                if b == 0:
+                    break
+                elif b > 0:
+                    low, b_low = pH, b
+                else:
+                    high, b_high = pH, b
+
+                d = self.derivative(pH)
+                candidate = pH - b / d if d != 0 else low
+                if not (low < candidate < high):
+                    candidate = low - b_low * (high - low) / (b_high - b_low)
+                if not (low < candidate < high):
+                    candidate = 0.5 * (low + high)
+
+                converged = abs(candidate - pH) < 1e-3 * tol or high - low < tol
+                pH = candidate
+                if converged:
+                    break
+
+        if full_output:
+            return pH, evaluations
+        return pH
+
+    def lactic_acid_volume(self, pH):
+        """Lactic acid to add for the mash pH to be pH.
+
+        Lactic acid only offsets the alkalinity of the mash water, so
+        k, and with it the balance at any fixed pH, is linear in the
+        volume of lactic acid, and the volume solving the balance
+        equation at pH is found in one step.
+
+        Parameters
+        ----------
+         pH : float
+            Desired mash pH, before any acidulated malt adjustment.
+
+        Returns
+        -------
+         volume : float
+            Volume of (88%) lactic acid, in milliliters, on top of any
+            already in the mash; negative if the mash pH is already
+            below pH.
+
+        """
+        return -self.balance(pH) / (self.k_lactic * (self.charge_at(pH) - self.charge_water))
+
+    def add_lactic_acid(self, volume):
+        """Add volume (in milliliters) of lactic acid to the mash,
+        updating the balance equation in place.
+
+        """
+        dk = self.k_lactic * volume
+        self.k = self.k + dk
+        self.offset = self.offset - dk * self.charge_water
+
+
+class BatchMashPHModel(object):
+    """Mash pH balance equations of many recipes, solved in lockstep.
+
+    The batch analogue of MashPHModel: recipe i has its own
+
+      balance_i(pH) = k[i] * charge(pH) - B[i] * pH + offset[i]
+
+    and solve runs the same safeguarded Newton iteration on every
+    recipe at once, with NumPy operations over the recipes that have
+    not yet converged.
+
+    Parameters
+    ----------
+     mineral_profiles : array_like
+        Mineral profile of the mash water of each recipe (one row per
+        recipe), or a single profile shared by all recipes, in ppm
+        (see MashPHModel).
+     water_volumes : array_like
+        Mash water volume of each recipe, in liters.
+     lactic_acid_volumes : array_like
+        Volume of (88%) lactic acid added to each mash, in
+        milliliters.
+     malt_masses : 2d array or scipy.sparse matrix
+        Recipe-by-malt matrix of masses, in kilograms.
+     acid, distilled_ph, buffering_capacity, acidity : array_like
+        Properties of the malt in each column of malt_masses (see
+        MashPHModel).
+     brewing_water_ph : float
+        pH of the brewing water.
+     charge_data : ChargeTable or 2d array
+        Charge per mmole as a function of pH.
+     acidulated_delta : array_like
+        Reduction in mash pH attributed to acidulated malt, for each
+        recipe. Defaults to 0.
+
+    """
+    def __init__(self, mineral_profiles, water_volumes, lactic_acid_volumes,
+                 malt_masses, acid, distilled_ph, buffering_capacity, acidity,
+                 brewing_water_ph, charge_data, acidulated_delta=0.):
+        if not isinstance(charge_data, ChargeTable):
+            charge_data = ChargeTable(charge_data)
+        self.charge_table = charge_data
+        self.num_recipes = malt_masses.shape[0]
+
+        r = np.asarray(mineral_profiles, dtype=float)
+        if r.ndim == 1:
+            r = np.tile(r, (self.num_recipes, 1))
+
+        self.acidulated_delta = np.broadcast_to(
+            np.asarray(acidulated_delta, dtype=float), (self.num_recipes,))
+        self.k, self.B, self.offset = _balance_coefficients(
+            charge_data, r, np.asarray(water_volumes, dtype=float),
+            np.asarray(lactic_acid_volumes, dtype=float), malt_masses, acid,
+            distilled_ph, buffering_capacity, acidity, brewing_water_ph)
+
+    @classmethod
+    def from_recipes(cls, config, recipe_configs, charge_data,
+                     mineral_profiles=None):
+        """Compile the balance equations of many recipes.
+
+        Each distinct grist component (a malt name together with any
+        properties overridden in the recipe) becomes a column of a
+        sparse recipe-by-malt mass matrix, and its properties are
+        resolved only once.
+
+        Parameters
+        ----------
+         config : dict
+            Configuration, as in MashPHModel.from_recipe.
+         recipe_configs : array_like
+            Array of recipes, as in MashPHModel.from_recipe.
+         charge_data : ChargeTable or 2d array
+            Charge per mmole as a function of pH.
+         mineral_profiles : array_like or None
+            Mineral profile of the mash water of each recipe (or one
+            shared by all). Defaults to config['mineral_profile'].
+
+        Returns
+        -------
+         model : BatchMashPHModel
+
+        """
+        from scipy import sparse
+
+        up = config['unit_parser']
+        if mineral_profiles is None:
+            mineral_profiles = config['mineral_profile']
+
+        num_recipes = len(recipe_configs)
+        water_volumes = np.empty((num_recipes,))
+        lactic_acid_volumes = np.empty((num_recipes,))
+        delta = np.empty((num_recipes,))
+
+        malt_dict = {}
+        malts = []
+        rows = []
+        cols = []
+        data = []
+        for i, recipe_config in enumerate(recipe_configs):
+            water_volumes[i], lactic_acid_volumes[i], recipe_malts, malt_mass = \
+                _mash_inputs(up, recipe_config)
+            delta[i] = acidulated_delta(config, recipe_config)
+
+            for m, mass in zip(recipe_malts, malt_mass):
+                key = (m['name'],) + tuple(m.get(k, None)
+                                           for k in sorted(MALT_OVERRIDES))
+                if key not in malt_dict:
+                    malt_dict[key] = len(malts)
+                    malts.append(m)
+
+                rows.append(i)
+                cols.append(malt_dict[key])
+                data.append(mass)
+
+        catalog = get_catalog(config)
+        brewing_water_ph = catalog.water_ph[catalog.water_ids['distilled']]
+        properties = _malt_properties(catalog, malts)
+
+        malt_masses = sparse.csr_matrix((data, (rows, cols)),
+                                        shape=(num_recipes, len(malts)))
+        return cls(mineral_profiles, water_volumes, lactic_acid_volumes,
+                   malt_masses, properties['acid'], properties['distilled_ph'],
+                   properties['buffering_capacity'], properties['acidity'],
+                   brewing_water_ph, charge_data, delta)
+
+    def balance(self, pH, recipes=None):
+        """Mash pH misbalance of each recipe.
+
+        Parameters
+        ----------
+         pH : array_like
+            Candidate mash pH of each recipe.
+         recipes : array_like or None
+            Indices of the recipes to evaluate (pH then has one entry
+            per index). Defaults to all recipes.
+
+        """
+        if recipes is None:
+            recipes = slice(None)
+        pH = np.asarray(pH, dtype=float)
+        return (self.k[recipes] * self.charge_table(pH) - self.B[recipes] * pH
+                + self.offset[recipes])
+
+    def derivative(self, pH, recipes=None):
+        """Derivative of balance with respect to pH (see balance)."""
+        if recipes is None:
+            recipes = slice(None)
+        return (self.k[recipes] * self.charge_table.derivative(pH)
+                - self.B[recipes])
+
+    def solve(self, low=4.5, high=8.5, tol=1e-6, max_iter=100):
+        """Solve the balance equations for the mash pH of every recipe.
+
+        Each iteration takes one safeguarded Newton step (see
+        MashPHModel.solve) for every recipe that has not yet
+        converged; converged recipes drop out of later iterations.
+
+        Parameters
+        ----------
+         low, high : float
+            Bracket for the mash pH. Defaults to 4.5 and 8.5.
+         tol : float
+            Tolerance on the mash pH. Defaults to 1e-6.
+         max_iter : int
+            Maximum number of iterations.
+
+        Returns
+        -------
+         pH : array
+            Mash pH of each recipe, before any acidulated malt
+            adjustment.
+         converged : array
+            True for each recipe whose mash pH converged within
+            max_iter iterations. Recipes whose balance does not
+            change sign over the bracket get the endpoint nearest the
+            root, and are not converged.
+
+        """
+        n = self.num_recipes
+        low = np.full((n,), float(low))
+        high = np.full((n,), float(high))
+        b_low = self.balance(low)
+        b_high = self.balance(high)
+
+        pH = np.where(b_low <= 0, low, np.where(b_high > 0, high, 0.5 * (low + high)))
+        active = (b_low > 0) & (b_high <= 0)
+        converged = np.zeros((n,), dtype=bool)
+
+        for _ in range(max_iter):
+            idx = np.flatnonzero(active)
+            if len(idx) == 0:
+                break
+
+            p = pH[idx]
+            b = self.balance(p, idx)
+            positive = b > 0
+            lo = np.where(positive, p, low[idx])
+            b_lo = np.where(positive, b, b_low[idx])
+            hi = np.where(positive, high[idx], p)
+            b_hi = np.where(positive, b_high[idx], b)
+
+            d = self.derivative(p, idx)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                candidate = np.where(d != 0, p - b / d, lo)
+                outside = ~((lo < candidate) & (candidate < hi))
+                candidate[outside] = (lo - b_lo * (hi - lo) / (b_hi - b_lo))[outside]
+                outside = ~((lo < candidate) & (candidate < hi))
+                candidate[outside] = 0.5 * (lo + hi)[outside]
+
+            root = b == 0
+            done = root | (np.abs(candidate - p) < 1e-3 * tol) | (hi - lo < tol)
+            pH[idx] = np.where(root, p, candidate)
+            low[idx], b_low[idx], high[idx], b_high[idx] = lo, b_lo, hi, b_hi
+            converged[idx] = done
+            active[idx] = ~done
+
+        return pH, converged
+
+
+def _mash_inputs(up, recipe_config):
+    """Mash water volume (in liters), lactic acid volume (in
+    milliliters), and grist components other than acidulated malt,
+    with their masses (in kilograms), that enter the balance equation
+    of a recipe.
+
+    """
+    if 'Mash Water Volume' not in recipe_config:
+        msg = 'Mash Water Volume not specified.'
+        msg += ' Try running malt_composition first.'
+        raise ValueError(msg)
+
+    water_volume = up.convert(recipe_config['Mash Water Volume'], 'liters')
+    if 'Lactic Acid' in recipe_config:
+        lactic_acid_volume = up.convert(recipe_config['Lactic Acid'], 'milliliters')
+    else:
+        lactic_acid_volume = 0.
+
+    malts = [x for x in recipe_config['Malt'] if x['name'] != 'Acidulated Malt']
+    malt_mass = [up.convert(x['mass'], 'kilograms') if 'mass' in x else 0.
+                 for x in malts]
+    return water_volume, lactic_acid_volume, malts, malt_mass
+
+
+def _malt_properties(catalog, malts):
+    """Catalog properties of grist components, checking that every
+    base malt has a buffering capacity."""
+    properties = catalog.malt_properties(malts)
+    missing = ~properties['acid'] & np.isnan(properties['buffering_capacity'])
+    if missing.any():
+        msg = 'Buffering capacity required for {0:s}.'
+        raise ValueError(msg.format(malts[np.argmax(missing)]['name']))
+
+    return properties
+
+
+def _balance_coefficients(table, mineral_profile, water_volume, lactic_acid_volume,
+                          malt_mass, acid, distilled_ph, buffering_capacity,
+                          acidity, brewing_water_ph):
+    """Coefficients k, B, and offset of the balance equation (see
+    MashPHModel), for one recipe or, with a mineral profile per row
+    and a recipe-by-malt mass matrix, for many.
+
+    """
+    r = np.asarray(mineral_profile, dtype=float)
+    acid = np.asarray(acid, dtype=bool)
+    base_buffering = np.where(acid, 0., buffering_capacity)
+
+    charge_water = table(brewing_water_ph)
+    delta_c0 = table(BASELINE_PH) - charge_water
+    total_alkalinity = (r[..., 5] - (100 / 0.17) * lactic_acid_volume / water_volume) / 50 # mEq / L
+    hardness = (r[..., 0] * 2 / 40.078) / 3.5 + (r[..., 1] * 2 / 24.305) / 7
+
+    k = total_alkalinity * water_volume / delta_c0
+    B = malt_mass.dot(base_buffering)
+    offset = (-k * charge_water
+              - hardness * water_volume
+              + malt_mass.dot(base_buffering * np.where(acid, 0., distilled_ph))
+              - malt_mass.dot(np.where(acid, acidity, 0.)))
+    return k, B, offset
+
+
+def _lactic_acid_coefficient(table, brewing_water_ph):
+    """Change in k (see MashPHModel) per milliliter of lactic acid."""
+    return -(100 / 0.17) / 50 / (table(BASELINE_PH) - table(brewing_water_ph))
+
+
+def acidulated_delta(config, recipe_config):
+    """Reduction in mash pH due to acidulated malt.
+
+    Each percent of acidulated malt in the grain bill (excluding rice
+    hulls) lowers the mash pH by 0.1.
+
+    """
+    up = config['unit_parser']
+    acidulated_mass = 0.
+    malt_mass = 0.
+    for m in recipe_config['Malt']:
+        if m['name'] == 'Rice Hulls':
+            continue
+
+        if 'mass' in m:
+            malt_mass += up.convert(m['mass'], 'kilograms')
+
+        if m['name'] == 'Acidulated Malt' and 'mass' in m:
+            acidulated_mass += up.convert(m['mass'], 'kilograms')
+
+    return 100 * 0.1 * acidulated_mass / malt_mass
@@ -0,0 +1,153 @@
+from __future__ import print_function
+from collections import namedtuple
+import json
+import os
+import time
+from .batch import default_config
+from .brew_day import brew_day_result, get_equipment_profile
+from .catalog import get_catalog
+from .hop_composition import hop_result
+from .malt_composition import malt_result
+from .report import render
+from .units import get_unit_parser
+from .water_composition import water_result
+from .yeast_composition import yeast_result
+
+
+# Stages of the pipeline, in order, with the function computing each.
+STAGES = (
+    ('malt_composition', malt_result),
+    ('water_composition', water_result),
+    ('hop_composition', hop_result),
+    ('yeast_composition', yeast_result),
+    ('brew_day', brew_day_result)
+)
+
+
+PipelineResult = namedtuple('PipelineResult', [
+    'recipe_config', 'results', 'timings'
+])
+PipelineResult.__doc__ = """Outcome of running a recipe through the pipeline.
+
+ recipe_config : dict
+    The recipe, with the fields appended by each stage.
+ results : list
+    (stage, result) of each stage run, in order (see results).
+ timings : list
+    (stage, seconds) of each stage run, in order.
+
+"""
+
+
+def brew_pipeline_main():
+    """Entry point for brew_pipeline command line script.
+
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('recipe', type=str, help='Recipe JSON')
+    parser.add_argument('-o', '--output', type=str, help='Output file')
+    parser.add_argument('--stages', type=str,
+                        help='Comma-separated stages to run (default: all, in order)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Solve for salt additions even if cached')
+    parser.add_argument('--target-ph', type=float,
+                        help='Target mash pH; solve for lactic acid to hit it')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Print nothing')
+
+    args = parser.parse_args()
+    recipe_config = json.load(open(args.recipe, 'r'))
+    config = pipeline_config()
+    if args.no_cache:
+        config['Solution Cache'] = False
+    if args.target_ph is not None:
+        recipe_config['Target Mash pH'] = args.target_ph
+    stages = args.stages.split(',') if args.stages else None
+
+    def report(stage, result):
+        print(render(result))
+
+    out = brew_pipeline(config, recipe_config, stages, None if args.quiet else report)
+
+    if not args.quiet:
+        total = 0.
+        for stage, seconds in out.timings:
+            print('{0:s}: {1:.1f} ms'.format(stage, 1000 * seconds))
+            total += seconds
+        print('Total: {0:.1f} ms'.format(1000 * total))
+
+    if args.output:
+        with open(args.output, 'w') as outfile:
+            json.dump(out.recipe_config, outfile, indent=2, sort_keys=True)
+
+
+def brew_pipeline(config, recipe_config, stages=None, callback=None):
+    """Run a recipe through the stages, in one process.
+
+    Equivalent to running the malt_composition, water_composition,
+    hop_composition, yeast_composition, and brew_day scripts in turn,
+    each reading the recipe saved by the previous one, but the
+    configuration is loaded once, the recipe stays in memory, and the
+    stages share the unit parser, ingredient catalog, water model, and
+    equipment profile. Nothing is printed or saved.
+
+    Parameters
+    ----------
+     config : dict
+        Configuration, with the malt, water, and hop configurations
+        (see pipeline_config), as for the execute function of each
+        stage (without 'Output').
+     recipe_config : dict
+        Recipe. The fields documented in each stage's execute are
+        appended to it.
+     stages : array_like or None
+        Names of the stages to run (see STAGES), in the order given.
+        Defaults to all of them, in order.
+     callback : function or None
+        Called with the name and result of each stage as it
+        finishes, e.g. to report progress; not included in the
+        timings.
+
+    Returns
+    -------
+     out : PipelineResult
+
+    """
+    functions = dict(STAGES)
+    if stages is None:
+        stages = [name for name, func in STAGES]
+    for stage in stages:
+        if stage not in functions:
+            raise ValueError('Unknown stage: {0:s}'.format(stage))
+
+    config['unit_parser'] = get_unit_parser(config.get('units', None))
+    get_catalog(config)
+    get_equipment_profile(config)
+
+    results = []
+    timings = []
+    for stage in stages:
+        start = _clock()
+        result = functions[stage](config, recipe_config)
+        timings.append((stage, _clock() - start))
+        results.append((stage, result))
+        if callback is not None:
+            callback(stage, result)
+
+    return PipelineResult(recipe_config, results, timings)
+
+
+def pipeline_config():
+    """Configuration bundled with homebrew_calc, with the malt, water,
+    and hop configurations, as used by the brew_pipeline script.
+
+    """
+    this_dir, this_filename = os.path.split(__file__)
+    config = default_config()
+    hop_config_file = os.path.join(this_dir, 'resources', config['files']['hops'])
+    config['hop'] = json.load(open(hop_config_file, 'r'))
+    return config
+
+
+_clock = time.perf_counter if hasattr(time, 'perf_counter') else time.time
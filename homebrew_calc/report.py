@@ -0,0 +1,256 @@
+from __future__ import print_function
+from .results import (BoilResult, BrewDayResult, HopResult, InfusionMashResult,
+                      LauterResult, MaltResult, MashPHResult, SaltResult,
+                      StepMashResult, WaterResult, WaterVolumeResult, YeastResult)
+
+
+def render(result):
+    """Human-readable report of the result of a stage.
+
+    This is the text the command line scripts print; the stages
+    themselves only compute results (see results.Result).
+
+    Parameters
+    ----------
+     result : Result
+        Result of a stage, e.g. as returned by
+        malt_composition.malt_result.
+
+    Returns
+    -------
+     text : str
+        Report, one line per quantity, starting with any warnings.
+
+    """
+    return '\n'.join(render_lines(result))
+
+
+def render_lines(result):
+    """Lines of the report of result (see render)."""
+    return _renderers[type(result)](result)
+
+
+def _malt(r):
+    lines = list(r.warnings)
+    lines.append('Original Gravity: {0:.03f}'.format(r.original_gravity))
+    lines.append('SRM: {0:.0f}'.format(r.srm))
+    return lines
+
+
+def _hops(r):
+    lines = list(r.warnings)
+    for addition_type, boil_time, ibus in r.additions:
+        if addition_type is None:
+            lines.append('{time:.0f}-minute addition: {ibu:0.1f} IBUs'.format(
+                time=boil_time, ibu=ibus))
+        elif addition_type == 'first wort hopping':
+            lines.append('First-wort hopping addition: {ibu:0.1f} IBUs'.format(ibu=ibus))
+        elif addition_type == 'flameout':
+            lines.append('Flameout hopping addition: {ibu:0.1f} IBUs'.format(ibu=ibus))
+
+    lines.append('Total IBUs: {0:.1f}'.format(r.ibus))
+    return lines
+
+
+def _yeast(r):
+    if r.final_gravity is None:
+        return list(r.warnings)
+
+    lines = ['Final Gravity: {0:.03f}'.format(r.final_gravity),
+             'Alcohol by Volume: {0:.01f}%'.format(100. * r.abv)]
+    lines.extend(r.warnings)
+    lines.append('Cells needed (billions): {0:.0f}'.format(r.cell_count / 1e9))
+    return lines
+
+
+def _water_volume(r):
+    lines = list(r.warnings)
+    lines.append('Total Water: {0:.01f} gallons'.format(r.total_water))
+    lines.append('Pre-Boil Gravity: {0:.03f}'.format(r.pre_boil_gravity))
+    lines.append('')
+    return lines
+
+
+def _salts(r):
+    lines = list(r.warnings)
+    lines.extend('{0:.0%} {1:s} water'.format(x, name) for (name, x) in r.waters)
+    lines.extend('{0:.04f} grams per gallon {1:s}'.format(x, name)
+                 for (name, x) in r.salts)
+
+    if r.mash_water_volume is not None:
+        lines.append('')
+        lines.extend('{0:.02f} grams {1:s} in mash'.format(x * r.mash_water_volume, name)
+                     for (name, x) in r.salts)
+
+    if r.lactic_acid is not None:
+        lines.append('{0:.2f} tsp lactic acid in mash'.format(r.lactic_acid))
+
+    if r.sparge_water_volume is not None:
+        lines.append('')
+        msg = '{0:.02f} grams {1:s} in sparge/mash-out water'
+        lines.extend(msg.format(x * r.sparge_water_volume, name) for (name, x) in r.salts)
+
+    lines.append('')
+    lines.extend('{0:.1f} ppm {1:s}'.format(x, name) for (name, x) in r.mineral_profile)
+    lines.append('Residual alkalinity: {0:.0f}'.format(r.residual_alkalinity))
+
+    if r.chloride_to_sulfate < 0.5:
+        descriptor = 'very hoppy'
+    elif r.chloride_to_sulfate < 1.0:
+        descriptor = 'hoppy'
+    elif r.chloride_to_sulfate < 2:
+        descriptor = 'malty'
+    else:
+        descriptor = 'very malty'
+
+    lines.append('Chloride to sulfate ratio: {0:.1f} ({1:s})'.format(
+        r.chloride_to_sulfate, descriptor))
+    return lines
+
+
+def _mash_ph(r):
+    lines = list(r.warnings)
+    if r.lactic_acid is not None:
+        if r.lactic_acid > 0:
+            lines.append('Add {0:.2f} ml lactic acid to the mash.'.format(r.lactic_acid))
+        else:
+            lines.append('No lactic acid needed: mash pH is at or below target.')
+
+    msg = 'Mash pH: {0:.03f} at {1:.0f} degF (target between'
+    msg += ' {2:.03f} and {3:.03f})'
+    lines.append(msg.format(r.mash_ph, r.reference_temperature,
+                            r.target_low, r.target_high))
+    return lines
+
+
+def _water(r):
+    lines = list(r.warnings)
+    for part in (r.volume, r.salts, r.mash_ph):
+        if part is not None:
+            lines.extend(render_lines(part))
+    return lines
+
+
+def _mash(r):
+    lines = list(r.warnings)
+    lines.append('Heat mash water ({0:.2f} gallons) to {1:.1f} degF.'.format(
+        r.mash_water_volume, r.kettle_temperature))
+    if r.actual_kettle_temperature is not None:
+        lines.append('Actual temperature achieved: {0:.1f} degF.'.format(
+            r.actual_kettle_temperature))
+
+    msg = 'After adding to mash tun (before adding grain),'
+    msg += ' temperature is predicted to be {0:.1f} degF.'
+    lines.append(msg.format(r.tun_temperature))
+    lines.append('Allow water to cool to {0:.1f} degF before adding grain.'.format(
+        r.strike_temperature))
+    if r.actual_strike_temperature is not None:
+        lines.append('Actual temperature: {0:.1f} degF.'.format(r.actual_strike_temperature))
+
+    msg = 'After adding grain and stirring, temperature is'
+    msg += ' predicted to be {0:.1f} degF.'
+    lines.append(msg.format(r.mash_temperature))
+
+    msg = 'After {0:.0f} minutes, mash temp is expected to decrease to {1:.1f} degF.'
+    lines.append(msg.format(r.duration, r.final_temperature))
+    if r.actual_final_temperature is not None:
+        lines.append('Actual temperature: {0:.1f} degF.'.format(r.actual_final_temperature))
+
+    return lines
+
+
+def _infusion_mash(r):
+    lines = _mash(r)
+    if r.sparge_water_volume is not None:
+        lines.append('Begin heating sparge and mash-out water: {0:.2f} gallons.'.format(
+            r.sparge_water_volume))
+        msg = 'When water reaches {0:.1f} degF, transfer {1:.1f} gallons to the hot liquor tank.'
+        lines.append(msg.format(r.sparge_transfer_temperature, r.sparge_transfer_volume))
+        msg = 'Bring remaining (mash-out) water, {0:.1f} gallons, to a boil.'
+        lines.append(msg.format(r.mash_out_volume))
+        msg = 'Add mash-out water to mash, bringing temperature up to {0:.1f} degF.'
+        lines.append(msg.format(r.mash_out_temperature))
+
+    return lines
+
+
+def _step_mash(r):
+    lines = _mash(r)
+    for step in r.steps:
+        msg = 'To bring mash up to {0:.1f} degF, add {1:.1f} gallons boiling water.'
+        lines.append(msg.format(step.temperature, step.infusion_volume))
+        if step.achieved_temperature is not None:
+            lines.append('Temperature achieved: {0:.1f} degF'.format(step.achieved_temperature))
+
+        msg = 'After {0:.0f} minutes, temperature is'
+        msg += ' predicted to drop to {1:.1f} degF.'
+        lines.append(msg.format(step.duration, step.final_temperature))
+        if step.actual_final_temperature is not None:
+            lines.append('Actual temperature: {0:.1f} degF'.format(step.actual_final_temperature))
+
+    msg = 'To mash out at {0:.1f} degF, add {1:.1f} gallons boiling water.'
+    lines.append(msg.format(r.mash_out_temperature, r.mash_out_volume))
+    return lines
+
+
+def _lauter(r):
+    lines = list(r.warnings)
+    lines.append('Collect {0:.2f} gallons of wort.'.format(r.pre_boil_volume))
+    lines.append('Pre-boil gravity should be {0:.03f}.'.format(r.pre_boil_gravity))
+    if r.efficiency is not None:
+        lines.append('Actual wort collected during lauter: {0:.2f} gallons.'.format(
+            r.actual_pre_boil_volume))
+        lines.append('Actual pre-boil gravity: {0:.03f}.'.format(r.actual_pre_boil_gravity))
+        lines.append('Efficiency: {0:.02f}'.format(r.efficiency))
+
+    return lines
+
+
+def _boil(r):
+    lines = list(r.warnings)
+    for addition, mass, variety, pellets in r.hop_additions:
+        if addition == 'fwh':
+            msg = 'Add {0:.2f}oz {1:s} {2:s} during lautering process (first wort hopping).'
+            lines.append(msg.format(mass, variety, pellets))
+        elif addition == 'flameout':
+            lines.append('Add {0:.2f}oz {1:s} {2:s} at flameout.'.format(mass, variety, pellets))
+        else:
+            plural = '' if addition == 1 else 's'
+            lines.append('Add {0:.2f}oz {2:s} {3:s} at {1:.0f} minute{4:s}.'.format(
+                mass, addition, variety, pellets, plural))
+
+    if r.efficiency is not None:
+        lines.append('Actual post-boil volume: {0:.02f} gallons'.format(r.post_boil_volume))
+        lines.append('Evaporation rate: {0:.02f} gallons per hour'.format(r.evaporation_rate))
+        lines.append('Original gravity: {0:.03f}'.format(r.original_gravity))
+        lines.append('Efficiency: {0:.02f}'.format(r.efficiency))
+    elif r.original_gravity is not None:
+        lines.append('Predicted original gravity: {0:.03f}'.format(r.original_gravity))
+
+    return lines
+
+
+def _brew_day(r):
+    lines = list(r.warnings)
+    lines.extend(render_lines(r.mash))
+    lines.append('')
+    lines.extend(render_lines(r.lauter))
+    lines.append('')
+    lines.extend(render_lines(r.boil))
+    return lines
+
+
+_renderers = {
+    MaltResult: _malt,
+    HopResult: _hops,
+    YeastResult: _yeast,
+    WaterVolumeResult: _water_volume,
+    SaltResult: _salts,
+    MashPHResult: _mash_ph,
+    WaterResult: _water,
+    InfusionMashResult: _infusion_mash,
+    StepMashResult: _step_mash,
+    LauterResult: _lauter,
+    BoilResult: _boil,
+    BrewDayResult: _brew_day
+}
@@ -0,0 +1,351 @@
+from __future__ import print_function
+
+
+class Result(object):
+    """Record of the quantities computed by a stage.
+
+    Results hold plain numbers (in the units the recipe uses: gallons,
+    degF, minutes, etc.), and strings and lists thereof, in __slots__,
+    so stages can build them without formatting anything; see
+    report.render for the human-readable version. Fields not computed
+    (e.g. actual temperatures, when none were measured) are None.
+
+    Parameters
+    ----------
+     **fields
+        Initial value of each field; missing fields are None.
+
+    Attributes
+    ----------
+     warnings : list
+        Messages about parameters not specified, and the defaults
+        assumed instead.
+
+    """
+    __slots__ = ('warnings',)
+
+    def __init__(self, **fields):
+        self.warnings = []
+        for name in self.fields():
+            setattr(self, name, fields.pop(name, None))
+
+        if fields:
+            msg = 'Unknown fields for {0:s}: {1:s}'
+            raise TypeError(msg.format(type(self).__name__, ', '.join(sorted(fields))))
+
+    @classmethod
+    def fields(cls):
+        """Names of the fields of this type of result, in order."""
+        names = []
+        for klass in reversed(cls.__mro__):
+            names.extend(n for n in klass.__dict__.get('__slots__', ())
+                         if n != 'warnings')
+        return names
+
+    def assume(self, msg):
+        """Record a warning about an assumed default."""
+        self.warnings.append(msg)
+
+    def as_dict(self):
+        """Fields, and warnings, as a dictionary (sub-results too)."""
+        out = {'warnings': list(self.warnings)}
+        for name in self.fields():
+            out[name] = _as_plain(getattr(self, name))
+        return out
+
+    def __repr__(self):
+        values = ', '.join('{0:s}={1!r}'.format(name, getattr(self, name))
+                           for name in self.fields())
+        return '{0:s}({1:s})'.format(type(self).__name__, values)
+
+
+def _as_plain(x):
+    if isinstance(x, Result):
+        return x.as_dict()
+    elif isinstance(x, (list, tuple)):
+        return [_as_plain(v) for v in x]
+    return x
+
+
+class MaltResult(Result):
+    """Result of malt_composition.execute.
+
+    Attributes
+    ----------
+     brewhouse_efficiency : float
+     pitchable_volume : float
+        In gallons.
+     water_to_grist_ratio : float
+        In gallons per pound.
+     grain_mass : float
+        Total mass of the grain bill, in pounds.
+     mash_water_volume : float
+        In gallons.
+     original_gravity : float
+     srm : float
+
+    """
+    __slots__ = ('brewhouse_efficiency', 'pitchable_volume', 'water_to_grist_ratio',
+                 'grain_mass', 'mash_water_volume', 'original_gravity', 'srm')
+
+
+class HopResult(Result):
+    """Result of hop_composition.execute.
+
+    Attributes
+    ----------
+     pitchable_volume : float
+        In gallons.
+     additions : list
+        (addition type, boil time in minutes, IBUs) of each hop
+        addition, in recipe order. The addition type is None for
+        additions with a boil time, else the 'addition type' of the
+        hop.
+     ibus : float
+        Total IBUs.
+
+    """
+    __slots__ = ('pitchable_volume', 'additions', 'ibus')
+
+
+class YeastResult(Result):
+    """Result of yeast_composition.execute.
+
+    The fields other than attenuation are None if the original
+    gravity is not known.
+
+    Attributes
+    ----------
+     attenuation : float
+     original_gravity : float
+     final_gravity : float
+     abv : float
+        Alcohol by volume, as a fraction.
+     pitchable_volume : float
+        In milliliters.
+     cell_count : float
+        Yeast cells needed.
+
+    """
+    __slots__ = ('attenuation', 'original_gravity', 'final_gravity', 'abv',
+                 'pitchable_volume', 'cell_count')
+
+
+class WaterVolumeResult(Result):
+    """Result of water_composition.water_volume.
+
+    Attributes
+    ----------
+     pre_boil_volume, average_boil_volume : float
+        In gallons.
+     total_water : float
+        Total water needed, in gallons.
+     sparge_water_volume : float
+        Sparge and mash-out water, in gallons.
+     pre_boil_gravity, average_gravity : float
+
+    """
+    __slots__ = ('pre_boil_volume', 'average_boil_volume', 'total_water',
+                 'sparge_water_volume', 'pre_boil_gravity', 'average_gravity')
+
+
+class SaltResult(Result):
+    """Result of water_composition.salt_additions.
+
+    Attributes
+    ----------
+     waters : list
+        (name, fraction) of each water used.
+     salts : list
+        (name, grams per gallon) of each salt used.
+     mash_water_volume, sparge_water_volume : float or None
+        In gallons, if known.
+     lactic_acid : float or None
+        Lactic acid in the mash, in teaspoons, if specified.
+     mineral_profile : list
+        (mineral, ppm) of each mineral achieved.
+     residual_alkalinity : float
+     chloride_to_sulfate : float
+
+    """
+    __slots__ = ('waters', 'salts', 'mash_water_volume', 'sparge_water_volume',
+                 'lactic_acid', 'mineral_profile', 'residual_alkalinity',
+                 'chloride_to_sulfate')
+
+
+class MashPHResult(Result):
+    """Result of water_composition.mash_ph and acidify_mash.
+
+    Attributes
+    ----------
+     lactic_acid : float or None
+        Lactic acid to add to hit the target mash pH, in milliliters
+        (acidify_mash only).
+     mash_ph : float
+     reference_temperature : float
+        In degF.
+     target_low, target_high : float
+        Recommended range of mash pH, at the reference temperature.
+
+    """
+    __slots__ = ('lactic_acid', 'mash_ph', 'reference_temperature',
+                 'target_low', 'target_high')
+
+
+class WaterResult(Result):
+    """Result of water_composition.execute.
+
+    Attributes
+    ----------
+     volume : WaterVolumeResult
+     salts : SaltResult or None
+     mash_ph : MashPHResult or None
+        The last two are None without a 'Water Profile'.
+
+    """
+    __slots__ = ('volume', 'salts', 'mash_ph')
+
+
+class MashResult(Result):
+    """Strike water and first step of a mash (see InfusionMashResult
+    and StepMashResult). Temperatures are in degF; actual_* fields are
+    the measurements recorded in the recipe, if any.
+
+    Attributes
+    ----------
+     mash_water_volume : float
+        In gallons.
+     kettle_temperature, actual_kettle_temperature : float
+        Temperature to heat the mash water to.
+     tun_temperature : float
+        Predicted temperature once in the mash tun.
+     strike_temperature, actual_strike_temperature : float
+        Temperature to let the water cool to before adding grain.
+     mash_temperature : float
+        Predicted temperature after adding grain.
+     duration : float
+        Of the (first) step, in minutes.
+     final_temperature, actual_final_temperature : float
+        At the end of the (first) step.
+
+    """
+    __slots__ = ('mash_water_volume', 'kettle_temperature', 'actual_kettle_temperature',
+                 'tun_temperature', 'strike_temperature', 'actual_strike_temperature',
+                 'mash_temperature', 'duration', 'final_temperature',
+                 'actual_final_temperature')
+
+
+class InfusionMashResult(MashResult):
+    """Result of brew_day.infusion_mash (see MashResult).
+
+    The remaining fields are None without a 'Sparge and Mash-out Water
+    Volume'.
+
+    Attributes
+    ----------
+     sparge_water_volume : float
+        Sparge and mash-out water to heat, in gallons.
+     sparge_transfer_temperature : float
+        Temperature at which to transfer sparge water to the hot
+        liquor tank, in degF.
+     sparge_transfer_volume : float
+        In gallons.
+     mash_out_volume : float
+        Boiling water to add to mash out, in gallons.
+     mash_out_temperature : float
+        In degF.
+
+    """
+    __slots__ = ('sparge_water_volume', 'sparge_transfer_temperature',
+                 'sparge_transfer_volume', 'mash_out_volume', 'mash_out_temperature')
+
+
+class MashStepResult(Result):
+    """One step after the first of a step mash.
+
+    Attributes
+    ----------
+     temperature : float
+        In degF.
+     infusion_volume : float
+        Boiling water to add to reach it, in gallons.
+     achieved_temperature : float or None
+        Measured temperature after the infusion.
+     duration : float
+        In minutes.
+     final_temperature, actual_final_temperature : float
+        At the end of the step.
+
+    """
+    __slots__ = ('temperature', 'infusion_volume', 'achieved_temperature',
+                 'duration', 'final_temperature', 'actual_final_temperature')
+
+
+class StepMashResult(MashResult):
+    """Result of brew_day.step_mash (see MashResult).
+
+    Attributes
+    ----------
+     steps : list
+        MashStepResult of each later step.
+     mash_out_temperature : float
+        In degF.
+     mash_out_volume : float
+        Boiling water to add to mash out, in gallons.
+
+    """
+    __slots__ = ('steps', 'mash_out_temperature', 'mash_out_volume')
+
+
+class LauterResult(Result):
+    """Result of brew_day.lauter.
+
+    Attributes
+    ----------
+     pre_boil_volume : float
+        In gallons.
+     pre_boil_gravity : float
+     actual_pre_boil_volume, actual_pre_boil_gravity : float or None
+        As measured on brew day.
+     efficiency : float or None
+        Brewhouse efficiency, from the measurements.
+
+    """
+    __slots__ = ('pre_boil_volume', 'pre_boil_gravity', 'actual_pre_boil_volume',
+                 'actual_pre_boil_gravity', 'efficiency')
+
+
+class BoilResult(Result):
+    """Result of brew_day.boil.
+
+    Attributes
+    ----------
+     hop_additions : list
+        (addition, ounces, variety, type) of each hop addition, in
+        the order to add them; the addition is 'fwh', 'flameout', or
+        the boil time in minutes.
+     post_boil_volume : float or None
+        Measured, in gallons.
+     evaporation_rate : float or None
+        From the measurements, in gallons per hour.
+     original_gravity : float or None
+        Measured, if efficiency is given, else predicted.
+     efficiency : float or None
+        Brewhouse efficiency, from the measurements.
+
+    """
+    __slots__ = ('hop_additions', 'post_boil_volume', 'evaporation_rate',
+                 'original_gravity', 'efficiency')
+
+
+class BrewDayResult(Result):
+    """Result of brew_day.execute.
+
+    Attributes
+    ----------
+     mash : InfusionMashResult or StepMashResult
+     lauter : LauterResult
+     boil : BoilResult
+
+    """
+    __slots__ = ('mash', 'lauter', 'boil')
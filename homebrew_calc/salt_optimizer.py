@@ -0,0 +1,984 @@
+from __future__ import print_function
+import re
+import threading
+import numpy as np
+from .cache import content_key
+
+
+# Salt optimizer backends (see SaltOptimizer.solve).
+BACKENDS = ('auto', 'simplex', 'cvxpy')
+
+# Bump whenever cached solutions (see solution_key) would change.
+SOLUTION_VERSION = 1
+
+# With more candidate waters than this, the simplex backend solves
+# over a working set of waters (see SaltOptimizer._solve_screened),
+# adding at most SCREEN_BATCH waters per round.
+SCREEN_WATERS = 256
+SCREEN_BATCH = 16
+
+
+class SaltOptimizer(object):
+    """Salt addition problem for one water and salt catalog, compiled once.
+
+    salt_additions blends the candidate waters and adds salts to
+    approach a target mineral profile, subject to the constraints
+    gathered by get_targets. Everything that depends only on the
+    catalog (the mineral content of the waters and salts, and the
+    residual alkalinity coefficients) is fixed here, and everything
+    that varies by recipe (target profile, residual alkalinity,
+    chloride-to-sulfate ratio, fixed salt additions, and mineral
+    bounds) is set per solve.
+
+    The problem is a small linear program, and there are two
+    backends. The 'simplex' backend writes it in standard form, with
+    the fixed salt additions eliminated, and solves it with a dense
+    two-phase simplex method, in microseconds. The 'cvxpy' backend
+    states it with cvxpy Parameters, so it is canonicalized on the
+    first solve only; later solves just update the parameters, and
+    are warm-started from the previous solution. The default, 'auto',
+    uses the simplex method, falling back on cvxpy if the simplex
+    method fails (e.g. on an infeasible problem, so the error comes
+    from cvxpy).
+
+    Parameters
+    ----------
+     Aw : 2d array
+        Mineral-by-water matrix of mineral content, in ppm.
+     As : 2d array
+        Mineral-by-salt matrix of mineral content, in ppm per gram
+        per gallon.
+     rac : array
+        Coefficients for residual alkalinity calculation.
+     complexity_penalty : float
+        Weight of the total salt additions in the objective. Defaults
+        to 1.
+
+    """
+    def __init__(self, Aw, As, rac, complexity_penalty=1.0):
+        self.Aw = np.asarray(Aw, dtype=float)
+        self.As = np.asarray(As, dtype=float)
+        self.rac = np.asarray(rac, dtype=float)
+        self.complexity_penalty = complexity_penalty
+        num_minerals, num_waters = self.Aw.shape
+        num_salts = self.As.shape[1]
+        self.num_waters = num_waters
+        self.num_salts = num_salts
+        self.num_minerals = num_minerals
+        self.backend = None
+        self._basis = None
+        self._working = None
+        self._cvxpy = None
+        self.set_targets()
+
+    def set_targets(self, tgt_cmp=None, cl_to_sl=None, res_alk=None,
+                    B=None, b=None, C=None, c=None):
+        """Set the parameters of the problem, as returned by get_targets.
+
+        Parameters
+        ----------
+         tgt_cmp : array_like or None
+            Desired content of each mineral, with None for minerals
+            without a target.
+         cl_to_sl : array or None
+            Coefficients of the chloride-to-sulfate ratio constraint.
+         res_alk : float or None
+            Desired residual alkalinity.
+         B, b : 2d array and array, or None
+            Fixed salt additions, B * x_salts == b, where each row of
+            B selects one salt.
+         C, c : 2d array and array, or None
+            Mineral bounds, C * x_mp <= c, where each row of C is plus
+            or minus a row of the identity.
+
+        """
+        # Minerals without a target get zero weight; target_weighted
+        # is the elementwise product of the weights and the target.
+        self.target_weight = np.zeros((self.num_minerals,))
+        self.target_weighted = np.zeros((self.num_minerals,))
+        if tgt_cmp is not None:
+            for i, tgt in enumerate(tgt_cmp):
+                if tgt is not None:
+                    self.target_weight[i] = 1.
+                    self.target_weighted[i] = tgt
+
+        # Residual alkalinity and chloride-to-sulfate ratio, as linear
+        # equality constraints on the mineral profile (all zeros when
+        # not constrained).
+        if res_alk is None:
+            self.res_alk_row = np.zeros((self.num_minerals,))
+            self.res_alk = 0.
+        else:
+            self.res_alk_row = self.rac
+            self.res_alk = float(res_alk)
+
+        if cl_to_sl is None:
+            self.cl_to_sl_row = np.zeros((self.num_minerals,))
+        else:
+            self.cl_to_sl_row = np.asarray(cl_to_sl, dtype=float)
+
+        # Fixed salt additions: fixed_mask * x_salts == fixed_amounts.
+        self.fixed_mask = np.zeros((self.num_salts,))
+        self.fixed_amounts = np.zeros((self.num_salts,))
+        if B is not None and b is not None:
+            for row, value in zip(B, b):
+                j = np.argmax(row)
+                self.fixed_mask[j] = 1.
+                self.fixed_amounts[j] = value
+
+        # Mineral bounds: lower_mask * x_mp >= lower, and likewise for
+        # the upper bounds.
+        lower = np.full((self.num_minerals,), -np.inf)
+        upper = np.full((self.num_minerals,), np.inf)
+        if C is not None and c is not None:
+            for row, value in zip(C, c):
+                k = np.argmax(np.abs(row))
+                if row[k] < 0:
+                    lower[k] = max(lower[k], -value)
+                else:
+                    upper[k] = min(upper[k], value)
+        self.lower_mask = np.isfinite(lower).astype(float)
+        self.lower = np.where(self.lower_mask > 0, lower, 0.)
+        self.upper_mask = np.isfinite(upper).astype(float)
+        self.upper = np.where(self.upper_mask > 0, upper, 0.)
+
+    def solve(self, tgt_cmp=None, cl_to_sl=None, res_alk=None,
+              B=None, b=None, C=None, c=None, backend='auto', warm_start=True,
+              max_sources=None):
+        """Solve the salt addition problem.
+
+        Parameters
+        ----------
+         tgt_cmp, cl_to_sl, res_alk, B, b, C, c
+            Targets and constraints, as in set_targets.
+         backend : str
+            One of 'auto', 'simplex', or 'cvxpy' (see class
+            documentation). Defaults to 'auto'. The backend actually
+            used is recorded in the backend attribute.
+         warm_start : bool
+            Whether to start from the previous solution (for the
+            simplex backend, from its optimal basis). Defaults to
+            True.
+         max_sources : int or None
+            Maximum number of waters in the blend (see
+            _limit_sources). Only the simplex backend supports it, and
+            'auto' does not fall back on cvxpy when it is given.
+
+        Returns
+        -------
+         x_waters : array
+            Fraction of each water in the blend.
+         x_salts : array
+            Amount of each salt, in grams per gallon.
+
+        """
+        if backend not in BACKENDS:
+            msg = 'Unknown salt optimizer backend {0:s}; expected one of {1:s}.'
+            raise ValueError(msg.format(backend, ', '.join(BACKENDS)))
+
+        if max_sources is not None and backend == 'cvxpy':
+            raise ValueError('max_sources requires the simplex backend.')
+
+        self.set_targets(tgt_cmp, cl_to_sl, res_alk, B, b, C, c)
+
+        if backend != 'cvxpy':
+            x = self._solve_simplex(warm_start, max_sources)
+            if x is not None:
+                self.backend = 'simplex'
+                return x
+            elif max_sources is not None:
+                msg = 'Salt additions problem could not be solved with at most {0:d} waters.'
+                raise ValueError(msg.format(max_sources))
+            elif backend == 'simplex':
+                raise ValueError('Salt additions problem could not be solved.')
+
+        self.backend = 'cvxpy'
+        return self._solve_cvxpy(warm_start)
+
+    def objective(self, x_waters, x_salts):
+        """Objective value of a candidate solution."""
+        x_mp = self.Aw.dot(x_waters) + self.As.dot(x_salts)
+        return (self.complexity_penalty * np.abs(x_salts).sum()
+                + np.abs(self.target_weight * x_mp - self.target_weighted).sum())
+
+    def _standard_form(self):
+        """The problem as a linear program in standard form.
+
+        The variables are the water fractions, the salts not fixed by
+        the recipe, and an upper bound on the deviation from each
+        mineral target.
+
+        Returns
+        -------
+         lp : tuple or None
+            Cost vector, A_ub, b_ub, A_eq, b_eq (see _simplex), the
+            mask of salts not fixed, and the matrix and offset
+            expressing the mineral profile in terms of the water and
+            free salt variables. None if the fixed salt additions are
+            negative (so the problem is infeasible).
+
+        """
+        fixed = self.fixed_mask > 0
+        if (self.fixed_amounts[fixed] < 0).any():
+            return None
+
+        free = ~fixed
+        # Mineral content as a function of the variables, plus the
+        # (constant) contribution of the fixed salts.
+        M = np.hstack((self.Aw, self.As[:, free]))
+        m0 = self.As[:, fixed].dot(self.fixed_amounts[fixed])
+        targets = np.flatnonzero(self.target_weight)
+        nw = self.num_waters
+        nx = M.shape[1]
+        nt = len(targets)
+        n = nx + nt
+
+        cost = np.zeros((n,))
+        cost[nw:nx] = self.complexity_penalty
+        cost[nx:] = 1.
+
+        upper = np.flatnonzero(self.upper_mask)
+        lower = np.flatnonzero(self.lower_mask)
+        A_ub = np.zeros((2 * nt + len(upper) + len(lower), n))
+        b_ub = np.empty((A_ub.shape[0],))
+        i = 0
+        for rows, sign, rhs in [
+                (targets, 1., self.target_weighted[targets] - m0[targets]),
+                (targets, -1., m0[targets] - self.target_weighted[targets]),
+                (upper, 1., self.upper[upper] - m0[upper]),
+                (lower, -1., m0[lower] - self.lower[lower])]:
+            A_ub[i:i + len(rows), :nx] = sign * M[rows]
+            b_ub[i:i + len(rows)] = rhs
+            i += len(rows)
+        A_ub[:nt, nx:] = -np.eye(nt)
+        A_ub[nt:2 * nt, nx:] = -np.eye(nt)
+
+        A_eq = [np.concatenate((np.ones((nw,)), np.zeros((n - nw,))))]
+        b_eq = [1.]
+        for row, rhs in [(self.res_alk_row, self.res_alk),
+                         (self.cl_to_sl_row, 0.)]:
+            if row.any():
+                A_eq.append(np.concatenate((row.dot(M), np.zeros((nt,)))))
+                b_eq.append(rhs - row.dot(m0))
+
+        return cost, A_ub, b_ub, np.array(A_eq), np.array(b_eq), free, M, m0
+
+    def _solve_simplex(self, warm_start=True, max_sources=None):
+        """Solve the problem via _simplex; None if that fails.
+
+        With warm_start, the simplex method starts from the optimal
+        basis of the previous solve, if it is still feasible.
+
+        """
+        lp = self._standard_form()
+        if lp is None:
+            return None
+
+        cost, A_ub, b_ub, A_eq, b_eq, free, M, m0 = lp
+        if self.num_waters > SCREEN_WATERS:
+            x = self._solve_screened(lp, warm_start)
+        else:
+            basis = self._basis if warm_start else None
+            x, status, self._basis = _simplex(cost, A_ub, b_ub, A_eq, b_eq, basis)
+
+        if x is not None and max_sources is not None:
+            x = self._limit_sources(lp, x, max_sources)
+        if x is None:
+            return None
+
+        nw = self.num_waters
+        x_waters = x[:nw]
+        x_salts = self.fixed_amounts.copy()
+        x_salts[free] = x[nw:M.shape[1]]
+        return x_waters, x_salts
+
+    def _solve_screened(self, lp, warm_start=True):
+        """Solve the standard form lp by column generation over the
+        candidate waters.
+
+        Only a small working set of waters is given to the simplex
+        method: initially, the waters closest to the target profile
+        and the extremes of each mineral (see _initial_waters), or,
+        with warm_start, the working set of the previous solve. From
+        the optimal duals, we then price out every other water at
+        once; a water whose reduced cost is nonnegative cannot
+        improve the blend, so if none is negative the solution is
+        optimal for the whole catalog. Otherwise, the most promising
+        waters join the working set, and the simplex method restarts
+        from the optimal basis.
+
+        Returns
+        -------
+         x : array or None
+            Optimal solution of lp, or None if the simplex method
+            fails.
+
+        """
+        cost, A_ub, b_ub, A_eq, b_eq = lp[:5]
+        nw = self.num_waters
+        if warm_start and self._working is not None:
+            working, basis = self._working, self._basis
+        else:
+            working, basis = self._initial_waters(), None
+
+        while True:
+            x, status, basis = self._solve_columns(lp, working, basis)
+            if status == 2 and len(working) < nw:
+                # Infeasible without the other waters.
+                working, basis = np.arange(nw), None
+                continue
+            elif status != 0:
+                self._working = self._basis = None
+                return None
+
+            y = _duals(lp, self._columns(lp, working), basis)
+            if y is None:
+                if len(working) < nw:
+                    working, basis = np.arange(nw), None
+                    continue
+                break
+
+            m_ub = len(b_ub)
+            reduced_costs = -(y[:m_ub].dot(A_ub[:, :nw]) + y[m_ub:].dot(A_eq[:, :nw]))
+            reduced_costs[working] = 0.
+            enter = np.flatnonzero(reduced_costs < -1e-9)
+            if len(enter) == 0:
+                break
+
+            enter = enter[np.argsort(reduced_costs[enter])[:SCREEN_BATCH]]
+            # The slacks follow the columns in the numbering of the
+            # basis, and shift by the number of waters entering.
+            num_columns = len(cost) - nw + len(working)
+            basis = np.where(basis >= num_columns, basis + len(enter), basis)
+            working = np.concatenate((working, enter))
+
+        self._working, self._basis = working, basis
+        return x
+
+    def _columns(self, lp, waters):
+        """Columns of lp given to _simplex by _solve_columns: the
+        salts and deviations, followed by the given waters.
+
+        """
+        return np.concatenate((np.arange(self.num_waters, len(lp[0])), waters))
+
+    def _solve_columns(self, lp, waters, basis=None):
+        """Solve lp restricted to the given waters (the others are
+        held at zero).
+
+        Returns
+        -------
+         x : array or None
+            Solution of lp, if found.
+         status : int
+            Status, as for _simplex.
+         basis : array or None
+            Optimal basis, in the numbering of the restricted problem
+            (see _columns).
+
+        """
+        cost, A_ub, b_ub, A_eq, b_eq = lp[:5]
+        columns = self._columns(lp, waters)
+        xr, status, basis = _simplex(cost[columns], A_ub[:, columns], b_ub,
+                                     A_eq[:, columns], b_eq, basis)
+        if status != 0:
+            return None, status, None
+
+        x = np.zeros(cost.shape)
+        x[columns] = xr
+        return x, status, basis
+
+    def _initial_waters(self):
+        """Initial working set of waters for _solve_screened."""
+        deviation = np.abs(self.target_weight[:, None] * self.Aw
+                           - self.target_weighted[:, None]).sum(axis=0)
+        closest = np.argsort(deviation, kind='stable')[:SCREEN_BATCH]
+        extremes = np.concatenate((np.argmin(self.Aw, axis=1),
+                                   np.argmax(self.Aw, axis=1)))
+        return np.unique(np.concatenate((closest, extremes)))
+
+    def _limit_sources(self, lp, x, max_sources):
+        """Limit the blend in solution x of lp to max_sources waters.
+
+        Choosing the best blend of a limited number of waters is a
+        mixed-integer problem. Instead, the water with the smallest
+        fraction is dropped, and the problem solved again over the
+        remaining waters of the blend, until few enough remain, so
+        the result is feasible but not necessarily optimal. (A basic
+        solution blends at most as many waters as the problem has
+        constraints, so this takes a few solves at most.)
+
+        Returns
+        -------
+         x : array or None
+            Solution of lp, or None if none was found.
+
+        """
+        nw = self.num_waters
+        used = np.flatnonzero(x[:nw] > 1e-9)
+        while len(used) > max_sources:
+            used = np.delete(used, np.argmin(x[used]))
+            x, status, basis = self._solve_columns(lp, used)
+            if status != 0:
+                return None
+            used = np.flatnonzero(x[:nw] > 1e-9)
+
+        return x
+
+    def residual_alkalinity_range(self):
+        """Range of residual alkalinity achievable under the current
+        constraints, ignoring any residual alkalinity target.
+
+        Returns
+        -------
+         low, high : float
+            Minimum and maximum achievable residual alkalinity
+            (infinite if unbounded). If no mineral profile satisfies
+            the constraints, low is inf and high is -inf. If the
+            simplex method fails, the range is (-inf, inf).
+
+        """
+        row, res_alk = self.res_alk_row, self.res_alk
+        self.res_alk_row, self.res_alk = np.zeros((self.num_minerals,)), 0.
+        try:
+            lp = self._standard_form()
+        finally:
+            self.res_alk_row, self.res_alk = row, res_alk
+
+        if lp is None:
+            return np.inf, -np.inf
+
+        cost, A_ub, b_ub, A_eq, b_eq, free, M, m0 = lp
+        rac_x = np.zeros(cost.shape)
+        rac_x[:M.shape[1]] = self.rac.dot(M)
+        bounds = []
+        for sign in [1., -1.]:
+            x, status, basis = _simplex(sign * rac_x, A_ub, b_ub, A_eq, b_eq)
+            if status == 0:
+                bounds.append(rac_x.dot(x) + self.rac.dot(m0))
+            elif status == 2:
+                return np.inf, -np.inf
+            elif status == 3:
+                bounds.append(-sign * np.inf)
+            else:
+                return -np.inf, np.inf
+
+        return bounds[0], bounds[1]
+
+    def sweep(self, cl_to_sl, res_alk, tgt_cmp=None, B=None, b=None,
+              C=None, c=None, backend='auto'):
+        """Solve over a grid of chloride-to-sulfate ratio and residual
+        alkalinity targets.
+
+        The grid is walked row by row (one chloride-to-sulfate ratio
+        each), alternating direction, so each solve is warm-started
+        from its neighbour. For each row, the achievable range of
+        residual alkalinity is computed first (see
+        residual_alkalinity_range), and grid points outside it are
+        marked infeasible without solving.
+
+        Parameters
+        ----------
+         cl_to_sl : array_like
+            Coefficients of the chloride-to-sulfate ratio constraint
+            (see set_targets), one per row of the grid; None for no
+            constraint.
+         res_alk : array_like
+            Residual alkalinity targets, one per column of the grid.
+         tgt_cmp, B, b, C, c
+            Other targets and constraints, as in set_targets.
+         backend : str
+            Backend, as in solve.
+
+        Returns
+        -------
+         results : dict
+            Dictionary of arrays, with the grid as the first two
+            dimensions, and NaN where infeasible:
+             'waters' : fraction of each water in the blend.
+             'salts' : amount of each salt, in grams per gallon.
+             'mineral_profile' : achieved mineral profile, in ppm.
+             'salt_load' : total salt additions, in grams per gallon.
+             'objective' : objective value.
+             'feasible' : True where a solution was found.
+             'residual_alkalinity_range' : achievable range of
+                residual alkalinity, per row.
+
+        """
+        res_alk = np.asarray(res_alk, dtype=float)
+        shape = (len(cl_to_sl), len(res_alk))
+        results = {
+            'waters': np.full(shape + (self.num_waters,), np.nan),
+            'salts': np.full(shape + (self.num_salts,), np.nan),
+            'mineral_profile': np.full(shape + (self.num_minerals,), np.nan),
+            'salt_load': np.full(shape, np.nan),
+            'objective': np.full(shape, np.nan),
+            'feasible': np.zeros(shape, dtype=bool),
+            'residual_alkalinity_range': np.empty((shape[0], 2))
+        }
+
+        for i, row in enumerate(cl_to_sl):
+            self.set_targets(tgt_cmp, row, None, B, b, C, c)
+            low, high = self.residual_alkalinity_range()
+            results['residual_alkalinity_range'][i] = low, high
+            margin = 1e-6 * max(1., abs(low) if np.isfinite(low) else 1.,
+                                abs(high) if np.isfinite(high) else 1.)
+
+            columns = range(shape[1]) if i % 2 == 0 else reversed(range(shape[1]))
+            for j in columns:
+                if not (low - margin <= res_alk[j] <= high + margin):
+                    continue
+
+                try:
+                    x_waters, x_salts = self.solve(tgt_cmp, row, res_alk[j],
+                                                   B, b, C, c, backend=backend)
+                except ValueError:
+                    continue
+
+                results['waters'][i, j] = x_waters
+                results['salts'][i, j] = x_salts
+                results['mineral_profile'][i, j] = (self.Aw.dot(x_waters)
+                                                    + self.As.dot(x_salts))
+                results['salt_load'][i, j] = x_salts.sum()
+                results['objective'][i, j] = self.objective(x_waters, x_salts)
+                results['feasible'][i, j] = True
+
+        return results
+
+    def solve_robust(self, Aw_scenarios, tgt_cmp=None, cl_to_sl=None,
+                     res_alk=None, B=None, b=None, C=None, c=None,
+                     criterion='worst'):
+        """One salt schedule and blend for many scenarios of the mineral
+        content of the waters.
+
+        In each scenario, the mineral profile is Aw_scenarios[k] *
+        x_waters + As * x_salts, and its deviation from the targets is
+        measured as in the nominal problem. Since no single blend can
+        hit the residual alkalinity and chloride-to-sulfate ratio
+        targets exactly in every scenario, they are also treated as
+        targets here, with their absolute deviation (in ppm)
+        penalized, rather than as constraints. The mineral bounds and
+        fixed salt additions are enforced in every scenario.
+
+        The linear program couples the scenarios only through the
+        shared blend and salts, so its constraint matrix is sparse:
+        one block of rows and deviation variables per scenario. It is
+        assembled with scipy.sparse, with each row scaled to unit
+        maximum coefficient, and solved with HiGHS via
+        scipy.optimize.linprog (or, with scipy older than 1.6, its
+        sparse interior-point method), in time roughly linear in the
+        number of scenarios.
+
+        Parameters
+        ----------
+         Aw_scenarios : array_like
+            Scenario-by-mineral-by-water array of mineral content, in
+            ppm.
+         tgt_cmp, cl_to_sl, res_alk, B, b, C, c
+            Targets and constraints, as in set_targets.
+         criterion : str
+            'worst' to minimize the largest deviation over the
+            scenarios, or 'expected' to minimize the mean deviation.
+            Either way, the total salt additions are penalized as in
+            the nominal problem. Defaults to 'worst'.
+
+        Returns
+        -------
+         x_waters : array
+            Fraction of each water in the blend.
+         x_salts : array
+            Amount of each salt, in grams per gallon.
+
+        """
+        from scipy import sparse
+        from scipy.optimize import linprog
+
+        if criterion not in ('worst', 'expected'):
+            msg = 'Unknown criterion {0:s}; expected worst or expected.'
+            raise ValueError(msg.format(criterion))
+
+        Aw_scenarios = np.asarray(Aw_scenarios, dtype=float)
+        num_scenarios = Aw_scenarios.shape[0]
+        self.set_targets(tgt_cmp, None, None, B, b, C, c)
+        fixed = self.fixed_mask > 0
+        if (self.fixed_amounts[fixed] < 0).any():
+            raise ValueError('Salt additions problem could not be solved.')
+
+        # Target rows: minerals with a target, then residual alkalinity
+        # and chloride-to-sulfate ratio, as linear functions of the
+        # mineral profile.
+        targets = np.flatnonzero(self.target_weight)
+        T = [np.eye(self.num_minerals)[targets]]
+        t = [self.target_weighted[targets]]
+        if res_alk is not None:
+            T.append(self.rac[None, :])
+            t.append([float(res_alk)])
+        if cl_to_sl is not None:
+            T.append(np.asarray(cl_to_sl, dtype=float)[None, :])
+            t.append([0.])
+        T = np.vstack(T)
+        t = np.concatenate(t)
+        bounds = np.vstack((np.eye(self.num_minerals)[self.upper_mask > 0],
+                            -np.eye(self.num_minerals)[self.lower_mask > 0]))
+        u = np.concatenate((self.upper[self.upper_mask > 0],
+                            -self.lower[self.lower_mask > 0]))
+
+        # Variables: water fractions, free salts, deviations from each
+        # target in each scenario, and (for 'worst') the worst total
+        # deviation.
+        free = ~fixed
+        nw = self.num_waters
+        nx = nw + free.sum()
+        nt = T.shape[0]
+        nd = num_scenarios * nt
+        worst = criterion == 'worst'
+        n = nx + nd + int(worst)
+        m0 = self.As[:, fixed].dot(self.fixed_amounts[fixed])
+
+        # Mineral profile of each scenario, as a function of the
+        # variables x: M[k] * x + m0.
+        M = np.concatenate((Aw_scenarios, np.broadcast_to(
+            self.As[:, free], (num_scenarios,) + self.As[:, free].shape)), axis=2)
+        TM = np.einsum('ij,kjl->kil', T, M).reshape((nd, nx))
+        BM = np.einsum('ij,kjl->kil', bounds, M).reshape((-1, nx))
+        target_rhs = np.tile(t - T.dot(m0), num_scenarios)
+        bound_rhs = np.tile(u - bounds.dot(m0), num_scenarios)
+
+        deviation = sparse.identity(nd, format='csr')
+        blocks = [
+            [sparse.csr_matrix(TM), -deviation],
+            [sparse.csr_matrix(-TM), -deviation],
+            [sparse.csr_matrix(BM), None]
+        ]
+        b_ub = [target_rhs, -target_rhs, bound_rhs]
+        if worst:
+            blocks[0].append(None)
+            blocks[1].append(None)
+            blocks[2].append(None)
+            blocks.append([None, sparse.kron(sparse.identity(num_scenarios),
+                                             np.ones((1, nt))),
+                           -np.ones((num_scenarios, 1))])
+            b_ub.append(np.zeros((num_scenarios,)))
+        A_ub = sparse.bmat(blocks, format='csr')
+        b_ub = np.concatenate(b_ub)
+
+        # Scale each row to unit maximum coefficient.
+        scale = abs(A_ub).max(axis=1).toarray().ravel()
+        scale[scale == 0] = 1.
+        A_ub = sparse.diags(1. / scale).dot(A_ub)
+        b_ub = b_ub / scale
+
+        A_eq = np.zeros((1, n))
+        A_eq[0, :nw] = 1.
+        cost = np.zeros((n,))
+        cost[nw:nx] = self.complexity_penalty
+        if worst:
+            cost[-1] = 1.
+        else:
+            cost[nx:nx + nd] = 1. / num_scenarios
+
+        method, options = _linprog_method()
+        res = linprog(cost, A_ub=A_ub, b_ub=b_ub, A_eq=A_eq, b_eq=[1.],
+                      bounds=(0, None), method=method, options=options)
+        if res.status != 0:
+            raise ValueError('Robust salt additions problem could not be solved: '
+                             + res.message)
+
+        x_waters = res.x[:nw]
+        x_salts = self.fixed_amounts.copy()
+        x_salts[free] = res.x[nw:nx]
+        return x_waters, x_salts
+
+    def _solve_cvxpy(self, warm_start):
+        if self._cvxpy is None:
+            self._cvxpy = self._compile_cvxpy()
+
+        variables, parameters, problem = self._cvxpy
+        for name, parameter in parameters.items():
+            parameter.value = getattr(self, name)
+
+        problem.solve(warm_start=warm_start)
+        x_waters, x_salts = variables
+        if x_waters.value is None or x_salts.value is None:
+            msg = 'Salt additions problem is {0:s}.'
+            raise ValueError(msg.format(problem.status))
+
+        x_waters = np.asarray(x_waters.value, dtype=float).reshape((self.num_waters,))
+        x_salts = np.asarray(x_salts.value, dtype=float).reshape((self.num_salts,))
+        return x_waters, x_salts
+
+    def _compile_cvxpy(self):
+        import cvxpy as cvx
+
+        num_minerals = self.num_minerals
+        num_salts = self.num_salts
+
+        # ingredients
+        x_waters = cvx.Variable(self.num_waters)
+        x_salts = cvx.Variable(num_salts)
+        # mineral profile
+        x_mp = cvx.Variable(num_minerals)
+
+        p = {
+            'target_weight': cvx.Parameter(num_minerals, nonneg=True),
+            'target_weighted': cvx.Parameter(num_minerals),
+            'res_alk_row': cvx.Parameter(num_minerals),
+            'res_alk': cvx.Parameter(),
+            'cl_to_sl_row': cvx.Parameter(num_minerals),
+            'fixed_mask': cvx.Parameter(num_salts, nonneg=True),
+            'fixed_amounts': cvx.Parameter(num_salts),
+            'lower_mask': cvx.Parameter(num_minerals, nonneg=True),
+            'lower': cvx.Parameter(num_minerals),
+            'upper_mask': cvx.Parameter(num_minerals, nonneg=True),
+            'upper': cvx.Parameter(num_minerals)
+        }
+
+        obj = (self.complexity_penalty * cvx.norm(x_salts, 1)
+               + cvx.norm(cvx.multiply(p['target_weight'], x_mp)
+                          - p['target_weighted'], 1))
+
+        constraints = [
+            x_waters >= 0,
+            cvx.sum(x_waters) == 1.0, # All waters sum to 100%
+            x_salts >= 0,
+            x_mp == cvx.matmul(self.Aw, x_waters) + cvx.matmul(self.As, x_salts),
+            cvx.matmul(p['res_alk_row'], x_mp) == p['res_alk'],
+            cvx.matmul(p['cl_to_sl_row'], x_mp) == 0,
+            cvx.multiply(p['fixed_mask'], x_salts) == p['fixed_amounts'],
+            cvx.multiply(p['lower_mask'], x_mp) >= p['lower'],
+            cvx.multiply(p['upper_mask'], x_mp) <= p['upper']
+        ]
+
+        problem = cvx.Problem(cvx.Minimize(obj), constraints)
+        return (x_waters, x_salts), p, problem
+
+
+def _linprog_method():
+    """Method and options of scipy.optimize.linprog for sparse problems:
+    HiGHS if available (scipy 1.6 and later), else the interior-point
+    method."""
+    import scipy
+    version = tuple(int(v) for v in re.findall(r'\d+', scipy.__version__)[:2])
+    if version >= (1, 6):
+        return 'highs', None
+    return 'interior-point', {'sparse': True}
+
+
+def _simplex(c, A_ub, b_ub, A_eq, b_eq, basis=None, tol=1e-9, max_iter=500):
+    """Minimize c * x subject to A_ub * x <= b_ub, A_eq * x == b_eq,
+    and x >= 0, via the two-phase simplex method on a dense tableau.
+
+    Pivots follow Dantzig's rule, switching to Bland's rule (which
+    cannot cycle) after 50 iterations of a phase. Columns are numbered
+    as the variables x followed by the slacks of the inequalities. If
+    basis (e.g. the optimal basis of a nearby problem) is given and
+    still feasible, phase 1 is skipped.
+
+    Returns
+    -------
+     x : array or None
+        Optimal solution, if found.
+     status : int
+        0 if optimal, 1 if the iteration limit was reached, 2 if
+        infeasible, and 3 if unbounded (as for scipy.optimize.linprog).
+     basis : array or None
+        Optimal basis, if found.
+
+    """
+    n = len(c)
+    m_ub = len(b_ub)
+    m = m_ub + len(b_eq)
+    ns = n + m_ub
+    A = np.zeros((m, ns))
+    A[:m_ub, :n] = A_ub
+    A[:m_ub, n:] = np.eye(m_ub)
+    A[m_ub:, :n] = A_eq
+    b = np.concatenate((b_ub, b_eq))
+    negative = b < 0
+    A[negative] *= -1
+    b[negative] *= -1
+    scale = np.max(np.abs(b), initial=1.)
+
+    T = None
+    if basis is not None and 0 < len(basis) == m and basis.max() < ns:
+        T = _warm_tableau(A, b, basis, tol * scale)
+    if T is not None:
+        basis = basis.copy()
+    else:
+        # Slacks form the initial basis of the inequalities with
+        # nonnegative right-hand sides; everything else needs an
+        # artificial variable.
+        artificial = negative.copy()
+        artificial[m_ub:] = True
+        artificial = np.flatnonzero(artificial)
+        na = len(artificial)
+
+        T = np.zeros((m + 1, ns + na + 1))
+        T[:m, :ns] = A
+        T[artificial, ns + np.arange(na)] = 1.
+        T[:m, -1] = b
+        basis = np.empty((m,), dtype=int)
+        basis[:m_ub] = n + np.arange(m_ub)
+        basis[artificial] = ns + np.arange(na)
+
+        # Phase 1: minimize the sum of the artificial variables.
+        T[-1, ns:ns + na] = 1.
+        T[-1] -= T[artificial].sum(axis=0)
+        status = _pivot(T, basis, ns + na, tol, max_iter)
+        if status != 0:
+            return None, status, None
+        if -T[-1, -1] > tol * scale:
+            return None, 2, None
+
+        # Drive any artificial variables left (at zero) out of the
+        # basis, dropping redundant constraints.
+        keep = np.ones((m + 1,), dtype=bool)
+        for r in np.flatnonzero(basis >= ns):
+            candidates = np.flatnonzero(np.abs(T[r, :ns]) > tol)
+            if len(candidates) > 0:
+                _pivot_on(T, r, candidates[0])
+                basis[r] = candidates[0]
+            else:
+                keep[r] = False
+        T = np.delete(T[keep], np.s_[ns:ns + na], axis=1)
+        basis = basis[keep[:m]]
+
+    # Phase 2: minimize c * x from the feasible basis.
+    cost = np.zeros((ns,))
+    cost[:n] = c
+    T[-1, :-1] = cost
+    T[-1, -1] = 0.
+    T[-1] -= cost[basis].dot(T[:-1])
+    status = _pivot(T, basis, ns, tol, max_iter)
+    if status != 0:
+        return None, status, None
+
+    x = np.zeros((ns,))
+    x[basis] = T[:-1, -1]
+    return x[:n], 0, basis
+
+
+def _duals(lp, columns, basis):
+    """Optimal dual values of the constraints of lp restricted to
+    columns (see SaltOptimizer._solve_columns), from the optimal basis
+    returned by _simplex; None if the basis does not determine them
+    (e.g. after dropping redundant constraints).
+
+    """
+    cost, A_ub, b_ub, A_eq, b_eq = lp[:5]
+    m_ub = len(b_ub)
+    m = m_ub + len(b_eq)
+    if len(basis) != m:
+        return None
+
+    n = len(columns)
+    A = np.zeros((m, n + m_ub))
+    A[:m_ub, :n] = A_ub[:, columns]
+    A[:m_ub, n:] = np.eye(m_ub)
+    A[m_ub:, :n] = A_eq[:, columns]
+    c = np.concatenate((cost[columns], np.zeros((m_ub,))))
+    try:
+        return np.linalg.solve(A[:, basis].T, c[basis])
+    except np.linalg.LinAlgError:
+        return None
+
+
+def _warm_tableau(A, b, basis, tol):
+    """Tableau (without cost row values) for a given basis, or None
+    if the basis is singular or not feasible.
+
+    """
+    m = len(b)
+    try:
+        body = np.linalg.solve(A[:, basis], np.column_stack((A, b)))
+    except np.linalg.LinAlgError:
+        return None
+
+    if (not np.isfinite(body).all() or body[:, -1].min() < -tol
+            or np.abs(body[:, basis] - np.eye(m)).max() > 1e-6):
+        return None
+
+    T = np.zeros((m + 1, A.shape[1] + 1))
+    T[:m] = body
+    T[:m, -1] = np.maximum(body[:, -1], 0.)
+    return T
+
+
+def _pivot(T, basis, num_columns, tol, max_iter):
+    """Pivot until the reduced costs in the last row of tableau T are
+    nonnegative. Returns a status code, as for _simplex.
+
+    """
+    for k in range(max_iter):
+        reduced_costs = T[-1, :num_columns]
+        if k < 50:
+            j = np.argmin(reduced_costs)
+            if reduced_costs[j] >= -tol:
+                return 0
+        else:
+            candidates = np.flatnonzero(reduced_costs < -tol)
+            if len(candidates) == 0:
+                return 0
+            j = candidates[0]
+
+        column = T[:-1, j]
+        eligible = column > tol
+        if not eligible.any():
+            return 3
+
+        ratios = np.full(column.shape, np.inf)
+        ratios[eligible] = T[:-1, -1][eligible] / column[eligible]
+        ties = np.flatnonzero(ratios <= ratios.min() + tol)
+        r = ties[np.argmin(basis[ties])]
+        _pivot_on(T, r, j)
+        basis[r] = j
+
+    return 1
+
+
+def _pivot_on(T, r, j):
+    T[r] /= T[r, j]
+    factors = T[:, j].copy()
+    factors[r] = 0.
+    T -= np.outer(factors, T[r])
+
+
+def solution_key(Aw, As, rac, tgt_cmp, cl_to_sl, res_alk, B, b, C, c, backend,
+                 max_sources=None):
+    """Canonical hash of a salt addition problem, as returned by
+    get_targets, together with the backend solving it (solutions of
+    a linear program need not be unique, so backends may differ) and
+    any limit on the number of waters blended.
+
+    """
+    if tgt_cmp is not None:
+        tgt_cmp = [np.nan if t is None else t for t in tgt_cmp]
+
+    return content_key('salts', str(SOLUTION_VERSION), backend, Aw, As, rac,
+                       tgt_cmp, cl_to_sl, res_alk, B, b, C, c, max_sources)
+
+
+_optimizers = {}
+_optimizers_lock = threading.Lock()
+
+
+def get_salt_optimizer(Aw, As, rac):
+    """Process-wide shared SaltOptimizer for a water and salt catalog.
+
+    The optimizer is compiled on the first request for given mineral
+    content matrices and residual alkalinity coefficients (see
+    get_targets), and shared by every later one.
+
+    Returns
+    -------
+     optimizer : SaltOptimizer
+
+    """
+    Aw = np.asarray(Aw, dtype=float)
+    As = np.asarray(As, dtype=float)
+    rac = np.asarray(rac, dtype=float)
+    key = (Aw.shape, Aw.tobytes(), As.shape, As.tobytes(), rac.tobytes())
+    with _optimizers_lock:
+        if key not in _optimizers:
+            _optimizers[key] = SaltOptimizer(Aw, As, rac)
+        return _optimizers[key]
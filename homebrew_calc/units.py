@@ -0,0 +1,269 @@
+from __future__ import print_function
+from collections import OrderedDict, namedtuple
+import hashlib
+import inspect
+import json
+import numbers
+import os
+import threading
+from unit_parser import unit_parser
+from .cache import cache_dir, atomic_write
+
+
+# Bump whenever the snapshot layout changes. Snapshots hold the parsed
+# definitions of unit_parser (its private _units and _sig_len), which
+# is why setup.py pins the unit_parser version.
+SNAPSHOT_VERSION = 2
+
+
+ConversionCacheInfo = namedtuple('ConversionCacheInfo', [
+    'hits', 'misses', 'factor_hits', 'factor_misses', 'maxsize', 'currsize'
+])
+
+
+class CachedUnitParser(object):
+    """Memoizing front end to unit_parser.
+
+    Conversions of physical quantity strings, like convert('6 pounds',
+    'kilograms'), are cached keyed on the string and the desired
+    units, with least-recently-used eviction once maxsize entries are
+    held. Separately, the scale factor between each pair of units is
+    resolved once, so numeric conversions, like convert(6, 'pounds',
+    'kilograms'), and cache misses for new strings in familiar units
+    reduce to a single multiplication.
+
+    Anything other than convert (add, multiply, etc.) is passed
+    through to the underlying unit_parser.
+
+    Parameters
+    ----------
+     unit_definitions : str or None
+        Location of unit definitions file, as for unit_parser. Ignored
+        if parser is specified.
+     maxsize : int
+        Maximum number of quantity strings to cache. Defaults to 4096.
+     parser : unit_parser or None
+        Existing unit_parser to wrap.
+
+    """
+    def __init__(self, unit_definitions=None, maxsize=4096, parser=None):
+        if parser is None:
+            parser = unit_parser(unit_definitions)
+
+        self.parser = parser
+        self.maxsize = maxsize
+        self._quantities = OrderedDict()
+        self._factors = {}
+        self._hits = 0
+        self._misses = 0
+        self._factor_hits = 0
+        self._factor_misses = 0
+
+    def __getattr__(self, name):
+        if name == 'parser':
+            raise AttributeError(name)
+        return getattr(self.parser, name)
+
+    def convert(self, *args):
+        """Convert from one unit to another.
+
+        Same usage as unit_parser.convert:
+         > convert('5 feet', 'meters')
+         > convert(5, 'feet', 'meters')
+
+        """
+        if len(args) == 3:
+            return args[0] * self.factor(args[1], args[2])
+        elif len(args) != 2:
+            return self.parser.convert(*args)
+
+        key = (args[0], args[1])
+        try:
+            value = self._quantities.pop(key)
+        except KeyError:
+            self._misses += 1
+            quantity, units = self.parser._parse_physical_quantity(args[0])
+            value = quantity * self.factor(units, args[1])
+            if self.maxsize <= 0:
+                return value
+            elif len(self._quantities) >= self.maxsize:
+                self._quantities.popitem(last=False)
+        else:
+            self._hits += 1
+
+        self._quantities[key] = value
+        return value
+
+    def factor(self, units, desired_units):
+        """Scale factor converting units to desired_units.
+
+        Raises ValueError if the units are not compatible.
+
+        """
+        key = (units, desired_units)
+        try:
+            factor = self._factors[key]
+        except KeyError:
+            self._factor_misses += 1
+            factor = self.parser.convert(1., units, desired_units)
+            self._factors[key] = factor
+        else:
+            self._factor_hits += 1
+
+        return factor
+
+    def cache_info(self):
+        """Cache statistics.
+
+        Returns
+        -------
+         info : ConversionCacheInfo
+            Named tuple of hits and misses of the quantity string
+            cache, hits and misses of the scale factor table, the
+            maximum size of the quantity string cache, and its current
+            size.
+
+        """
+        return ConversionCacheInfo(self._hits, self._misses,
+                                   self._factor_hits, self._factor_misses,
+                                   self.maxsize, len(self._quantities))
+
+    def cache_clear(self):
+        """Clear the caches and statistics."""
+        self._quantities.clear()
+        self._factors.clear()
+        self._hits = 0
+        self._misses = 0
+        self._factor_hits = 0
+        self._factor_misses = 0
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def default_unit_definitions():
+    """Location of the unit definitions bundled with unit_parser."""
+    this_dir = os.path.dirname(inspect.getfile(unit_parser))
+    return os.path.join(this_dir, 'units', 'units.txt')
+
+
+def get_unit_parser(unit_definitions=None, snapshot=True):
+    """Process-wide shared unit parser.
+
+    The first request for a given unit definitions file parses it (or
+    loads its snapshot; see load_unit_parser), and every later
+    request, from any stage, gets the same CachedUnitParser, together
+    with its conversion caches. If the file is modified, it is loaded
+    again on the next request.
+
+    Parameters
+    ----------
+     unit_definitions : str or None
+        Location of unit definitions file. If None, the definitions
+        bundled with unit_parser are used.
+     snapshot : bool
+        Whether to use the on-disk snapshot of the parsed unit
+        definitions. Defaults to True.
+
+    Returns
+    -------
+     up : CachedUnitParser
+        Shared unit parser.
+
+    """
+    if unit_definitions is None:
+        unit_definitions = default_unit_definitions()
+
+    path = os.path.abspath(unit_definitions)
+    stat = os.stat(path)
+    stamp = (stat.st_mtime, stat.st_size)
+    with _registry_lock:
+        entry = _registry.get(path, None)
+        if entry is None or entry[0] != stamp:
+            up = CachedUnitParser(parser=load_unit_parser(path, snapshot))
+            entry = (stamp, up)
+            _registry[path] = entry
+
+    return entry[1]
+
+
+def clear_unit_parsers():
+    """Forget all shared unit parsers."""
+    with _registry_lock:
+        _registry.clear()
+
+
+def load_unit_parser(unit_definitions, snapshot=True):
+    """Load a unit_parser, via a snapshot if possible.
+
+    Parsing the unit definitions file means matching a few regular
+    expressions against each of its lines. Instead, the parsed
+    definitions are saved to a JSON snapshot in the cache directory
+    (see cache.cache_dir), and loaded from there as long as the
+    snapshot is newer than the definitions file (according to its
+    modification time and size). A snapshot is plain data, checked
+    before use, so a corrupt or tampered one is simply ignored.
+
+    Parameters
+    ----------
+     unit_definitions : str
+        Location of unit definitions file.
+     snapshot : bool
+        Whether to use (and create) the snapshot. Defaults to True.
+
+    Returns
+    -------
+     up : unit_parser
+        Parser for the unit definitions.
+
+    """
+    path = os.path.abspath(unit_definitions)
+    directory = cache_dir() if snapshot else None
+    if directory is None:
+        return unit_parser(path)
+
+    stat = os.stat(path)
+    key = hashlib.sha1(path.encode('utf-8')).hexdigest()
+    snapshot_file = os.path.join(directory, 'units-{0:s}.json'.format(key))
+    header = [SNAPSHOT_VERSION, path, stat.st_mtime, stat.st_size]
+
+    try:
+        with open(snapshot_file, 'r') as f:
+            data = json.load(f)
+    except (IOError, OSError, ValueError):
+        # Missing or corrupt snapshot.
+        data = None
+
+    if _valid_snapshot(data, header):
+        up = unit_parser.__new__(unit_parser)
+        up._units = data['units']
+        up._sig_len = data['sig_len']
+        return up
+
+    up = unit_parser(path)
+    data = {'header': header, 'units': up._units, 'sig_len': up._sig_len}
+    atomic_write(snapshot_file, json.dumps(data).encode('utf-8'))
+    return up
+
+
+def _valid_snapshot(data, header):
+    """Whether data is a well-formed snapshot, up to date with header."""
+    if not isinstance(data, dict) or data.get('header', None) != header:
+        return False
+
+    sig_len = data.get('sig_len', None)
+    units = data.get('units', None)
+    if not isinstance(sig_len, int) or not isinstance(units, dict):
+        return False
+
+    for unit in units.values():
+        if not isinstance(unit, dict) or set(unit) != set(['signature', 'quantity']):
+            return False
+        signature = unit['signature']
+        if (not isinstance(signature, list) or len(signature) != sig_len
+                or not all(isinstance(s, numbers.Number) for s in signature)
+                or not isinstance(unit['quantity'], numbers.Number)):
+            return False
+
+    return True
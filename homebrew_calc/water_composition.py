@@ -7,16 +7,19 @@
 #
 # http://braukaiser.com/wiki/index.php?title=Mash_pH_control
 from __future__ import print_function
-from six import iteritems
 import json
 import os
 import sys
 import numpy as np
-from unit_parser import unit_parser
-from scipy import interpolate
-import cvxpy as cvx
+from .units import get_unit_parser
+from .cache import get_solution_cache
+from .salt_optimizer import get_salt_optimizer, solution_key
+from .ph_model import MashPHModel, BatchMashPHModel, get_charge_table
+from .water_model import get_water_model
 from .malt_composition import gravity_points_to_specific_gravity
 from .malt_composition import specific_gravity_to_gravity_points
+from .report import render
+from .results import MashPHResult, SaltResult, WaterResult, WaterVolumeResult
 
 
 def convert_pH_temp_main():
@@ -106,39 +109,72 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('recipe', type=str, help='Recipe JSON')
     parser.add_argument('-o', '--output', type=str, help='Output file')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Solve for salt additions even if cached')
+    parser.add_argument('--target-ph', type=float,
+                        help='Target mash pH; solve for lactic acid to hit it')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Print nothing')
 
     args = parser.parse_args()
     recipe_config = json.load(open(args.recipe, 'r'))
     if args.output:
         config['Output'] = args.output
+    if args.no_cache:
+        config['Solution Cache'] = False
+    if args.target_ph is not None:
+        recipe_config['Target Mash pH'] = args.target_ph
 
-    execute(config, recipe_config)
+    execute(config, recipe_config, quiet=args.quiet)
 
 
-def execute(config, recipe_config):
+def execute(config, recipe_config, quiet=False):
     """Light wrapper for other functions.
 
+    Computes the water_result, prints its report (see report.render)
+    unless quiet, and, if config['Output'] is given, saves the recipe
+    to that file. Returns both config and recipe_config.
+
+    """
+    result = water_result(config, recipe_config)
+    if not quiet:
+        print(render(result))
+
+    if 'Output' in config:
+        with open(config['Output'], 'w') as outfile:
+            json.dump(recipe_config, outfile, indent=2, sort_keys=True)
+
+    return config, recipe_config
+
+
+def water_result(config, recipe_config):
+    """Water calculations, without printing anything.
+
     First we compute the water volume required. If the desired water
     profile is part of the recipe, we determine the requisite salts to
-    add, and compute the mash pH.
+    add, and compute the mash pH. If the recipe also has a 'Target
+    Mash pH', we determine the lactic acid to add to hit it (see
+    acidify_mash). The fields documented in those functions are
+    appended to recipe_config.
+
+    Returns
+    -------
+     result : results.WaterResult
 
     """
-    if 'units' in config:
-        config['unit_parser'] = unit_parser(config['units'])
-    else:
-        config['unit_parser'] = unit_parser()
+    config['unit_parser'] = get_unit_parser(config.get('units', None))
 
-    config, recipe_config = water_volume(config, recipe_config)
+    result = WaterResult(volume=_water_volume(config, recipe_config))
     if 'Water Profile' in recipe_config:
-        config, recipe_config = salt_additions(config, recipe_config)
-        config, recipe_config = mash_ph(config, recipe_config)
+        if 'Target Mash pH' in recipe_config:
+            result.salts, result.mash_ph = _acidify_mash(config, recipe_config)
+        else:
+            result.salts = _salt_additions(config, recipe_config)
+            result.mash_ph = _mash_ph(config, recipe_config)
 
-    if 'Output' in config:
-        with open(config['Output'], 'w') as outfile:
-            json.dump(recipe_config, outfile, indent=2, sort_keys=True)
+    return result
 
 
-def water_volume(config, recipe_config):
+def water_volume(config, recipe_config, quiet=False):
     """Determine water volume required.
 
     Note: required parameters are in either config or
@@ -185,10 +221,10 @@ def water_volume(config, recipe_config):
     Returns
     -------
      This function appends fields (documented below) to recipe_config
-     and returns both config (unmodified) and recipe_config. It also
-     prints the total water volume required (that is, how much water
-     to go buy at the store or run through the RO filter, or
-     whatever). It also prints the predicted pre-boil gravity.
+     and returns both config (unmodified) and recipe_config. Unless
+     quiet, it also prints the total water volume required (that is,
+     how much water to go buy at the store or run through the RO
+     filter, or whatever), and the predicted pre-boil gravity.
 
     Fields Appended to recipe_config
     --------------------------------
@@ -211,8 +247,16 @@ def water_volume(config, recipe_config):
         boil. This is used for predicting hop utilization.
 
     """
+    result = _water_volume(config, recipe_config)
+    if not quiet:
+        print(render(result))
+
+    return config, recipe_config
 
+
+def _water_volume(config, recipe_config):
     up = config['unit_parser']
+    result = WaterVolumeResult()
 
     if 'Boil Time' in recipe_config:
         boil_time = up.convert(recipe_config['Boil Time'], 'hours')
@@ -243,7 +287,7 @@ def water_volume(config, recipe_config):
     else:
         pitchable_volume = 5.25
         msg = 'Pitchable volume not specified, assuming {0:.02f} gallons'
-        print(msg.format(pitchable_volume))
+        result.assume(msg.format(pitchable_volume))
 
     post_boil_volume = pitchable_volume + trub_losses
     pre_boil_volume = post_boil_volume + evaporation_rate * boil_time
@@ -259,7 +303,7 @@ def water_volume(config, recipe_config):
         abs_rate = 0.2
         msg = 'Absorption Rate not specified,'
         msg += ' assuming {0:.02f} gallons_per_pound.'
-        print(msg.format(abs_rate))
+        result.assume(msg.format(abs_rate))
 
     grain_mass = 0
     for malt in recipe_config['Malt']:
@@ -274,8 +318,6 @@ def water_volume(config, recipe_config):
         smowv = total_water - mash_water_vol
         sparge_mash_out_water_vol = '{0:.06f} gallons'.format(smowv)
         recipe_config['Sparge and Mash-out Water Volume'] = sparge_mash_out_water_vol
-        msg = 'Total Water: {0:.01f} gallons'
-        print(msg.format(total_water))
     else:
         msg = 'Mash Water Volume not specified.'
         msg += ' Try running malt_composition first.'
@@ -288,18 +330,21 @@ def water_volume(config, recipe_config):
         recipe_config['Pre-Boil Gravity'] = sg
         sg = gravity_points_to_specific_gravity(gp, average_boil_volume)
         recipe_config['Average Gravity'] = sg
-        msg = 'Pre-Boil Gravity: {0:.03f}'
-        print(msg.format(recipe_config['Pre-Boil Gravity']))
     else:
         msg = 'Original Gravity not specified.'
         msg += ' Try running malt_composition first.'
         raise ValueError(msg)
 
-    print('')
-    return config, recipe_config
+    result.pre_boil_volume = pre_boil_volume
+    result.average_boil_volume = average_boil_volume
+    result.total_water = total_water
+    result.sparge_water_volume = smowv
+    result.pre_boil_gravity = recipe_config['Pre-Boil Gravity']
+    result.average_gravity = recipe_config['Average Gravity']
+    return result
 
 
-def salt_additions(config, recipe_config):
+def salt_additions(config, recipe_config, use_cache=None, quiet=False):
     """Determines what salts (if any) to use.
 
     Note: required parameters are in either config or
@@ -320,13 +365,30 @@ def salt_additions(config, recipe_config):
      'Sparge and Mash-out Water Volume' : string
         String representing the total water needed for mashing-out and
         sparging.
+     'saltSolver' : string
+        Backend used to solve for the salt additions: 'auto',
+        'simplex', or 'cvxpy' (see salt_optimizer.SaltOptimizer).
+        Defaults to 'auto'. This parameter needs to be a subparameter
+        of the 'water' parameter in config.
+     'maxWaterSources' : int
+        Maximum number of candidate waters to blend (see
+        salt_optimizer.SaltOptimizer.solve). Defaults to no limit.
+        This parameter may be a subparameter of the 'Water Profile'
+        parameter in recipe_config, or of the 'water' parameter in
+        config.
+     'Solution Cache' : bool
+        Whether to look up (and store) the solution in the on-disk
+        cache of salt additions, keyed by a hash of the problem
+        returned by get_targets. Defaults to True. This parameter
+        needs to be a top-level parameter of config, and is
+        overridden by the use_cache argument, if not None.
 
     Returns
     -------
      This function appends fields (documented below) to recipe_config
-     and returns both config (unmodified) and recipe_config. It also
-     prints how much of each salt to add to the mash, and to the
-     sparge/mash-out water. It also shows whether the achieved water
+     and returns both config (unmodified) and recipe_config. Unless
+     quiet, it also prints how much of each salt to add to the mash,
+     and to the sparge/mash-out water, and whether the achieved water
      profile is conducive to highlighting malty or hoppy flavors.
 
     Fields Appended to recipe_config
@@ -347,13 +409,28 @@ def salt_additions(config, recipe_config):
 
     Notes
     -----
-     This function uses cvxpy to solve a convex optimization problem
-     minimizing the discrepancy between the desired water profile and
-     that achieved by various salt additions. Various constraints
-     embody the recommendations of John Palmer in his Water book.
+     This function solves a convex optimization problem (a linear
+     program) minimizing the discrepancy between the desired water
+     profile and that achieved by various salt additions. Various
+     constraints embody the recommendations of John Palmer in his
+     Water book. The problem is compiled once per water and salt
+     catalog, and only re-targeted for each recipe (see
+     salt_optimizer.SaltOptimizer). Large catalogs of candidate waters
+     are screened, so only the waters that can improve the blend enter
+     the problem. Solutions are cached on disk (see
+     cache.SolutionCache), so recipes sharing a water profile are
+     solved once; set the HOMEBREW_CALC_CACHE_DIR environment variable
+     to the empty string to disable all on-disk caches.
 
     """
+    result = _salt_additions(config, recipe_config, use_cache)
+    if not quiet:
+        print(render(result))
 
+    return config, recipe_config
+
+
+def _salt_additions(config, recipe_config, use_cache=None):
     up = config['unit_parser']
     waters, salts, minerals, tgt_cmp, cl_to_sl, res_alk, Aw, As, B, b, C, c, rac = get_targets(config, recipe_config)
     mineral_dict = {k: i for (i, k) in enumerate(minerals)}
@@ -361,120 +438,197 @@ def salt_additions(config, recipe_config):
     num_waters = len(waters)
     num_salts = len(salts)
     num_minerals = len(minerals)
-    c_waters = np.ones((num_waters,))
-
-    # ingredients
-    x_waters = cvx.Variable(num_waters)
-    x_salts = cvx.Variable(num_salts)
-    # mineral profile
-    x_mp = cvx.Variable(num_minerals)
-    complexity_penalty = 1.0
-
-    obj = complexity_penalty * cvx.norm(x_salts, 1)
-    for i, tgt in enumerate(tgt_cmp):
-        if tgt is not None:
-            obj += cvx.norm(mp[i] - tgt)
-
-    constraints = [
-        0 <= x_waters[:],
-        c_waters.T * x_waters == 1.0, # All waters sum to 100%
-        0 <= x_salts[:],
-        x_mp[:] == Aw * x_waters[:] + As * x_salts[:]
-    ]
-
-    # Constraint on residual alkalinity
-    if res_alk is not None:
-        constraints.append(rac.T * x_mp == res_alk)
-
-    # Constraint on chloride-to-sulfate ratio
-    if cl_to_sl is not None:
-        constraints.append(cl_to_sl.T * x_mp == 0)
-
-    # Constraints on salt additions
-    if B is not None and b is not None:
-        constraints.append(B * x_salts[:] == b[:])
-
-    # Constraints on mineral profile
-    if C is not None and c is not None:
-        constraints.append(C * x_mp[:] <= c[:])
-
-    objective = cvx.Minimize(obj)
-    prob = cvx.Problem(objective, constraints)
-    prob.solve()
-
-    try:
-        x_waters = x_waters.value.A.squeeze()
-    except AttributeError:
-        x_waters = np.array([x_waters.value])
-
-    x_salts = x_salts.value.A.squeeze()
-    # If the optimal water profile calls for less than 0.1 grams of a
-    # particular salt, or consists of less than 10% of a particular
-    # water source, just skip it.
-    x_salts[x_salts < 0.1] = 0
-    x_waters[x_waters < 0.1] = 0
-    x_mp = Aw.dot(x_waters) + As.dot(x_salts)
 
+    backend = config['water'].get('saltSolver', 'auto')
+    max_sources = recipe_config['Water Profile'].get(
+        'maxWaterSources', config['water'].get('maxWaterSources', None))
+    if use_cache is None:
+        use_cache = config.get('Solution Cache', True)
+
+    cache = get_solution_cache('water') if use_cache else None
+    if cache is not None:
+        key = solution_key(Aw, As, rac, tgt_cmp, cl_to_sl, res_alk, B, b, C, c,
+                           backend, max_sources)
+        solution = cache.get(key)
+    else:
+        solution = None
+
+    if solution is not None:
+        x_waters = np.array(solution['waters'], dtype=float)
+        x_salts = np.array(solution['salts'], dtype=float)
+        x_mp = np.array(solution['mineral_profile'], dtype=float)
+    else:
+        optimizer = get_salt_optimizer(Aw, As, rac)
+        x_waters, x_salts = optimizer.solve(tgt_cmp, cl_to_sl, res_alk, B, b, C, c,
+                                            backend=backend, max_sources=max_sources)
+
+        # If the optimal water profile calls for less than 0.1 grams of a
+        # particular salt, or consists of less than 10% of a particular
+        # water source, just skip it.
+        x_salts[x_salts < 0.1] = 0
+        x_waters[x_waters < 0.1] = 0
+        x_mp = Aw.dot(x_waters) + As.dot(x_salts)
+
+        if cache is not None:
+            cache.put(key, {
+                'waters': x_waters.tolist(),
+                'salts': x_salts.tolist(),
+                'mineral_profile': x_mp.tolist()
+            })
+
+    result = SaltResult(waters=[], salts=[], mineral_profile=[])
     recipe_config['Water'] = {}
     for i in range(num_waters):
         if x_waters[i] > 0:
             recipe_config['Water'][waters[i]] = x_waters[i]
-            print('{0:.0%} {1:s} water'.format(x_waters[i], waters[i]))
+            result.waters.append((waters[i], x_waters[i]))
 
     recipe_config['Salts'] = {}
     for i in range(num_salts):
         if x_salts[i] > 0:
             salt_amount = '{0:.04f} grams_per_gallon'.format(x_salts[i])
             recipe_config['Salts'][salts[i]] = salt_amount
-            print('{0:.04f} grams per gallon {1:s}'.format(x_salts[i], salts[i]))
+            result.salts.append((salts[i], x_salts[i]))
 
     if 'Mash Water Volume' in recipe_config:
-        print('')
-        mash_water_vol = up.convert(recipe_config['Mash Water Volume'], 'gallons')
-        for i in range(num_salts):
-            if x_salts[i] > 0:
-                print('{0:.02f} grams {1:s} in mash'.format(x_salts[i] * mash_water_vol, salts[i]))
+        result.mash_water_volume = up.convert(recipe_config['Mash Water Volume'], 'gallons')
 
     if 'Lactic Acid' in recipe_config:
-        lactic_tsp = up.convert(recipe_config['Lactic Acid'], 'tsp')
-        print('{0:.2f} tsp lactic acid in mash'.format(lactic_tsp))
+        result.lactic_acid = up.convert(recipe_config['Lactic Acid'], 'tsp')
 
     if 'Sparge and Mash-out Water Volume' in recipe_config:
-        print('')
         smowv = recipe_config['Sparge and Mash-out Water Volume']
-        smowv = up.convert(smowv, 'gallons')
-        for i in range(num_salts):
-            if x_salts[i] > 0:
-                msg = '{0:.02f} grams {1:s} in sparge/mash-out water'
-                print(msg.format(x_salts[i] * smowv, salts[i]))
+        result.sparge_water_volume = up.convert(smowv, 'gallons')
 
-    print('')
     recipe_config['Water Profile Achieved'] = {}
     for i in range(num_minerals):
         recipe_config['Water Profile Achieved'][minerals[i]] = x_mp[i]
-        print('{0:.1f} ppm {1:s}'.format(x_mp[i], minerals[i]))
+        result.mineral_profile.append((minerals[i], x_mp[i]))
 
     recipe_config['Water Profile Achieved']['Residual Alkalinity'] = rac.dot(x_mp)
-    print('Residual alkalinity: {0:.0f}'.format(rac.dot(x_mp)))
+    result.residual_alkalinity = rac.dot(x_mp)
 
     cl_to_sl = x_mp[mineral_dict['chloride']] / x_mp[mineral_dict['sulfate']]
-    if (cl_to_sl < 0.5):
-        descriptor = 'very hoppy'
-    elif (cl_to_sl < 1.0):
-        descriptor = 'hoppy'
-    elif (cl_to_sl < 2):
-        descriptor = 'malty'
-    else:
-        descriptor = 'very malty'
-
     recipe_config['Water Profile Achieved']['Chloride to Sulfate Ratio'] = cl_to_sl
-    print('Chloride to sulfate ratio: {0:.1f} ({1:s})'.format(cl_to_sl, descriptor))
+    result.chloride_to_sulfate = cl_to_sl
 
     config['mineral_profile'] = x_mp
-    return config, recipe_config
+    return result
+
+
+def salt_sweep(config, recipe_config, chloride_to_sulfate, residual_alkalinity,
+               backend=None):
+    """Trade-off surface of salt additions over water targets.
 
+    Solves the salt additions problem of salt_additions over a grid
+    of chlorideToSulfateRatio and residualAlkalinity targets (see
+    salt_optimizer.SaltOptimizer.sweep), replacing those of the
+    recipe. The other targets and constraints are taken from config
+    and recipe_config as in salt_additions. Nothing is printed or
+    cached, and the solutions are reported before dropping small salt
+    additions and water fractions.
 
-def mash_ph(config, recipe_config):
+    Parameters
+    ----------
+     config : dict
+        Configuration, as in salt_additions.
+     recipe_config : dict
+        Recipe, as in salt_additions.
+     chloride_to_sulfate : array_like
+        Chloride-to-sulfate ratios (rows of the grid).
+     residual_alkalinity : array_like
+        Residual alkalinity targets (columns of the grid).
+     backend : str or None
+        Solver backend; defaults to config['water']['saltSolver'], or
+        'auto'.
+
+    Returns
+    -------
+     results : dict
+        Dictionary of arrays, as returned by SaltOptimizer.sweep, plus
+        'water_names', 'salt_names', and 'minerals', naming the last
+        dimension of 'waters', 'salts', and 'mineral_profile'.
+
+    """
+    config['unit_parser'] = get_unit_parser(config.get('units', None))
+    waters, salts, minerals, tgt_cmp, cl_to_sl, res_alk, Aw, As, B, b, C, c, rac = get_targets(config, recipe_config)
+    if backend is None:
+        backend = config['water'].get('saltSolver', 'auto')
+
+    rows = []
+    for ratio in chloride_to_sulfate:
+        row = np.zeros((len(minerals),))
+        row[minerals.index('chloride')] = 1
+        row[minerals.index('sulfate')] = -ratio
+        rows.append(row)
+
+    optimizer = get_salt_optimizer(Aw, As, rac)
+    results = optimizer.sweep(rows, residual_alkalinity, tgt_cmp, B, b, C, c,
+                              backend=backend)
+    results['water_names'] = waters
+    results['salt_names'] = salts
+    results['minerals'] = minerals
+    return results
+
+
+def robust_salt_additions(config, recipe_config, scenarios, criterion='worst'):
+    """Salt additions robust to variation in the candidate waters.
+
+    Finds the one blend and salt schedule minimizing the worst-case
+    (or expected) deviation from the target water profile over many
+    scenarios of the mineral content of the candidate waters, e.g.
+    weekly municipal water reports (see
+    salt_optimizer.SaltOptimizer.solve_robust). Unlike salt_additions,
+    nothing is printed or cached, and small salt additions and water
+    fractions are not dropped.
+
+    Parameters
+    ----------
+     config : dict
+        Configuration, as in salt_additions.
+     recipe_config : dict
+        Recipe, as in salt_additions.
+     scenarios : array_like
+        Array of scenarios, each a dictionary mapping water names to
+        mineral content, as in the water configuration. Waters
+        missing from a scenario keep their nominal content.
+     criterion : str
+        'worst' or 'expected'. Defaults to 'worst'.
+
+    Returns
+    -------
+     results : dict
+        Dictionary with entries:
+         'waters' : fraction of each water in the blend.
+         'salts' : amount of each salt, in grams per gallon.
+         'mineral_profile' : achieved mineral profile in each
+            scenario, in ppm (scenario by mineral).
+         'residual_alkalinity' : achieved residual alkalinity in each
+            scenario.
+         'water_names', 'salt_names', 'minerals' : names, as in
+            salt_sweep.
+
+    """
+    config['unit_parser'] = get_unit_parser(config.get('units', None))
+    waters, salts, minerals, tgt_cmp, cl_to_sl, res_alk, Aw, As, B, b, C, c, rac = get_targets(config, recipe_config)
+    Aw_scenarios = get_water_model(config).scenario_matrices(scenarios)
+
+    optimizer = get_salt_optimizer(Aw, As, rac)
+    x_waters, x_salts = optimizer.solve_robust(Aw_scenarios, tgt_cmp, cl_to_sl,
+                                               res_alk, B, b, C, c, criterion)
+    x_mp = Aw_scenarios.dot(x_waters) + As.dot(x_salts)
+    return {
+        'waters': x_waters,
+        'salts': x_salts,
+        'mineral_profile': x_mp,
+        'residual_alkalinity': x_mp.dot(rac),
+        'water_names': waters,
+        'salt_names': salts,
+        'minerals': minerals
+    }
+
+
+def mash_ph(config, recipe_config, quiet=False):
     """Estimates the pH of the mash.
 
     Note: required parameters are in either config or
@@ -484,9 +638,11 @@ def mash_ph(config, recipe_config):
     Parameters
     ----------
      'mmole' : filename
-        Location of file specifying the blah blah blah. This parameter
-        needs to be a subparameter of the 'files' subparameter of the
-        'water' parameter in config.
+        Location of file specifying the charge per mmole of carbonate
+        species as a function of pH (see ph_model.ChargeTable). It is
+        loaded once per process. This parameter needs to be a
+        subparameter of the 'files' subparameter of the 'water'
+        parameter in config.
      'Malt' : array_like
         Array of grist components (not necessarily malted). This is
         the same input as is used in malt_composition. See the
@@ -500,7 +656,8 @@ def mash_ph(config, recipe_config):
     Returns
     -------
      This function appends fields (documented below) to recipe_config
-     and returns both config (unmodified) and recipe_config.
+     and returns both config (unmodified) and recipe_config. Unless
+     quiet, it also prints the mash pH.
 
     Fields Appended to recipe_config
     --------------------------------
@@ -515,189 +672,191 @@ def mash_ph(config, recipe_config):
      The mash pH is defined implicitly by the balance equation. The
      mash pH is computed via a root-finding algorithm. Basically, we
      guess the mash pH and see if the balance equation holds,
-     adjusting the guess until we are right.
+     adjusting the guess until we are right. The balance equation is
+     compiled once per recipe (see ph_model.MashPHModel), and since it
+     is piecewise linear in the pH, a safeguarded Newton iteration
+     converges in a few steps.
 
     """
+    result = _mash_ph(config, recipe_config)
+    if not quiet:
+        print(render(result))
+
+    return config, recipe_config
 
-    up = config['unit_parser']
 
+def _mash_ph(config, recipe_config):
     this_dir, this_filename = os.path.split(__file__)
     mmole_config = os.path.join(this_dir, 'resources', config['water']['files']['mmole'])
-    data = np.genfromtxt(mmole_config, delimiter=',')
-
-    target_mash_pH = [4.5, 8.5]
-    tol = 1e-6
-    while (target_mash_pH[1] - target_mash_pH[0] > tol):
-        pH = 0.5 * (target_mash_pH[0] + target_mash_pH[1])
-        b = balance_eq(pH, data, config, recipe_config)
-        if b > 0:
-            target_mash_pH[0] = pH
-        else:
-            target_mash_pH[1] = pH
-
-    pH = 0.5 * (target_mash_pH[0] + target_mash_pH[1])
-
-    acidulated_mass = 0.
-    malt_mass = 0.
-    for m in recipe_config['Malt']:
-        if m['name'] == 'Rice Hulls':
-            continue
+    data = get_charge_table(mmole_config)
 
-        if 'mass' in m:
-            malt_mass += up.convert(m['mass'], 'kilograms')
+    model = MashPHModel.from_recipe(config, recipe_config, data)
+    pH = model.solve(4.5, 8.5, tol=1e-6) - model.acidulated_delta
+    return _mash_ph_result(config, recipe_config, pH)
 
-        if m['name'] == 'Acidulated Malt' and 'mass' in m:
-            acidulated_mass += up.convert(m['mass'], 'kilograms')
-
-    acidulated_delta = 100 * 0.1 * acidulated_mass / malt_mass
-    pH -= acidulated_delta
 
+def _mash_ph_result(config, recipe_config, pH, lactic_acid=None):
     pH_temp = config['water'].get('pH reference temperature', 68)
     pH = convert_pH_temp(pH, 68, pH_temp)
-    pH_range_low = convert_pH_temp(5.4, 77, pH_temp)
-    pH_range_high = convert_pH_temp(5.7, 77, pH_temp)
 
     recipe_config['Mash pH'] = pH
     recipe_config['pH Reference Temperature'] = pH_temp
-    msg = 'Mash pH: {0:.03f} at {1:.0f} degF (target between'
-    msg += ' {2:.03f} and {3:.03f})'
-    print(msg.format(pH, pH_temp, pH_range_low, pH_range_high))
+    return MashPHResult(lactic_acid=lactic_acid, mash_ph=pH, reference_temperature=pH_temp,
+                        target_low=convert_pH_temp(5.4, 77, pH_temp),
+                        target_high=convert_pH_temp(5.7, 77, pH_temp))
 
-    return config, recipe_config
 
+def acidify_mash(config, recipe_config, target_pH=None, quiet=False):
+    """Salt additions and lactic acid to hit a target mash pH.
 
-def balance_eq(mash_pH, data, config, recipe_config):
-    """Computes the mash pH misbalance.
+    Solves for the salt additions (see salt_additions), and then for
+    the volume of lactic acid bringing the mash pH to the target, in
+    a single call. Salts only enter the mash pH through the mineral
+    profile they achieve, which does not depend on the lactic acid,
+    and the balance equation at the target pH is linear in the volume
+    of lactic acid (see ph_model.MashPHModel.lactic_acid_volume), so
+    no trial and error is needed: one salt solve, one step for the
+    lactic acid, and one mash pH solve to report the result.
 
     Parameters
     ----------
-     mash_pH : float
-       Candidate mash pH.
-     data : array
-       Array of data for calculation.
-
+     config : dict
+        Configuration, as in salt_additions and mash_ph.
+     recipe_config : dict
+        Recipe, as in salt_additions and mash_ph. Any 'Lactic Acid'
+        already specified is replaced.
+     target_pH : float or None
+        Target mash pH, relative to the pH reference temperature (see
+        mash_ph). Defaults to recipe_config['Target Mash pH'].
+     quiet : bool
+        If True, print nothing.
 
     Returns
     -------
-     balance : float
-        Value of balance equation. See notes in mash_ph().
+     This function appends fields (documented below, and in
+     salt_additions and mash_ph) to recipe_config and returns both
+     config and recipe_config.
+
+    Fields Appended to recipe_config
+    --------------------------------
+     'Lactic Acid' : str
+        Volume of (88%) lactic acid to add to the mash, rounded to
+        hundredths of a milliliter; 0 if the mash pH is at or below
+        the target without it.
+     'Mash pH' : float
+        Predicted mash pH with that volume of lactic acid.
+     'Mash pH Evaluations' : int
+        Number of balance equation evaluations, for the lactic acid
+        and the mash pH.
 
     """
-    up = config['unit_parser']
-    baseline_pH = 4.3
+    salts, mash_ph = _acidify_mash(config, recipe_config, target_pH)
+    if not quiet:
+        print(render(salts))
+        print(render(mash_ph))
 
-    r = config['mineral_profile']
+    return config, recipe_config
 
-    if 'Lactic Acid' in recipe_config:
-        lactic_acid_volume = up.convert(recipe_config['Lactic Acid'], 'milliliters')
-    else:
-        lactic_acid_volume = 0.
 
-    if 'Mash Water Volume' in recipe_config:
-        water_volume = up.convert(recipe_config['Mash Water Volume'], 'liters')
-    else:
-        msg = 'Mash Water Volume not specified.'
-        msg += ' Try running malt_composition first.'
-        raise ValueError(msg)
+def _acidify_mash(config, recipe_config, target_pH=None):
+    if target_pH is None:
+        target_pH = recipe_config['Target Mash pH']
 
-    brewing_water_pH = config['water']['water']['distilled']['pH']
-
-    malt_dipH = []
-    malt_buffering_capacity = []
-    malt_acidity = []
-    acids = []
-    malt_mass = []
-    for x in recipe_config['Malt']:
-        if x['name'] == 'Acidulated Malt':
-            continue
-        elif 'distilled pH' in x:
-            malt_dipH.append(x['distilled pH'])
-            malt_acidity.append(0.)
-            acids.append(0)
-
-            if 'buffering capacity' in x:
-                malt_buffering_capacity.append(x['buffering capacity'])
-            else:
-                msg = 'Buffering capacity required for {0:s}.'
-                raise ValueError(msg.format(x['name']))
-
-        elif 'acidity' in x:
-            malt_acidity.append(x['acidity'])
-            malt_dipH.append(0.)
-            malt_buffering_capacity.append(0.)
-            acids.append(1)
-
-        elif 'type' in x and x['type'] == 'crystal' and 'degrees lovibond' in x:
-            color = x['degrees lovibond']
-            malt_acidity.append(0.45 * color + 6)
-            malt_dipH.append(0.)
-            malt_buffering_capacity.append(0.)
-            acids.append(1)
-
-        elif x['name'] in config['malt'] and 'distilled pH' in config['malt'][x['name']]:
-            malt_dipH.append(config['malt'][x['name']]['distilled pH'])
-            malt_acidity.append(0.)
-            acids.append(0)
-
-            if 'buffering capacity' in config['malt'][x['name']]:
-                malt_buffering_capacity.append(config['malt'][x['name']]['buffering capacity'])
-            else:
-                msg = 'Buffering capacity required for {0:s}.'
-                raise ValueError(msg.format(x['name']))
-
-        elif x['name'] in config['malt'] and 'acidity' in config['malt'][x['name']]:
-            malt_acidity.append(config['malt'][x['name']]['acidity'])
-            malt_dipH.append(0.)
-            malt_buffering_capacity.append(0.)
-            acids.append(1)
-
-        elif (x['name'] in config['malt'] and 'type' in config['malt'][x['name']]
-              and config['malt'][x['name']]['type'] == 'crystal'
-              and 'degrees lovibond' in config['malt'][x['name']]):
-
-            color = config['malt'][x['name']]['degrees lovibond']
-            malt_acidity.append(0.45 * color + 6)
-            malt_dipH.append(0.)
-            malt_buffering_capacity.append(0.)
-            acids.append(1)
+    salts = _salt_additions(config, recipe_config)
 
-        else:
-            malt_acidity.append(0.)
-            malt_dipH.append(0.)
-            malt_buffering_capacity.append(0.)
-            acids.append(1)
+    this_dir, this_filename = os.path.split(__file__)
+    mmole_config = os.path.join(this_dir, 'resources', config['water']['files']['mmole'])
+    data = get_charge_table(mmole_config)
 
-        if 'mass' in x:
-            malt_mass.append(up.convert(x['mass'], 'kilograms'))
-        else:
-            malt_mass.append(0.)
+    recipe_config['Lactic Acid'] = '0 milliliters'
+    model = MashPHModel.from_recipe(config, recipe_config, data)
+    pH_temp = config['water'].get('pH reference temperature', 68)
+    target = convert_pH_temp(target_pH, pH_temp, 68) + model.acidulated_delta
+    volume = round(max(model.lactic_acid_volume(target), 0.), 2)
+    model.add_lactic_acid(volume)
+
+    pH, evaluations = model.solve(4.5, 8.5, tol=1e-6, full_output=True)
+    recipe_config['Lactic Acid'] = '{0:.2f} milliliters'.format(volume)
+    recipe_config['Mash pH Evaluations'] = evaluations + 1
+    mash_ph = _mash_ph_result(config, recipe_config, pH - model.acidulated_delta, volume)
+    return salts, mash_ph
+
+
+def batch_mash_ph(config, recipe_configs, mineral_profiles=None):
+    """Estimates the pH of the mash of many recipes at once.
 
-    malt_dipH = np.array(malt_dipH)
-    malt_buffering_capacity = np.array(malt_buffering_capacity)
-    malt_acidity = np.array(malt_acidity)
-    acids = np.array(acids)
-    malt_mass = np.array(malt_mass)
+    Computes the same mash pH as mash_ph for every recipe, by solving
+    all the balance equations in lockstep (see
+    ph_model.BatchMashPHModel), without printing anything.
 
-    charge_per_mmole = interpolate.interp1d(data[:, 0], data[:, 1])
+    Parameters
+    ----------
+     config : dict
+        Configuration, as in mash_ph.
+     recipe_configs : array_like
+        Array of recipes, as in mash_ph.
+     mineral_profiles : array_like or None
+        Mineral profile of the mash water of each recipe (one row per
+        recipe), or one profile shared by all recipes. Defaults to
+        config['mineral_profile'], as set by salt_additions.
+
+    Returns
+    -------
+     results : dict
+        Dictionary with entries:
+         'Mash pH' : predicted pH of each mash, relative to the
+            reference temperature.
+         'Acidulated Malt Adjustment' : reduction in the pH of each
+            mash due to acidulated malt (already applied to 'Mash
+            pH').
+         'Converged' : True for each recipe whose mash pH converged.
+         'pH Reference Temperature' : the reference temperature, in
+            degrees Fahrenheit.
+
+    """
+    config['unit_parser'] = get_unit_parser(config.get('units', None))
+
+    this_dir, this_filename = os.path.split(__file__)
+    mmole_config = os.path.join(this_dir, 'resources', config['water']['files']['mmole'])
+    data = get_charge_table(mmole_config)
+
+    model = BatchMashPHModel.from_recipes(config, recipe_configs, data,
+                                          mineral_profiles)
+    pH, converged = model.solve(4.5, 8.5, tol=1e-6)
+    pH = pH - model.acidulated_delta
+
+    pH_temp = config['water'].get('pH reference temperature', 68)
+    return {
+        'Mash pH': convert_pH_temp(pH, 68, pH_temp),
+        'Acidulated Malt Adjustment': model.acidulated_delta,
+        'Converged': converged,
+        'pH Reference Temperature': pH_temp
+    }
+
+
+def balance_eq(mash_pH, data, config, recipe_config):
+    """Computes the mash pH misbalance.
 
-    total_alkalinity = (r[5] - (100 / 0.17) * lactic_acid_volume / water_volume) / 50 # mEq / L
-    delta_c0 = charge_per_mmole(baseline_pH) - charge_per_mmole(brewing_water_pH)
-    delta_cz = charge_per_mmole(mash_pH) - charge_per_mmole(brewing_water_pH)
+    Parameters
+    ----------
+     mash_pH : float
+       Candidate mash pH.
+     data : ChargeTable or array
+       Charge per mmole as a function of pH.
 
-    z_alkalinity = total_alkalinity * delta_cz / delta_c0
-    z_ra = z_alkalinity - (r[0] * 2 / 40.078) / 3.5 - (r[1] * 2 / 24.305) / 7
-    mw_alkalinity = z_ra * water_volume # mEq
-    malt_dpH = malt_dipH - mash_pH
 
-    alkalinity_contribution = malt_dpH * malt_buffering_capacity # mEq / kg
-    for i in range(len(malt_acidity)):
-        if acids[i] == 1:
-            alkalinity_contribution[i] = -malt_acidity[i]
+    Returns
+    -------
+     balance : float
+        Value of balance equation. See notes in mash_ph().
 
-    malt_alkalinity = malt_mass.dot(alkalinity_contribution)
+    Notes
+    -----
+     This compiles the balance equation of the recipe on every call;
+     to evaluate it repeatedly, use ph_model.MashPHModel directly.
 
-    balance = mw_alkalinity + malt_alkalinity
-    return balance
+    """
+    return MashPHModel.from_recipe(config, recipe_config, data).balance(mash_pH)
 
 
 def get_targets(config, recipe_config):
@@ -746,138 +905,33 @@ def get_targets(config, recipe_config):
      rac : array
        Coefficients for residual alkalinity calculation.
 
-    """
-
-    CARBONATE_TO_ALKALINITY = 50. / 61
-
-    up = config['unit_parser']
-
-    waters = []
-    salts = []
-    minerals = [
-        'calcium',
-        'magnesium',
-        'sulfate',
-        'sodium',
-        'chloride',
-        'alkalinity'
-    ]
-
-    num_minerals = len(minerals)
-    mineral_dict = {k: i for (i, k) in enumerate(minerals)}
-    water_minerals = {}
-    for w, p in iteritems(config['water']['water']):
-        waters.append(w)
-
-        r = np.array([p.get(m, 0) for m in minerals])
-        if 'alkalinity' not in p and 'carbonate' in p:
-            r[mineral_dict['alkalinity']] = p['carbonate'] * CARBONATE_TO_ALKALINITY
-
-        water_minerals[w] = r
-
-    salt_minerals = {}
-    for s, p in iteritems(config['water']['salts']):
-        salts.append(s)
-
-        r = np.array([p.get(m, 0) for m in minerals])
-        if 'alkalinity' not in p and 'carbonate' in p:
-            r[mineral_dict['alkalinity']] = p['carbonate'] * CARBONATE_TO_ALKALINITY
-
-        salt_minerals[s] = r
-
-    water_dict = {k: i for (i, k) in enumerate(waters)}
-    salt_dict = {k: i for (i, k) in enumerate(salts)}
-
-    Aw = np.array([water_minerals[w] for w in waters]).transpose()
-    As = np.array([salt_minerals[s] for s in salts]).transpose()
-
-    p = config['water']['Residual Alkalinity']
-    rac = np.array([p.get(m, 0) for m in minerals])
-    if 'alkalinity' not in p and 'carbonate' in p:
-        rac[mineral_dict['alkalinity']] = p['carbonate'] * CARBONATE_TO_ALKALINITY
-
-    res_alk = None
-    cl_to_sl = None
-    if 'target' in recipe_config['Water Profile']:
-        tgt = recipe_config['Water Profile']['target']
+    Notes
+    -----
+     Everything derived from config['water'] alone (A, rac, and the
+     default mineral constraints) comes from a WaterModel built once
+     per water configuration (see water_model.get_water_model); the
+     returned arrays are shared, and read-only. Only the targets and
+     constraints of the recipe are assembled per call.
 
-        tgt_cmp = [tgt.get(m, None) for m in minerals]
-        if 'alkalinity' not in tgt and 'carbonate' in tgt:
-            tgt_cmp[mineral_dict['alkalinity']] = p['carbonate'] * CARBONATE_TO_ALKALINITY
+    """
 
-        if 'residualAlkalinity' in tgt:
-            res_alk = tgt['residualAlkalinity']
-        else:
-            res_alk = tgt_cmp.dot(rac)
-
-        if 'chlorideToSulfateRatio' in tgt:
-            cl_to_sl = np.zeros((num_minerals,))
-            cl_to_sl[mineral_dict['chloride']] = 1
-            cl_to_sl[mineral_dict['sulfate']] = -tgt['chlorideToSulfateRatio']
-        elif 'chloride' in tgt and 'sulfate' in tgt:
-            cl_to_sl = np.zeros((num_minerals,))
-            cl_to_sl[mineral_dict['chloride']] = 1
-            cl_to_sl[mineral_dict['sulfate']] = -float(tgt['chloride']) / tgt['sulfate']
-    else:
-        tgt_cmp = None
+    model = get_water_model(config)
+    profile = recipe_config['Water Profile']
+    tgt_cmp, cl_to_sl, res_alk = model.targets(profile.get('target', None))
 
-    if 'saltAdditions' in recipe_config['Water Profile']:
-        salt_additions = recipe_config['Water Profile']['saltAdditions']
-    elif 'defaultSaltAdditions' in config['water']:
-        salt_additions = config['water']['defaultSaltAdditions']
+    if 'saltAdditions' in profile:
+        salt_additions = profile['saltAdditions']
     else:
-        salt_additions = None
+        salt_additions = config['water'].get('defaultSaltAdditions', None)
+    B, b = model.salt_constraints(salt_additions, config['unit_parser'])
 
-    if salt_additions is None:
-        B = None
-        b = None
+    if 'mineralConstraints' in profile:
+        C, c = model.mineral_constraints(profile['mineralConstraints'])
     else:
-        linted_salt_additions = {k: v for k, v in iteritems(salt_additions)
-                                 if k in salts}
-
-        ns = len(linted_salt_additions.keys())
-        B = np.zeros((ns, len(salts)))
-        b = np.zeros((ns,))
-        for (i, k) in enumerate(linted_salt_additions.keys()):
-            B[i, salt_dict[k]] = 1.
-            b[i] = up.convert(linted_salt_additions[k], 'grams')
-
-    if 'mineralConstraints' in recipe_config['Water Profile']:
-        chem_const = recipe_config['Water Profile']['mineralConstraints']
-    elif 'mineralConstraints' in config['water']:
-        chem_const = config['water']['mineralConstraints']
-    else:
-        chem_const = None
+        C, c = model.C, model.c
 
-    if chem_const is None:
-        C = None
-        c = None
-    else:
-        linted_constraints = {k: v for k, v in iteritems(chem_const)
-                              if k in minerals}
-
-        nc = 0
-        for v in linted_constraints.values():
-            if 'minimum' in v:
-                nc += 1
-            if 'maximum' in v:
-                nc += 1
-
-        C = np.zeros((nc, len(minerals)))
-        c = np.zeros((nc,))
-        i = 0
-        for k, v in iteritems(linted_constraints):
-            if 'minimum' in v:
-                c[i] = -v['minimum']
-                C[i, mineral_dict[k]] = -1
-                i += 1
-
-            if 'maximum' in v:
-                c[i] = v['maximum']
-                C[i, mineral_dict[k]] = 1
-                i += 1
-
-    return waters, salts, minerals, tgt_cmp, cl_to_sl, res_alk, Aw, As, B, b, C, c, rac
+    return (model.waters, model.salts, model.minerals, tgt_cmp, cl_to_sl,
+            res_alk, model.Aw, model.As, B, b, C, c, model.rac)
 
 
 if __name__ == '__main__':
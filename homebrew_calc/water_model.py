@@ -0,0 +1,295 @@
+from __future__ import print_function
+import json
+import threading
+import numpy as np
+from .cache import content_key
+
+
+# Minerals tracked by the water calculations, in the order of the rows
+# of the mineral content matrices.
+MINERALS = (
+    'calcium',
+    'magnesium',
+    'sulfate',
+    'sodium',
+    'chloride',
+    'alkalinity'
+)
+
+CARBONATE_TO_ALKALINITY = 50. / 61
+
+
+class WaterModel(object):
+    """Catalog-derived part of the salt addition problem.
+
+    Everything get_targets derives from the water configuration alone
+    (the candidate waters and salts, their mineral content, the
+    residual alkalinity coefficients, and the default mineral
+    constraints) is built once here; only the recipe-specific targets
+    and constraints are assembled per recipe. The arrays are shared,
+    and so are read-only.
+
+    Parameters
+    ----------
+     water : dict
+        Water configuration (see water.json).
+
+    Attributes
+    ----------
+     waters, salts, minerals : list
+        Names of the candidate waters, salts, and minerals.
+     water_ids, salt_ids, mineral_ids : dict
+        Index of each water, salt, and mineral.
+     Aw : 2d array
+        Mineral-by-water matrix of mineral content, in ppm.
+     As : 2d array
+        Mineral-by-salt matrix of mineral content, in ppm per gram
+        per gallon.
+     rac : array
+        Coefficients for residual alkalinity calculation.
+     C, c : array or None
+        Default mineral constraints (see mineral_constraints), from
+        the 'mineralConstraints' of the water configuration.
+     key : str
+        Content hash of the water configuration.
+
+    """
+    def __init__(self, water, key=None):
+        if key is None:
+            key = water_key(water)
+
+        self.key = key
+        self.minerals = list(MINERALS)
+        self.mineral_ids = {k: i for (i, k) in enumerate(self.minerals)}
+        self.waters = list(water['water'].keys())
+        self.water_ids = {k: i for (i, k) in enumerate(self.waters)}
+        self.salts = list(water['salts'].keys())
+        self.salt_ids = {k: i for (i, k) in enumerate(self.salts)}
+
+        self.Aw = _frozen(np.array([self.mineral_content(water['water'][w])
+                                    for w in self.waters]).T)
+        self.As = _frozen(np.array([self.mineral_content(water['salts'][s])
+                                    for s in self.salts]).T)
+        self.rac = _frozen(self.mineral_content(water['Residual Alkalinity']))
+
+        self.C, self.c = self.mineral_constraints(water.get('mineralConstraints', None))
+
+    def mineral_content(self, p):
+        """Array of mineral content, in the order of minerals.
+
+        Parameters
+        ----------
+         p : dict
+            Mineral content by name; missing minerals are 0, and
+            alkalinity may be given as carbonate instead.
+
+        """
+        r = np.array([p.get(m, 0) for m in self.minerals], dtype=float)
+        if 'alkalinity' not in p and 'carbonate' in p:
+            r[self.mineral_ids['alkalinity']] = p['carbonate'] * CARBONATE_TO_ALKALINITY
+
+        return r
+
+    def scenario_matrices(self, scenarios):
+        """Mineral content matrices for scenarios of the waters.
+
+        Parameters
+        ----------
+         scenarios : array_like
+            Array of scenarios, each a dictionary mapping water names
+            to mineral content (as in the water configuration), e.g.
+            one per sampled or historical water report. Waters missing
+            from a scenario, and minerals missing from a water's
+            report, keep their nominal content.
+
+        Returns
+        -------
+         Aw_scenarios : 3d array
+            Scenario-by-mineral-by-water array of mineral content, in
+            ppm.
+
+        """
+        Aw_scenarios = np.repeat(self.Aw[None], len(scenarios), axis=0)
+        for k, scenario in enumerate(scenarios):
+            for w, p in scenario.items():
+                if w not in self.water_ids:
+                    raise ValueError('Unknown water {0:s} in scenario {1:d}.'.format(w, k))
+                j = self.water_ids[w]
+                given = [m for m in self.minerals if m in p]
+                if 'alkalinity' not in p and 'carbonate' in p:
+                    given.append('alkalinity')
+                ids = [self.mineral_ids[m] for m in given]
+                Aw_scenarios[k, ids, j] = self.mineral_content(p)[ids]
+
+        return Aw_scenarios
+
+    def targets(self, tgt):
+        """Target mineral profile of a recipe.
+
+        Parameters
+        ----------
+         tgt : dict or None
+            The 'target' of a water profile: mineral levels in ppm,
+            optionally with 'residualAlkalinity' and
+            'chlorideToSulfateRatio'.
+
+        Returns
+        -------
+         tgt_cmp : list or None
+            Desired level of each mineral, None where unspecified.
+         cl_to_sl : array or None
+            Coefficients of the chloride-to-sulfate ratio constraint,
+            if the ratio is specified (directly, or via chloride and
+            sulfate targets).
+         res_alk : float or None
+            Desired residual alkalinity, if specified (directly, or
+            via a complete target profile).
+
+        """
+        if tgt is None:
+            return None, None, None
+
+        tgt_cmp = [tgt.get(m, None) for m in self.minerals]
+        if 'alkalinity' not in tgt and 'carbonate' in tgt:
+            tgt_cmp[self.mineral_ids['alkalinity']] = tgt['carbonate'] * CARBONATE_TO_ALKALINITY
+
+        if 'residualAlkalinity' in tgt:
+            res_alk = tgt['residualAlkalinity']
+        elif None not in tgt_cmp:
+            res_alk = np.dot(tgt_cmp, self.rac)
+        else:
+            res_alk = None
+
+        if 'chlorideToSulfateRatio' in tgt:
+            ratio = tgt['chlorideToSulfateRatio']
+        elif 'chloride' in tgt and 'sulfate' in tgt:
+            ratio = float(tgt['chloride']) / tgt['sulfate']
+        else:
+            ratio = None
+
+        if ratio is None:
+            cl_to_sl = None
+        else:
+            cl_to_sl = np.zeros((len(self.minerals),))
+            cl_to_sl[self.mineral_ids['chloride']] = 1
+            cl_to_sl[self.mineral_ids['sulfate']] = -ratio
+
+        return tgt_cmp, cl_to_sl, res_alk
+
+    def salt_constraints(self, salt_additions, up):
+        """Fixed salt additions, as equality constraints B x = b.
+
+        Parameters
+        ----------
+         salt_additions : dict or None
+            Amount of each salt, as physical quantity strings (e.g.
+            '1 grams'). Unknown salts are ignored.
+         up : unit_parser
+            Unit parser.
+
+        Returns
+        -------
+         B, b : array or None
+
+        """
+        if salt_additions is None:
+            return None, None
+
+        linted_salt_additions = [(k, v) for k, v in salt_additions.items()
+                                 if k in self.salt_ids]
+        B = np.zeros((len(linted_salt_additions), len(self.salts)))
+        b = np.zeros((len(linted_salt_additions),))
+        for (i, (k, v)) in enumerate(linted_salt_additions):
+            B[i, self.salt_ids[k]] = 1.
+            b[i] = up.convert(v, 'grams')
+
+        return B, b
+
+    def mineral_constraints(self, chem_const):
+        """Mineral bounds, as inequality constraints C x <= c.
+
+        Parameters
+        ----------
+         chem_const : dict or None
+            Bounds on each mineral, as dictionaries with 'minimum'
+            and/or 'maximum' entries. Unknown minerals are ignored.
+
+        Returns
+        -------
+         C, c : array or None
+
+        """
+        if chem_const is None:
+            return None, None
+
+        rows = []
+        bounds = []
+        for k, v in chem_const.items():
+            if k not in self.mineral_ids:
+                continue
+
+            if 'minimum' in v:
+                rows.append((self.mineral_ids[k], -1.))
+                bounds.append(-v['minimum'])
+
+            if 'maximum' in v:
+                rows.append((self.mineral_ids[k], 1.))
+                bounds.append(v['maximum'])
+
+        C = np.zeros((len(rows), len(self.minerals)))
+        for (i, (j, sign)) in enumerate(rows):
+            C[i, j] = sign
+
+        return _frozen(C), _frozen(np.array(bounds, dtype=float))
+
+
+def _frozen(a):
+    a.flags.writeable = False
+    return a
+
+
+def water_key(water):
+    """Content hash of the parts of a water configuration a WaterModel
+    depends on (including the order of waters and salts).
+
+    """
+    parts = [water.get(k, None) for k in
+             ('water', 'salts', 'Residual Alkalinity', 'mineralConstraints')]
+    return content_key('water', json.dumps(parts, default=repr))
+
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_water_model(config):
+    """WaterModel for config['water'], built on first use and cached in
+    config['water_model'] (together with the water configuration it
+    was built for).
+
+    Models are also shared process-wide, keyed by a content hash of
+    the water configuration, so configurations loaded separately but
+    equal share a model. Replacing config['water'] picks up the new
+    configuration on the next request; a water configuration modified
+    in place should be replaced by a copy (or config['water_model']
+    removed).
+
+    Returns
+    -------
+     model : WaterModel
+
+    """
+    water = config['water']
+    entry = config.get('water_model', None)
+    if entry is not None and entry[0] is water:
+        return entry[1]
+
+    key = water_key(water)
+    with _models_lock:
+        model = _models.get(key, None)
+        if model is None:
+            model = WaterModel(water, key)
+            _models[key] = model
+
+    config['water_model'] = (water, model)
+    return model
@@ -1,8 +1,13 @@
 from __future__ import print_function
+import csv
+import itertools
 import json
 import os
-import math
-from unit_parser import unit_parser
+import sys
+import numpy as np
+from .units import get_unit_parser
+from .report import render
+from .results import YeastResult
 
 
 def abvcalc_main():
@@ -11,42 +16,138 @@ def abvcalc_main():
     """
     import argparse
     parser = argparse.ArgumentParser()
-    parser.add_argument('og', type=float, help='Original Gravity')
-    parser.add_argument('fg', type=float, help='Final Gravity')
+    parser.add_argument('og', type=float, nargs='?', help='Original Gravity')
+    parser.add_argument('fg', type=float, nargs='?', help='Final Gravity')
+    parser.add_argument('-b', '--batch', type=str,
+                        help='CSV file of OG/FG pairs ("-" for stdin)')
+    parser.add_argument('-o', '--output', type=str,
+                        help='Output CSV file for batch mode (defaults to stdout)')
+    parser.add_argument('--chunk-size', type=int, default=65536,
+                        help='Number of rows to process at a time in batch mode')
 
     args = parser.parse_args()
+    if args.batch is not None:
+        infile = sys.stdin if args.batch == '-' else open(args.batch, 'r')
+        outfile = sys.stdout if args.output is None else open(args.output, 'w')
+        try:
+            abv_stream(infile, outfile, args.chunk_size)
+        finally:
+            if infile is not sys.stdin:
+                infile.close()
+            if outfile is not sys.stdout:
+                outfile.close()
+        return
+
+    if args.og is None or args.fg is None:
+        parser.error('og and fg are required unless --batch is specified')
+
     abv = 100. * abv_calc(args.og, args.fg)
     att = 100.0 * attenuation(args.og, args.fg)
     print('{0:.02f}% ABV'.format(abv))
     print('{0:.0f}% Attenuation'.format(att))
 
 
+def abv_stream(infile, outfile, chunk_size=65536):
+    """Computes ABV and attenuation for a stream of OG/FG pairs.
+
+    Reads CSV rows from infile and writes them to outfile with two
+    columns appended: ABV and attenuation (as fractions, like 0.064
+    and 0.8). Rows are processed chunk_size at a time, so memory use
+    does not depend on the length of the input.
+
+    Parameters
+    ----------
+    infile : file
+        CSV input. If the first row is a header, the original and
+        final gravities are read from the columns named 'og' and 'fg'
+        (case insensitive), and a header without them is an error;
+        otherwise, from the first two columns.
+    outfile : file
+        CSV output.
+    chunk_size : int
+        Number of rows to process at a time.
+
+    Returns
+    -------
+    num_rows : int
+        Number of OG/FG pairs processed.
+
+    """
+    reader = csv.reader(infile)
+    writer = csv.writer(outfile, lineterminator='\n')
+
+    rows = (row for row in reader if row)
+    first = next(rows, None)
+    if first is None:
+        return 0
+
+    og_col = 0
+    fg_col = 1
+    try:
+        float(first[0])
+    except ValueError:
+        header = [h.strip().lower() for h in first]
+        if 'og' not in header or 'fg' not in header:
+            raise ValueError('Header has no og and fg columns: {0:s}'.format(', '.join(first)))
+        og_col = header.index('og')
+        fg_col = header.index('fg')
+        writer.writerow(first + ['abv', 'attenuation'])
+    else:
+        rows = itertools.chain([first], rows)
+
+    num_rows = 0
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            break
+
+        og = np.array([row[og_col] for row in chunk], dtype=float)
+        fg = np.array([row[fg_col] for row in chunk], dtype=float)
+        abv = abv_calc(og, fg)
+        att = attenuation(og, fg)
+        writer.writerows(row + ['{0:.6f}'.format(a), '{0:.6f}'.format(t)]
+                         for row, a, t in zip(chunk, abv, att))
+        num_rows += len(chunk)
+
+    return num_rows
+
+
 def abv_calc(og, fg, simple=None):
     """Computes ABV from OG and FG.
 
     Parameters
     ----------
-    og : float
+    og : float or array_like
         Original gravity, like 1.053
-    fg : float
+    fg : float or array_like
         Final gravity, like 1.004
     simple : bool or None, defaults to None.
         Flag specifying whether to use the simple (linear) equation or
         the more complicated nonlinear equation. The simple equation
         is generally appropriate provided the difference in original
         and final gravities is less than 0.05. If None, this function
-        will decide for itself which formula to use.
+        will decide for itself (element-wise) which formula to use.
 
     Returns
     -------
-    abv : float
+    abv : float or array
         Alcohol by volume, like 0.064.
 
     """
-    if (simple is None and og < fg + 0.05) or simple:
-        return (og - fg) * 1.3125
+    og = np.asarray(og, dtype=float)
+    fg = np.asarray(fg, dtype=float)
+    linear = (og - fg) * 1.3125
+    if simple is None:
+        use_linear = og < fg + 0.05
+    elif simple:
+        return linear[()]
     else:
-        return (0.7608 * (og - fg) / (1.775 - og)) * (fg / 0.794)
+        use_linear = False
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        nonlinear = (0.7608 * (og - fg) / (1.775 - og)) * (fg / 0.794)
+
+    return np.where(use_linear, linear, nonlinear)[()]
 
 
 def attenuation(og, fg):
@@ -54,18 +155,19 @@ def attenuation(og, fg):
 
     Parameters
     ----------
-    og : float
+    og : float or array_like
         Original gravity, like 1.053
-    fg : float
+    fg : float or array_like
         Final gravity, like 1.004
 
     Returns
     -------
-    attenuation : float
+    attenuation : float or array
        Attenuation, like 0.92.
 
     """
-    return (og - fg) / (og - 1.0)
+    og = np.asarray(og, dtype=float)
+    return ((og - fg) / (og - 1.0))[()]
 
 
 def predict_final_gravity(og, attenuation):
@@ -73,18 +175,19 @@ def predict_final_gravity(og, attenuation):
 
     Parameters
     ----------
-    og : float
+    og : float or array_like
         Original gravity, like 1.053
-    attenuation : float
+    attenuation : float or array_like
        Attenuation, like 0.92.
 
     Returns
     -------
-    fg : float
+    fg : float or array
         Final gravity, like 1.004
 
     """
-    return og - attenuation * (og - 1.)
+    og = np.asarray(og, dtype=float)
+    return (og - np.asarray(attenuation) * (og - 1.))[()]
 
 
 def gravity_to_deg_plato(sg):
@@ -92,16 +195,16 @@ def gravity_to_deg_plato(sg):
 
     Parameters
     ----------
-    sg : float
+    sg : float or array_like
         Original gravity, like 1.053
 
     Returns
     -------
-    deg_plato : float
+    deg_plato : float or array
         Degrees Plato, like 13.5
 
     """
-    return 250. * (sg - 1.)
+    return (250. * (np.asarray(sg, dtype=float) - 1.))[()]
 
 
 def deg_plato_to_gravity(deg_plato):
@@ -109,16 +212,16 @@ def deg_plato_to_gravity(deg_plato):
 
     Parameters
     ----------
-    deg_plato : float
+    deg_plato : float or array_like
         Degrees Plato, like 13.5
 
     Returns
     -------
-    sg : float
+    sg : float or array
         Specific gravity, like 1.053
 
     """
-    return 1. + (deg_plato / 250.)
+    return (1. + (np.asarray(deg_plato, dtype=float) / 250.))[()]
 
 
 def main():
@@ -137,18 +240,23 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('recipe', type=str, help='Recipe JSON')
     parser.add_argument('-o', '--output', type=str, help='Output file')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Print nothing')
 
     args = parser.parse_args()
     recipe_config = json.load(open(args.recipe, 'r'))
     if args.output:
         config['Output'] = args.output
 
-    execute(config, recipe_config)
+    execute(config, recipe_config, quiet=args.quiet)
 
 
-def execute(config, recipe_config):
+def execute(config, recipe_config, quiet=False):
     """Calculations relevant to yeast characteristics.
 
+    Computes the yeast_result, prints its report (see report.render)
+    unless quiet, and, if config['Output'] is given, saves the
+    recipe to that file.
+
     Note: required parameters are in either config or
     recipe_config. Where applicable, if a parameter is specified in
     both config and recipe_config, the latter overrides the former.
@@ -183,12 +291,12 @@ def execute(config, recipe_config):
 
     Returns
     -------
-     This function does not return anything. Instead, it appends the
-     following parameters to recipe_config, and if requested, saves
-     the latter to the specified file. It also prints the number of
-     yeast cells needed, which translates into how big of a starter to
-     use. Starter size calculations have not yet been implemented but
-     are very imortant!
+     This function appends the following parameters to recipe_config,
+     and returns both config (unmodified) and recipe_config. The
+     report also shows the number of yeast cells needed, which
+     translates into how big of a starter to use. Starter size
+     calculations have not yet been implemented but are very
+     imortant!
 
     Fields Appended to recipe_config
     --------------------------------
@@ -197,10 +305,36 @@ def execute(config, recipe_config):
      'Alcohol by Volume' : float
         Predicted final ABV of beer.
 
+    """
+    result = yeast_result(config, recipe_config)
+    if not quiet:
+        print(render(result))
+
+    if 'Output' in config:
+        with open(config['Output'], 'w') as outfile:
+            json.dump(recipe_config, outfile, indent=2, sort_keys=True)
+
+    return config, recipe_config
+
+
+def yeast_result(config, recipe_config):
+    """Yeast calculations, without printing anything.
+
+    Parameters
+    ----------
+     config, recipe_config : dict
+        As in execute. The fields documented there are appended to
+        recipe_config.
+
+    Returns
+    -------
+     result : results.YeastResult
+
     """
     # Viability
     # Starter calculation
 
+    result = YeastResult()
     attenuation = 0.
     for yeast in recipe_config['Yeast']:
         if 'attenuation' in yeast and yeast['attenuation'] > attenuation:
@@ -217,13 +351,8 @@ def execute(config, recipe_config):
         recipe_config['Final Gravity'] = fg
         abv = abv_calc(og, fg)
         recipe_config['Alcohol by Volume'] = abv
-        print('Final Gravity: {0:.03f}'.format(fg))
-        print('Alcohol by Volume: {0:.01f}%'.format(100. * abv))
 
-        if 'units' in config:
-            up = unit_parser(config['units'])
-        else:
-            up = unit_parser()
+        up = get_unit_parser(config.get('units', None))
 
         if 'Pitchable Volume' in recipe_config:
             pitchable_volume = up.convert(recipe_config['Pitchable Volume'], 'milliliters')
@@ -231,7 +360,7 @@ def execute(config, recipe_config):
             pitchable_volume = up.convert(config['Pitchable Volume'], 'milliliters')
         else:
             pitchable_volume = up.convert(5.25, 'gallons', 'milliliters')
-            print('Pitchable volume not specified, assuming 5.25 gallons')
+            result.assume('Pitchable volume not specified, assuming 5.25 gallons')
 
         # Want 750k cells per milliliter per degree Plato for ales
         # 1.5 million for lagers
@@ -242,11 +371,15 @@ def execute(config, recipe_config):
 
         degP = gravity_to_deg_plato(og)
         cell_count = cells_needed * pitchable_volume * degP
-        print('Cells needed (billions): {0:.0f}'.format(cell_count / 1e9))
 
-    if 'Output' in config:
-        with open(config['Output'], 'w') as outfile:
-            json.dump(recipe_config, outfile, indent=2, sort_keys=True)
+        result.original_gravity = og
+        result.final_gravity = fg
+        result.abv = abv
+        result.pitchable_volume = pitchable_volume
+        result.cell_count = cell_count
+
+    result.attenuation = attenuation
+    return result
 
 
 if __name__ == '__main__':
@@ -17,7 +17,7 @@ setup(name='homebrew_calc',
           "License :: OSI Approved :: Apache Software License"
       ],
       install_requires=[
-          "unit_parser",
+          "unit_parser==0.2",
           "numpy",
           "scipy",
           "cvxpy"
@@ -34,7 +34,10 @@ setup(name='homebrew_calc',
               'yeast_composition=homebrew_calc.yeast_composition:main',
               'brew_day=homebrew_calc.brew_day:main',
               'abvcalc=homebrew_calc.yeast_composition:abvcalc_main',
-              'convert_ph_temp=homebrew_calc.water_composition:convert_pH_temp_main'
+              'convert_ph_temp=homebrew_calc.water_composition:convert_pH_temp_main',
+              'water_batch=homebrew_calc.batch:water_batch_main',
+              'calibrate_equipment=homebrew_calc.calibration:calibrate_equipment_main',
+              'brew_pipeline=homebrew_calc.pipeline:brew_pipeline_main'
           ]
       },
       zip_safe=False)
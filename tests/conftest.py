@@ -0,0 +1,13 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(monkeypatch, tmpdir_factory):
+    """Keeps the on-disk caches (salt addition solutions, unit parser
+    snapshots) of each test in a fresh directory, rather than the
+    user's cache directory.
+
+    """
+    directory = tmpdir_factory.mktemp('cache')
+    monkeypatch.setenv('HOMEBREW_CALC_CACHE_DIR', str(directory))
+    return directory
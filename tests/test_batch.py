@@ -0,0 +1,86 @@
+import pytest
+import copy
+import json
+import os
+import sys
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from .context import homebrew_calc as hbc
+
+
+def get_recipe():
+    this_dir, this_filename = os.path.split(__file__)
+    return os.path.join(this_dir, 'resources', 'weddingBrownWater.json')
+
+
+def test_water_batch(capsys):
+    """Tests results, error capture, and ordering.
+
+    """
+    recipe_config = json.load(open(get_recipe(), 'r'))
+    acid = dict(recipe_config, **{'Lactic Acid': '4 milliliters'})
+    broken = {'Malt': []}
+    recipes = [get_recipe(), acid, broken, get_recipe()]
+
+    results = list(hbc.water_batch(recipes, max_workers=2, chunksize=1))
+    assert [r.index for r in results] == [0, 1, 2, 3]
+    assert results[2].error is not None and results[2].recipe_config is None
+    assert results[0].recipe_config == results[3].recipe_config
+    assert 'Mash pH' in results[1].output
+    assert results[1].result.mash_ph.mash_ph == results[1].recipe_config['Mash pH']
+
+    config = hbc.batch.default_config()
+    expected = copy.deepcopy(acid)
+    hbc.water_composition.execute(config, expected)
+    capsys.readouterr()
+    assert results[1].recipe_config['Mash pH'] == pytest.approx(expected['Mash pH'])
+    assert results[1].recipe_config['Salts'] == expected['Salts']
+
+    unordered = list(hbc.water_batch(recipes, max_workers=2, chunksize=3,
+                                     ordered=False))
+    assert sorted(r.index for r in unordered) == [0, 1, 2, 3]
+
+
+def test_water_batch_serial():
+    """Without concurrent.futures, recipes run in this process."""
+    recipes = [get_recipe(), {'Malt': []}, get_recipe()]
+    with patch.dict(sys.modules, {'concurrent.futures': None}):
+        results = list(hbc.water_batch(recipes, chunksize=2))
+    assert [r.index for r in results] == [0, 1, 2]
+    assert results[1].error is not None
+    assert results[0].recipe_config == results[2].recipe_config
+
+
+def test_water_batch_clu(tmpdir):
+    testargs = ['water_batch', get_recipe(), '-o', str(tmpdir), '-j', '1']
+    with patch.object(sys, 'argv', testargs):
+        status = hbc.batch.water_batch_main()
+    assert status == 0
+    assert tmpdir.join('weddingBrownWater.json').check()
+
+    broken = tmpdir.join('broken.json')
+    broken.write(json.dumps({'Malt': []}))
+    testargs = ['water_batch', get_recipe(), str(broken), '-j', '1']
+    with patch.object(sys, 'argv', testargs):
+        status = hbc.batch.water_batch_main()
+    assert status == 1
+
+
+def test_output_names(tmpdir):
+    """Recipes with the same name in different directories keep apart."""
+    recipe_config = json.load(open(get_recipe(), 'r'))
+    recipes = []
+    for name in ['ales', 'lagers']:
+        recipe = tmpdir.join('recipes', name, 'house.json')
+        recipe.write(json.dumps(recipe_config), ensure=True)
+        recipes.append(str(recipe))
+
+    output = tmpdir.join('out')
+    testargs = ['water_batch'] + recipes + ['-o', str(output), '-j', '1']
+    with patch.object(sys, 'argv', testargs):
+        assert hbc.batch.water_batch_main() == 0
+    assert output.join('ales', 'house.json').check()
+    assert output.join('lagers', 'house.json').check()
@@ -0,0 +1,48 @@
+import os
+import numpy as np
+from .context import homebrew_calc as hbc
+
+
+def test_content_key():
+    """Tests that keys depend on values, not types.
+
+    """
+    key = hbc.cache.content_key('salts', [1, 2, 3], None, 2.)
+    assert hbc.cache.content_key('salts', np.array([1., 2., 3.]), None, 2) == key
+    assert hbc.cache.content_key('salts', [1, 2, 3], 0., 2.) != key
+    assert hbc.cache.content_key('salts', [[1, 2, 3]], None, 2.) != key
+    assert hbc.cache.content_key('salt', [1, 2, 3], None, 2.) != key
+    # Text and bytes (e.g. str and unicode on Python 2) hash alike.
+    assert hbc.cache.content_key(b'salts', [1, 2, 3], None, 2.) == key
+    assert hbc.cache.content_key(u'salts', [1, 2, 3], None, 2.) == key
+
+
+def test_solution_cache(tmpdir):
+    """Tests storage, misses, and least-recently-used eviction.
+
+    """
+    cache = hbc.cache.SolutionCache(str(tmpdir), max_entries=10)
+    assert cache.get('a') is None
+
+    for i in range(10):
+        cache.put(str(i), {'value': i})
+        os.utime(str(tmpdir.join('{0:d}.json'.format(i))), (i, i))
+
+    # Reading entry 0 makes it the most recently used.
+    assert cache.get('0') == {'value': 0}
+    cache.put('10', {'value': 10})
+    assert len(tmpdir.listdir()) == 9
+    assert cache.get('0') == {'value': 0}
+    assert cache.get('1') is None
+    assert cache.get('10') == {'value': 10}
+
+    tmpdir.join('corrupt.json').write('{')
+    assert cache.get('corrupt') is None
+
+    cache.clear()
+    assert len(tmpdir.listdir()) == 0
+
+
+def test_disabled(monkeypatch):
+    monkeypatch.setenv('HOMEBREW_CALC_CACHE_DIR', '')
+    assert hbc.cache.get_solution_cache('water') is None
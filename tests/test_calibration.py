@@ -0,0 +1,143 @@
+import pytest
+import copy
+import json
+import os
+import numpy as np
+from .context import homebrew_calc as hbc
+
+
+def get_config():
+    config = hbc.batch.default_config()
+    config['unit_parser'] = hbc.get_unit_parser(config['units'])
+    return config
+
+
+def get_recipes(config, num=40, thermal_mass='2000 calories_per_degC'):
+    """Recipes with the brew day measurements of a brewery whose
+    equipment differs from the configuration."""
+    this_dir, this_filename = os.path.split(__file__)
+    recipe = json.load(open(os.path.join(this_dir, 'resources', 'weddingBrownWater.json'), 'r'))
+    recipe['Pre-Boil Volume'] = '6.5 gallons'
+    recipe['Pre-Boil Gravity'] = 1.036
+
+    actual = dict(config, **{'Mashtun Thermal Mass': thermal_mass,
+                             'Mashtun Heat Loss Coefficient': '500 calories_per_hour_degC'})
+    rng = np.random.RandomState(0)
+    recipes = []
+    for i in range(num):
+        recipe_config = copy.deepcopy(recipe)
+        recipe_config['Mash Water Volume'] = '{0:.3f} gallons'.format(rng.uniform(2, 5))
+        recipe_config['Mash']['temperature'] = rng.uniform(148, 158)
+        recipe_config['Mash']['duration'] = '{0:.0f} minutes'.format(rng.uniform(45, 90))
+        pre_boil_volume = rng.uniform(6, 7)
+        recipe_config['Brew Day'] = {
+            'temperature': rng.uniform(40, 80),
+            'Pre-Boil Volume': '{0:.6f} gallons'.format(pre_boil_volume),
+            'Post-Boil Volume': '{0:.6f} gallons'.format(pre_boil_volume - 1.4),
+            # 80% efficient instead of the planned 70%
+            'Original Gravity': 1 + 0.036 * 6.5 / (pre_boil_volume - 1.4) * 0.8 / 0.7,
+        }
+        # The strike and final mash temperatures as brewed
+        hbc.brew_day.infusion_mash(actual, recipe_config, quiet=True)
+        recipes.append(recipe_config)
+    return recipes
+
+
+def test_calibrate_equipment():
+    config = get_config()
+    recipes = get_recipes(config)
+    broken = {'Name': 'broken', 'Mash Water Volume': '3 gallons', 'Brew Day': {},
+              'Mash': {'type': 'Infusion', 'temperature': 152}}
+    calibration = hbc.calibrate_equipment(config, recipes + [broken])
+    assert calibration.recipes == len(recipes)
+    assert calibration.skipped[0][0] == 'broken'
+
+    params = calibration.parameters
+    up = config['unit_parser']
+    assert up.convert(params['Evaporation Rate'], 'gallons_per_hour') == pytest.approx(1.4, rel=1e-3)
+    assert params['Brewhouse Efficiency'] == pytest.approx(0.8, rel=1e-3)
+    assert up.convert(params['Mashtun Thermal Mass'], 'calories_per_degC') == pytest.approx(2000, rel=1e-2)
+    assert up.convert(params['Mashtun Heat Loss Coefficient'],
+                      'calories_per_hour_degC') == pytest.approx(500, rel=1e-2)
+
+    diag = calibration.diagnostics['Mashtun Thermal Mass']
+    assert diag['observations'] == len(recipes)
+    assert diag['previous'] == pytest.approx(1300)
+    assert diag['rms after'] < 1e-3 < diag['rms before']
+    assert 'Heat Loss During Kettle Transfer' not in params
+
+    # A skipped recipe contributes nothing, not even its boil.
+    broken['Brew Day'] = {'Pre-Boil Volume': '7 gallons', 'Post-Boil Volume': '1 gallons'}
+    calibration = hbc.calibrate_equipment(config, [broken])
+    assert calibration.recipes == 0
+    assert len(calibration.skipped) == 1
+    assert calibration.parameters == {}
+
+    # The calibrated profile predicts the brew days.
+    calibrated = dict(config, **params)
+    recipe_config = copy.deepcopy(recipes[0])
+    final = recipe_config['Brew Day']['Final Mash Temperature']
+    del recipe_config['Brew Day']['Final Mash Temperature']
+    hbc.brew_day.infusion_mash(calibrated, recipe_config, quiet=True)
+    assert recipe_config['Brew Day']['Final Mash Temperature'] == pytest.approx(final, abs=0.01)
+
+
+def test_write_equipment_profile(tmpdir):
+    config = get_config()
+    calibration = hbc.calibrate_equipment(config, get_recipes(config, 5))
+    output = str(tmpdir.join('homebrew.json'))
+    hbc.write_equipment_profile(calibration, output)
+
+    profile = json.load(open(output, 'r'))
+    assert profile['files'] == config['files']
+    assert profile['Evaporation Rate'] == calibration.parameters['Evaporation Rate']
+    assert profile['Heat Loss During Kettle Transfer'] == config['Heat Loss During Kettle Transfer']
+    assert profile['Calibration']['recipes'] == 5
+    assert profile['Calibration']['Brewhouse Efficiency']['previous'] == 0.7
+
+
+def test_large_parameters(tmpdir):
+    """Parameters of 10000 or more are saved in a form the unit parser
+    reads back, to 6 significant figures."""
+    config = get_config()
+    calibration = hbc.calibrate_equipment(
+        config, get_recipes(config, 10, thermal_mass='23456.7 calories_per_degC'))
+    thermal_mass = calibration.parameters['Mashtun Thermal Mass']
+    assert 'e' not in thermal_mass.split()[0]
+
+    output = str(tmpdir.join('homebrew.json'))
+    hbc.write_equipment_profile(calibration, output)
+    profile = json.load(open(output, 'r'))
+    up = config['unit_parser']
+    assert up.convert(profile['Mashtun Thermal Mass'], 'calories_per_degC') == pytest.approx(
+        calibration.diagnostics['Mashtun Thermal Mass']['value'], rel=1e-6)
+    assert up.convert(thermal_mass, 'calories_per_degC') == pytest.approx(23456.7, rel=1e-3)
+
+
+def test_step_mash():
+    """Step mashes brewed as predicted calibrate to the equipment they
+    were predicted with."""
+    config = get_config()
+    actual = dict(config, **{'Mashtun Heat Loss Coefficient': '300 calories_per_hour_degC'})
+    recipes = []
+    for recipe_config in get_recipes(config, 4):
+        recipe_config['Mash'] = {
+            'type': 'Step',
+            'steps': [{'temperature': 122, 'duration': '20 minutes'},
+                      {'temperature': 148, 'duration': '45 minutes'},
+                      {'temperature': 158, 'duration': '15 minutes'}]
+        }
+        steps = recipe_config['Mash']['steps']
+        result = hbc.brew_day._step_mash(hbc.get_equipment_profile(actual), recipe_config)
+        steps[0]['Water Temperature in Mashtun'] = result.strike_temperature
+        steps[0]['Final Mash Temperature'] = result.final_temperature
+        for step, step_result in zip(steps[1:], result.steps):
+            step['Achieved Mash Temperature'] = step['temperature']
+            step['Final Mash Temperature'] = step_result.final_temperature
+        recipes.append(recipe_config)
+
+    calibration = hbc.calibrate_equipment(config, recipes)
+    diag = calibration.diagnostics['Mashtun Heat Loss Coefficient']
+    assert diag['observations'] == 4 * 5
+    assert diag['value'] == pytest.approx(300, rel=1e-3)
+    assert calibration.diagnostics['Mashtun Thermal Mass']['value'] == pytest.approx(1300, rel=1e-3)
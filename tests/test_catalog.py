@@ -0,0 +1,85 @@
+import pytest
+import numpy as np
+from .context import homebrew_calc as hbc
+
+
+def get_catalog():
+    malt = {
+        'Sucrose': {'ppg': 46},
+        'Pale': {
+            'type': 'base',
+            'distilled pH': 5.7,
+            'buffering capacity': 33,
+            'extract potential': 0.8,
+            'degrees lovibond': 3.
+        },
+        'Crystal 60': {
+            'type': 'crystal',
+            'extract potential': 0.75,
+            'degrees lovibond': 60.
+        },
+        'Chocolate': {
+            'type': 'roast',
+            'acidity': 40.,
+            'ppg': 28,
+            'degrees lovibond': 350.
+        }
+    }
+    hops = {'Mosaic': {'alpha acids': 11.3}}
+    water = {'water': {'distilled': {'pH': 7.0}}}
+    return hbc.Catalog(malt, hops, water)
+
+
+def test_catalog_malt_columns():
+    """Tests malt properties resolved when building the catalog.
+
+    """
+    catalog = get_catalog()
+    pale = catalog.malt_id('Pale')
+    crystal = catalog.malt_id('Crystal 60')
+    chocolate = catalog.malt_id('Chocolate')
+
+    assert catalog.ppg[pale] == pytest.approx(0.8 * 46)
+    assert catalog.ppg[chocolate] == 28
+    assert not catalog.acid[pale]
+    assert catalog.buffering_capacity[pale] == 33
+    assert catalog.acid[crystal]
+    assert catalog.acidity[crystal] == pytest.approx(0.45 * 60 + 6)
+    assert catalog.acidity[chocolate] == 40.
+    assert catalog.malt_type[crystal] == hbc.MALT_TYPE_CODES['crystal']
+    assert catalog.malt_id('Unknown') == catalog.unknown_malt
+    assert catalog.water_ph[catalog.water_ids['distilled']] == 7.0
+
+
+def test_catalog_malt_properties():
+    """Tests recipe-level overrides of catalog malt properties.
+
+    """
+    catalog = get_catalog()
+    malts = [
+        {'name': 'Pale'},
+        {'name': 'Pale', 'ppg': 30, 'type': 'crystal', 'degrees lovibond': 20.},
+        {'name': 'Crystal 60', 'acidity': 10.},
+        {'name': 'Unknown'},
+        {'name': 'Unknown', 'distilled pH': 5.5}
+    ]
+    properties = catalog.malt_properties(malts)
+    assert list(properties['ppg']) == pytest.approx([0.8 * 46, 30, 0.75 * 46, 0, 0])
+    assert list(properties['lovibond']) == [3., 20., 60., 0., 0.]
+    assert list(properties['acid']) == [False, True, True, True, False]
+    assert list(properties['acidity']) == pytest.approx([0, 15., 10., 0, 0])
+    assert np.isnan(properties['buffering_capacity'][4])
+
+    # The catalog itself is not modified.
+    assert catalog.ppg[catalog.malt_id('Pale')] == pytest.approx(0.8 * 46)
+
+
+def test_catalog_hop_alpha_acids():
+    """Tests resolving hop alpha acids.
+
+    """
+    catalog = get_catalog()
+    hops = [{'name': 'Mosaic'}, {'name': 'Mosaic', 'alpha acids': 12.}, {'name': 'Unknown'}]
+    alpha_acids = catalog.hop_alpha_acids(hops)
+    assert alpha_acids[:2] == pytest.approx([0.113, 0.12])
+    assert np.isnan(alpha_acids[2])
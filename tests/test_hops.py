@@ -1,4 +1,5 @@
 import pytest
+import numpy as np
 from .context import homebrew_calc as hbc
 
 
@@ -107,3 +108,55 @@ def test_execution():
 
     _, res = hbc.hop_composition.execute(config, recipe_config)
     assert res['IBUs'] == pytest.approx(42.803352792814394)
+
+
+def test_hop_utilization_array():
+    """Tests hop utilization on arrays of additions.
+
+    """
+    sg = np.array([1.055, 1.055, 1.055, 1.040])
+    bt = np.array([60., 60., 60., 0.])
+    addition_type = ['timed', 'first wort hopping', 'flameout', 'dry hop']
+    expected = [hbc.hop_utilization(sg[i], bt[i], addition_type[i])
+                for i in range(len(bt))]
+    codes = hbc.addition_type_code(addition_type)
+    assert list(codes) == [0, 1, 2, 0]
+    assert hbc.hop_utilization(sg, bt, addition_type) == pytest.approx(expected)
+    assert hbc.hop_utilization(sg, bt, codes) == pytest.approx(expected)
+
+
+def test_ibu_contribution_array():
+    """Tests hop IBU contribution on arrays of additions.
+
+    """
+    aa = np.array([0.045, 0.045])
+    m = np.array([2., 2.])
+    ut = 0.2205283938
+    ibus = hbc.ibu_contribution(aa, m, 5, ut, np.array([False, True]))
+    assert ibus == pytest.approx([29.7316380521, 29.7316380521 / 0.9])
+
+
+def test_batch_ibus():
+    """Tests IBUs of several recipes at once.
+
+    """
+    sg = [1.050, 1.060]
+    bv = [5., 6.]
+    recipe = [0, 0, 0, 1, 1]
+    bt = [20., 60., 0., 60., 10.]
+    addition_type = ['first wort hopping', 'timed', 'flameout', 'timed', 'timed']
+    aa = [0.05, 0.05, 0.05, 0.12, 0.06]
+    mass = [1., 1., 1., 0.5, 2.]
+    pellets = [True, True, False, True, True]
+
+    ibus, total = hbc.batch_ibus(sg, bt, addition_type, aa, mass, bv,
+                                 pellets=pellets, recipe=recipe)
+
+    expected = []
+    for i, r in enumerate(recipe):
+        ut = hbc.hop_utilization(sg[r], bt[i], addition_type[i])
+        hop_type = 'pellets' if pellets[i] else 'whole'
+        expected.append(hbc.ibu_contribution(aa[i], mass[i], bv[r], ut, hop_type))
+
+    assert ibus == pytest.approx(expected)
+    assert total == pytest.approx([sum(expected[:3]), sum(expected[3:])])
@@ -0,0 +1,35 @@
+import os
+import re
+import subprocess
+import sys
+
+
+def get_console_scripts():
+    this_dir, this_filename = os.path.split(__file__)
+    with open(os.path.join(this_dir, '..', 'setup.py'), 'r') as f:
+        setup = f.read()
+
+    entries = re.search(r"'console_scripts':\s*\[(.*?)\]", setup, re.S).group(1)
+    return [re.match(r"(\w+)\s*=\s*([\w.]+)\s*:\s*(\w+)$", entry).groups()
+            for entry in re.findall(r"'([^']*)'", entries)]
+
+
+def test_console_scripts_are_lightweight():
+    """Tests that no console script loads cvxpy or scipy at import time.
+
+    These are only needed for the water calculations, and are imported
+    by the functions that use them. See benchmarks/import_time.py for
+    timings.
+
+    """
+    this_dir, this_filename = os.path.split(__file__)
+    code = ('import sys; from {0:s} import {1:s};'
+            ' print(sorted(set(m.split(".")[0] for m in sys.modules)'
+            ' & set(["cvxpy", "scipy", "six"])))')
+
+    scripts = get_console_scripts()
+    assert scripts
+    for name, module, func in scripts:
+        out = subprocess.check_output([sys.executable, '-c', code.format(module, func)],
+                                      cwd=os.path.join(this_dir, '..'))
+        assert out.decode('utf-8').strip() == '[]', name
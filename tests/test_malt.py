@@ -89,11 +89,65 @@ def test_execute():
     assert res['SRM'] == pytest.approx(7.297704408589848)
 
     
-def test_malt_clu():
+def test_malt_clu(tmpdir):
     this_dir, this_filename = os.path.split(__file__)
     beer_recipe = os.path.join(this_dir, 'resources', 'weddingBrown.json')
-    output_recipe = os.path.join(this_dir, 'resources', 'weddingBrown_1.json')
+    output_recipe = str(tmpdir.join('weddingBrown_1.json'))
     testargs = ['malt_composition', beer_recipe, '-o', output_recipe]
     with patch.object(sys, 'argv', testargs):
         hbc.malt_composition.main()
         assert os.path.isfile(output_recipe)
+
+
+def test_batch_execute():
+    """Tests batch malt calculations against execute.
+
+    """
+    config = {
+        'malt': {
+            'Sucrose': {
+                'ppg': 46,
+                'degrees lovibond': 0.
+            },
+            'Munich': {
+                'extract potential': 0.8,
+                'degrees lovibond': 9.
+            }
+        }
+    }
+
+    recipe_configs = [
+        {
+            'Brewhouse Efficiency': 0.7,
+            'Pitchable Volume': '5 gallons',
+            'Water to Grist Ratio': '1.2 quarts_per_pound',
+            'Malt': [
+                {'mass': '5 pounds', 'ppg': 30, 'degrees lovibond': 5.},
+                {'mass': '1 pound', 'name': 'Sucrose'},
+                {'mass': '1 pound', 'name': 'Munich'}
+            ]
+        },
+        {
+            'Brewhouse Efficiency': 0.75,
+            'Pitchable Volume': '10 gallons',
+            'Water to Grist Ratio': '1.5 quarts_per_pound',
+            'Malt': [
+                {'mass': '12 pounds', 'name': 'Munich'},
+                {'mass': '8 ounces', 'name': 'Munich', 'degrees lovibond': 20.}
+            ]
+        }
+    ]
+
+    masses, properties, malts = hbc.compile_grain_bills(config, recipe_configs)
+    assert masses.shape == (2, 4)
+    assert properties.shape == (4, 2)
+
+    res = hbc.batch_execute(config, recipe_configs)
+    for i, recipe_config in enumerate(recipe_configs):
+        _, expected = hbc.malt_composition.execute(config, dict(recipe_config))
+        assert res['Original Gravity'][i] == pytest.approx(expected['Original Gravity'])
+        assert res['SRM'][i] == pytest.approx(expected['SRM'])
+        mwv = float(expected['Mash Water Volume'].split()[0])
+        assert res['Mash Water Volume'][i] == pytest.approx(mwv)
+
+    assert res['Total Grist Mass'] == pytest.approx([7., 12.5])
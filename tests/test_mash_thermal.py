@@ -0,0 +1,146 @@
+import pytest
+import copy
+import json
+import os
+import numpy as np
+from .context import homebrew_calc as hbc
+
+
+def test_cooling():
+    # A single step cools exponentially towards ambient.
+    mass, heat_loss, ambient = 15000., 600., 18.
+    curve = hbc.simulate_mash([67.], [1.5], mass, heat_loss, ambient)
+    assert curve.temperatures.shape == (1, len(curve.times))
+    assert curve.times[-1] == pytest.approx(1.5)
+    expected = ambient + (67. - ambient) * np.exp(-heat_loss * curve.times / mass)
+    assert curve.temperatures[0] == pytest.approx(expected)
+    assert curve.final_temperatures[0, 0] == pytest.approx(expected[-1])
+
+    # The initial cooling rate is the one the coefficient was derived from.
+    rate = 2.2
+    heat_loss = hbc.heat_loss_coefficient(mass, rate, 67., ambient)
+    curve = hbc.simulate_mash([67.], [0.001], mass, heat_loss, ambient, time_step=0.001)
+    assert (67. - curve.final_temperatures[0, 0]) / 0.001 == pytest.approx(rate, rel=1e-3)
+
+
+def test_steps():
+    mass, heat_loss, ambient, boiling = 15000., 600., 18., 100.
+    temperatures = [50., 63., 72.]
+    durations = [0.25, 0.75, 0.2]
+    curve = hbc.simulate_mash(temperatures, durations, mass, heat_loss, ambient, boiling)
+    assert curve.infusions[0, 0] == 0.
+
+    # Each infusion brings the mash from the end of the previous step
+    # up to the next step.
+    mass = 15000.
+    for i in range(1, 3):
+        T = curve.final_temperatures[0, i - 1]
+        added = curve.infusions[0, i]
+        assert (mass * T + added * boiling) / (mass + added) == pytest.approx(temperatures[i])
+        mass += added
+        start = sum(durations[:i])
+        after = np.searchsorted(curve.times, start + 1e-9)
+        assert curve.temperatures[0, after] < temperatures[i]
+        assert curve.temperatures[0, after] > temperatures[i] - 0.1
+
+    # The output resolution does not change the result.
+    coarse = hbc.simulate_mash(temperatures, durations, 15000., heat_loss, ambient, boiling,
+                               time_step=0.3)
+    assert coarse.final_temperatures == pytest.approx(curve.final_temperatures)
+    assert coarse.infusions == pytest.approx(curve.infusions)
+
+    # A step below the mash temperature gets no infusion.
+    curve = hbc.simulate_mash([67., 60.], [0.5, 0.5], 15000., heat_loss, ambient)
+    assert curve.infusions[0, 1] == 0.
+    assert curve.final_temperatures[0, 1] < curve.final_temperatures[0, 0]
+
+
+def test_batch():
+    rng = np.random.RandomState(0)
+    num = 20
+    temperatures = np.column_stack((rng.uniform(45, 55, num), rng.uniform(60, 68, num),
+                                    rng.uniform(74, 78, num)))
+    durations = np.column_stack((rng.uniform(0.1, 0.5, num), rng.uniform(0.5, 1.5, num),
+                                 rng.uniform(0.05, 0.25, num)))
+    # Some schedules have only two steps.
+    durations[:5, 2] = 0.
+    temperatures[:5, 2] = np.nan
+    mass = rng.uniform(8000, 20000, num)
+    heat_loss = rng.uniform(300, 800, num)
+    ambient = rng.uniform(5, 30, num)
+
+    curve = hbc.simulate_mash(temperatures, durations, mass, heat_loss, ambient)
+    assert curve.temperatures.shape == (num, len(curve.times))
+    for i in range(num):
+        steps = 2 if i < 5 else 3
+        single = hbc.simulate_mash(temperatures[i, :steps], durations[i, :steps],
+                                   mass[i], heat_loss[i], ambient[i])
+        assert curve.final_temperatures[i, :steps] == pytest.approx(single.final_temperatures[0])
+        assert curve.infusions[i, :steps] == pytest.approx(single.infusions[0])
+        n = len(single.times)
+        assert curve.temperatures[i, :n] == pytest.approx(single.temperatures[0])
+        assert np.isnan(curve.temperatures[i, n:]).all()
+
+
+def test_brew_day():
+    this_dir, this_filename = os.path.split(__file__)
+    recipe = json.load(open(os.path.join(this_dir, 'resources', 'weddingBrownWater.json'), 'r'))
+    config = hbc.batch.default_config()
+    config['unit_parser'] = hbc.get_unit_parser(config['units'])
+
+    config, out = hbc.brew_day.infusion_mash(config, copy.deepcopy(recipe))
+    final = out['Brew Day']['Final Mash Temperature']
+    # Close to the linear estimate at the configured cooling rate.
+    assert 156 - 4 < final < 156
+    assert final == pytest.approx(156 - 4, abs=0.5)
+
+    # A better insulated mash tun holds its temperature better.
+    config['Mashtun Heat Loss Coefficient'] = '100 calories_per_hour_degC'
+    config, out = hbc.brew_day.infusion_mash(config, copy.deepcopy(recipe))
+    assert final < out['Brew Day']['Final Mash Temperature'] < 156
+
+    recipe['Mash'] = {
+        'type': 'Step',
+        'steps': [{'temperature': 122, 'duration': '15 minutes'},
+                  {'temperature': 148, 'duration': '45 minutes'},
+                  {'temperature': 158, 'duration': '15 minutes'}]
+    }
+    hbc.brew_day.step_mash(config, recipe)
+
+    curve = hbc.brew_day.mash_temperature_curve(config, recipe)
+    assert curve.times[-1] == pytest.approx(1.25)
+    assert curve.final_temperatures.shape == (1, 3)
+    assert (curve.infusions[0, 1:] > 0).all()
+    assert curve.temperatures[0, 0] == pytest.approx(hbc.fahrenheit_to_celsius(122))
+
+
+def test_equipment_profile():
+    this_dir, this_filename = os.path.split(__file__)
+    recipe = json.load(open(os.path.join(this_dir, 'resources', 'weddingBrownWater.json'), 'r'))
+    config = hbc.batch.default_config()
+    config['unit_parser'] = hbc.get_unit_parser(config['units'])
+
+    profile = hbc.get_equipment_profile(config)
+    assert hbc.get_equipment_profile(config) is profile
+    assert hbc.get_equipment_profile(profile) is profile
+    assert profile.mashtun_thermal_mass == pytest.approx(1300.)
+    assert profile.mash_cooling_rate == pytest.approx(4 * 5. / 9)
+    assert profile.sparge_temperature == pytest.approx(hbc.fahrenheit_to_celsius(170))
+    assert profile.heat_loss_coefficient is None
+    assert profile.warnings == ['Assuming Hot Liquor Tank Thermal Mass is the same as the Mashtun Thermal Mass.',
+                                'Assuming Boiling Temperature is 212.0 degF.']
+    with pytest.raises(AttributeError):
+        profile.color = 'stainless'
+
+    # The mash takes the profile in place of the configuration.
+    config, expected = hbc.brew_day.infusion_mash(config, copy.deepcopy(recipe), quiet=True)
+    out_profile, out = hbc.brew_day.infusion_mash(profile, copy.deepcopy(recipe), quiet=True)
+    assert out_profile is profile
+    assert out == expected
+
+    params = hbc.get_common_params(config, recipe, [])
+    assert params[5] == profile.mashtun_thermal_mass and params[-1] == profile.boiling_temperature
+
+    # Changing the configuration gets a new profile.
+    config['Mashtun Thermal Mass'] = '2000 calories_per_degC'
+    assert hbc.get_equipment_profile(config).mashtun_thermal_mass == pytest.approx(2000.)
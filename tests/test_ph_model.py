@@ -0,0 +1,219 @@
+import pytest
+import hashlib
+import json
+import os
+import numpy as np
+from .context import homebrew_calc as hbc
+
+
+def get_config():
+    this_dir, this_filename = os.path.split(hbc.__file__)
+    resources = os.path.join(this_dir, 'resources')
+    config = {
+        'malt': json.load(open(os.path.join(resources, 'malt.json'), 'r')),
+        'water': json.load(open(os.path.join(resources, 'water.json'), 'r')),
+        'unit_parser': hbc.get_unit_parser(os.path.join(resources, 'units.txt')),
+        'mineral_profile': np.array([60., 5., 80., 10., 90., 30.])
+    }
+    data = np.genfromtxt(os.path.join(resources, 'mmole_data.txt'), delimiter=',')
+    recipe_config = {
+        'Mash Water Volume': '3 gallons',
+        'Lactic Acid': '2 milliliters',
+        'Malt': [
+            {'name': 'Maris Otter', 'mass': '8 pounds'},
+            {'name': 'CaraRed', 'mass': '1 pound'},
+            {'name': 'Acidulated Malt', 'mass': '4 ounces'},
+            {'name': 'Chocolate', 'mass': '4 ounces', 'acidity': 40.}
+        ]
+    }
+    return config, recipe_config, data
+
+
+def bisect(f, low, high, tol):
+    while high - low > tol:
+        pH = 0.5 * (low + high)
+        if f(pH) > 0:
+            low = pH
+        else:
+            high = pH
+    return 0.5 * (low + high)
+
+
+def reference_balance(mash_pH, data, config, recipe_config):
+    """The mash pH balance as originally computed by balance_eq, malt
+    by malt, with an interp1d of the charge table.
+
+    """
+    from scipy import interpolate
+
+    up = config['unit_parser']
+    r = config['mineral_profile']
+    lactic_acid_volume = up.convert(recipe_config['Lactic Acid'], 'milliliters')
+    water_volume = up.convert(recipe_config['Mash Water Volume'], 'liters')
+    brewing_water_pH = config['water']['water']['distilled']['pH']
+
+    malt_alkalinity = 0.
+    for x in recipe_config['Malt']:
+        if x['name'] == 'Acidulated Malt':
+            continue
+        m = config['malt'].get(x['name'], {})
+        if 'distilled pH' in x:
+            contribution = (x['distilled pH'] - mash_pH) * x['buffering capacity']
+        elif 'acidity' in x:
+            contribution = -x['acidity']
+        elif x.get('type') == 'crystal' and 'degrees lovibond' in x:
+            contribution = -(0.45 * x['degrees lovibond'] + 6)
+        elif 'distilled pH' in m:
+            contribution = (m['distilled pH'] - mash_pH) * m['buffering capacity']
+        elif 'acidity' in m:
+            contribution = -m['acidity']
+        elif m.get('type') == 'crystal' and 'degrees lovibond' in m:
+            contribution = -(0.45 * m['degrees lovibond'] + 6)
+        else:
+            contribution = 0.
+        malt_alkalinity += up.convert(x['mass'], 'kilograms') * contribution
+
+    charge_per_mmole = interpolate.interp1d(data[:, 0], data[:, 1])
+    total_alkalinity = (r[5] - (100 / 0.17) * lactic_acid_volume / water_volume) / 50
+    delta_c0 = charge_per_mmole(4.3) - charge_per_mmole(brewing_water_pH)
+    delta_cz = charge_per_mmole(mash_pH) - charge_per_mmole(brewing_water_pH)
+    z_alkalinity = total_alkalinity * delta_cz / delta_c0
+    z_ra = z_alkalinity - (r[0] * 2 / 40.078) / 3.5 - (r[1] * 2 / 24.305) / 7
+    return z_ra * water_volume + malt_alkalinity
+
+
+def test_balance():
+    """Tests the compiled balance equation, including on arrays.
+
+    """
+    config, recipe_config, data = get_config()
+    model = hbc.MashPHModel.from_recipe(config, recipe_config, data)
+    pH = np.array([4.65, 5.25, 5.85, 7.95])
+    expected = [reference_balance(p, data, config, recipe_config) for p in pH]
+    assert model.balance(pH) == pytest.approx(expected)
+
+    eps = 1e-6
+    slope = (model.balance(pH + eps) - model.balance(pH - eps)) / (2 * eps)
+    assert model.derivative(pH) == pytest.approx(slope, rel=1e-4)
+
+    # 4 ounces of acidulated malt out of 9.5 pounds.
+    assert model.acidulated_delta == pytest.approx(100 * 0.1 * 0.25 / 9.5)
+
+
+def test_solve():
+    """Tests the root finder against bisection.
+
+    """
+    config, recipe_config, data = get_config()
+    for lactic_acid in ['0 milliliters', '2 milliliters', '8 milliliters']:
+        recipe_config['Lactic Acid'] = lactic_acid
+        model = hbc.MashPHModel.from_recipe(config, recipe_config, data)
+        pH, evaluations = model.solve(full_output=True)
+        assert pH == pytest.approx(bisect(model.balance, 4.5, 8.5, 1e-9), abs=1e-8)
+        assert evaluations < 22
+
+
+def test_solve_no_sign_change():
+    """Tests that the bracket endpoint is returned without a root.
+
+    """
+    config, recipe_config, data = get_config()
+    recipe_config['Lactic Acid'] = '100 milliliters'
+    model = hbc.MashPHModel.from_recipe(config, recipe_config, data)
+    assert model.solve() == 4.5
+
+
+def test_charge_table():
+    """Tests the charge table, its sidecar, and the shared instance.
+
+    """
+    this_dir, this_filename = os.path.split(hbc.__file__)
+    filename = os.path.join(this_dir, 'resources', 'mmole_data.txt')
+    data = np.genfromtxt(filename, delimiter=',')
+
+    # The packaged sidecar must be kept in sync with the text file.
+    with np.load(os.path.join(this_dir, 'resources', 'mmole_data.npz')) as sidecar:
+        assert np.array_equal(sidecar['data'], data)
+        with open(filename, 'rb') as f:
+            assert str(sidecar['source']) == hashlib.sha256(f.read()).hexdigest()
+
+    table = hbc.get_charge_table(filename)
+    assert hbc.get_charge_table(filename) is table
+
+    pH = np.array([3.5, 4.0, 4.37, 5.5, 6.93, 9.0])
+    expected = [np.interp(p, data[:, 0], data[:, 1]) for p in pH]
+    assert table(pH) == pytest.approx(expected)
+    assert table(pH[3]) == pytest.approx(expected[3])
+    assert table.derivative(3.5) == 0.
+
+
+def test_stale_sidecar(tmpdir):
+    """Tests that an edited text file wins over its sidecar, whatever
+    the modification times.
+
+    """
+    filename = str(tmpdir.join('mmole.txt'))
+    sidecar = str(tmpdir.join('mmole.npz'))
+    np.savetxt(filename, [[4., 1.], [6., 2.]], delimiter=',')
+    hbc.ChargeTable([[4., 1.], [6., 1.5]]).save(sidecar, filename)
+    os.utime(sidecar, (1e9, 1e9))
+    # The sidecar, older than the text file, is used while it matches.
+    assert hbc.ChargeTable.from_file(filename)(5.) == pytest.approx(1.25)
+    table = hbc.get_charge_table(filename)
+    assert hbc.get_charge_table(filename) is table
+
+    np.savetxt(filename, [[4., 1.], [6., 3.]], delimiter=',')
+    os.utime(filename, (5e8, 5e8))
+    assert hbc.ChargeTable.from_file(filename)(5.) == pytest.approx(2.)
+    assert hbc.get_charge_table(filename)(5.) == pytest.approx(2.)
+
+    # Without the text file, the sidecar is used.
+    os.remove(filename)
+    assert hbc.ChargeTable.from_file(filename)(5.) == pytest.approx(1.25)
+
+
+def test_batch_solve():
+    """Tests the lockstep solver against the single-recipe one.
+
+    """
+    config, recipe_config, data = get_config()
+    recipe_configs = []
+    for lactic_acid in ['0 milliliters', '2 milliliters', '8 milliliters', '100 milliliters']:
+        for chocolate in ['0 ounces', '4 ounces', '1 pound']:
+            r = dict(recipe_config, **{'Lactic Acid': lactic_acid})
+            r['Malt'] = recipe_config['Malt'][:3] + [
+                dict(recipe_config['Malt'][3], mass=chocolate)]
+            recipe_configs.append(r)
+
+    model = hbc.BatchMashPHModel.from_recipes(config, recipe_configs, data)
+    pH, converged = model.solve()
+    for i, r in enumerate(recipe_configs):
+        single = hbc.MashPHModel.from_recipe(config, r, data)
+        assert pH[i] == pytest.approx(single.solve(), abs=1e-8)
+        assert model.acidulated_delta[i] == pytest.approx(single.acidulated_delta)
+
+    # With 100 milliliters of lactic acid, the balance does not change
+    # sign: the bracket endpoint is returned, but not as converged.
+    assert converged[:-3].all()
+    assert not converged[-3:].any()
+    assert (pH[-3:] == 4.5).all()
+
+    # Cut off after one iteration, no recipe converges.
+    pH, converged = model.solve(max_iter=1)
+    assert not converged.any()
+
+
+def test_batch_rice_hulls():
+    """Tests that rice hulls enter the batch balance as they do the
+    single-recipe one.
+
+    """
+    config, recipe_config, data = get_config()
+    recipe_config['Malt'].append({'name': 'Rice Hulls', 'mass': '8 ounces',
+                                  'acidity': 20.})
+    model = hbc.BatchMashPHModel.from_recipes(config, [recipe_config], data)
+    single = hbc.MashPHModel.from_recipe(config, recipe_config, data)
+    pH, converged = model.solve()
+    assert converged[0]
+    assert pH[0] == pytest.approx(single.solve(), abs=1e-8)
+    assert model.acidulated_delta[0] == pytest.approx(single.acidulated_delta)
@@ -0,0 +1,73 @@
+import pytest
+import json
+import os
+import sys
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from .context import homebrew_calc as hbc
+
+
+def get_recipe():
+    this_dir, this_filename = os.path.split(__file__)
+    recipe_config = json.load(open(os.path.join(this_dir, 'resources', 'weddingBrown.json'), 'r'))
+    water = json.load(open(os.path.join(this_dir, 'resources', 'weddingBrownWater.json'), 'r'))
+    recipe_config['Water Profile'] = water['Water Profile']
+    recipe_config.pop('Brew Day', None)
+    return recipe_config
+
+
+def test_brew_pipeline(capsys):
+    """The pipeline matches running the stages one by one."""
+    config = hbc.pipeline_config()
+    config['Solution Cache'] = False
+    expected = get_recipe()
+    for stage, func in hbc.pipeline.STAGES:
+        getattr(hbc, stage).execute(config, expected, quiet=True)
+
+    recipe_config = get_recipe()
+    seen = []
+    out = hbc.brew_pipeline(config, recipe_config,
+                            callback=lambda stage, result: seen.append(stage))
+    assert capsys.readouterr() == ('', '')
+    assert out.recipe_config is recipe_config
+    assert json.dumps(recipe_config, sort_keys=True) == json.dumps(expected, sort_keys=True)
+
+    stages = [stage for stage, func in hbc.pipeline.STAGES]
+    assert seen == stages
+    assert [stage for stage, result in out.results] == stages
+    assert [stage for stage, seconds in out.timings] == stages
+    assert all(seconds >= 0 for stage, seconds in out.timings)
+    assert isinstance(dict(out.results)['brew_day'], hbc.BrewDayResult)
+
+    stages = ['malt_composition', 'water_composition', 'hop_composition']
+    out = hbc.brew_pipeline(config, get_recipe(), stages)
+    assert [stage for stage, result in out.results] == stages
+    assert 'IBUs' in out.recipe_config and 'Brew Day' not in out.recipe_config
+
+    with pytest.raises(ValueError):
+        hbc.brew_pipeline(config, get_recipe(), ['mill'])
+
+
+def test_brew_pipeline_main(tmpdir, capsys):
+    recipe_file = str(tmpdir.join('recipe.json'))
+    output_file = str(tmpdir.join('out.json'))
+    json.dump(get_recipe(), open(recipe_file, 'w'))
+
+    with patch.object(sys, 'argv', ['brew_pipeline', recipe_file, '-o', output_file,
+                                    '--no-cache']):
+        hbc.brew_pipeline_main()
+
+    printed, err = capsys.readouterr()
+    for stage, func in hbc.pipeline.STAGES:
+        assert '{0:s}: '.format(stage) in printed
+    assert 'Total: ' in printed
+    out = json.load(open(output_file, 'r'))
+    assert 'Brew Day' in out and 'IBUs' in out
+
+    with patch.object(sys, 'argv', ['brew_pipeline', recipe_file, '-q', '--stages',
+                                    'malt_composition']):
+        hbc.brew_pipeline_main()
+    assert capsys.readouterr() == ('', '')
@@ -0,0 +1,109 @@
+import pytest
+import copy
+import json
+import os
+import pickle
+from .context import homebrew_calc as hbc
+
+
+def get_config():
+    this_dir, this_filename = os.path.split(hbc.__file__)
+    config = hbc.batch.default_config()
+    config['hop'] = json.load(open(os.path.join(this_dir, 'resources',
+                                                config['files']['hops']), 'r'))
+    config['Solution Cache'] = False
+    return config
+
+
+STAGES = ['malt_composition', 'water_composition', 'hop_composition',
+          'yeast_composition', 'brew_day']
+
+
+def get_recipe(config, until=None):
+    """Recipe, with the fields appended by the stages before until."""
+    this_dir, this_filename = os.path.split(__file__)
+    recipe_config = json.load(open(os.path.join(this_dir, 'resources', 'weddingBrown.json'), 'r'))
+    recipe_config['Water Profile'] = get_water_profile()
+    recipe_config.pop('Brew Day', None)
+    for stage in STAGES[:STAGES.index(until) if until else None]:
+        getattr(hbc, stage).execute(config, recipe_config, quiet=True)
+    return recipe_config
+
+
+def get_water_profile():
+    this_dir, this_filename = os.path.split(__file__)
+    recipe_config = json.load(open(os.path.join(this_dir, 'resources', 'weddingBrownWater.json'), 'r'))
+    return recipe_config['Water Profile']
+
+
+def test_result():
+    result = hbc.YeastResult(attenuation=0.75)
+    assert result.attenuation == 0.75 and result.final_gravity is None
+    assert result.warnings == []
+    with pytest.raises(AttributeError):
+        result.color = 'amber'
+    with pytest.raises(TypeError):
+        hbc.YeastResult(color='amber')
+
+    assert hbc.StepMashResult.fields()[0] == 'mash_water_volume'
+    assert hbc.StepMashResult.fields()[-1] == 'mash_out_volume'
+
+    result.assume('Pitchable volume not specified')
+    out = pickle.loads(pickle.dumps(result))
+    assert out.as_dict() == result.as_dict()
+    assert out.as_dict()['warnings'] == ['Pitchable volume not specified']
+
+
+@pytest.mark.parametrize('stage', STAGES)
+def test_quiet(stage, capsys):
+    """Stages print nothing when quiet, and otherwise print the report
+    of their result."""
+    config = get_config()
+    recipe_config = get_recipe(config, stage)
+    assert capsys.readouterr() == ('', '')
+
+    loud = copy.deepcopy(recipe_config)
+    module = getattr(hbc, stage)
+    out_config, out = module.execute(config, loud)
+    assert out is loud
+    printed, err = capsys.readouterr()
+    assert printed
+
+    quiet = copy.deepcopy(recipe_config)
+    module.execute(config, quiet, quiet=True)
+    assert capsys.readouterr() == ('', '')
+    assert json.dumps(quiet, sort_keys=True, default=str) == \
+        json.dumps(loud, sort_keys=True, default=str)
+
+    func = getattr(module, {'malt_composition': 'malt_result',
+                            'water_composition': 'water_result',
+                            'hop_composition': 'hop_result',
+                            'yeast_composition': 'yeast_result',
+                            'brew_day': 'brew_day_result'}[stage])
+    result = func(config, copy.deepcopy(recipe_config))
+    assert capsys.readouterr() == ('', '')
+    assert hbc.render(result) + '\n' == printed
+
+
+def test_results():
+    config = get_config()
+    config.pop('Pitchable Volume', None)
+    recipe_config = get_recipe(config, 'malt_composition')
+    recipe_config.pop('Pitchable Volume')
+
+    malt = hbc.malt_composition.malt_result(config, recipe_config)
+    assert malt.original_gravity == recipe_config['Original Gravity']
+    assert malt.warnings == ['Pitchable volume not specified, assuming 5.25 gallons']
+
+    water = hbc.water_composition.water_result(config, recipe_config)
+    assert water.mash_ph.mash_ph == recipe_config['Mash pH']
+    assert dict(water.salts.mineral_profile)['chloride'] == pytest.approx(100.)
+    assert water.salts.lactic_acid is None
+
+    recipe_config['Brew Day'] = {'Pre-Boil Volume': '6.5 gallons', 'Pre-Boil Gravity': 1.04}
+    brew_day = hbc.brew_day.brew_day_result(config, recipe_config)
+    assert isinstance(brew_day.mash, hbc.InfusionMashResult)
+    assert brew_day.mash.final_temperature == recipe_config['Brew Day']['Final Mash Temperature']
+    assert brew_day.lauter.efficiency == recipe_config['Brew Day']['Brewhouse Efficiency']
+    assert brew_day.boil.hop_additions == [(60., 0.75, 'EK Goldings', 'pellets')]
+    assert 'Efficiency: ' in hbc.render(brew_day)
@@ -0,0 +1,277 @@
+import pytest
+import json
+import os
+import numpy as np
+from .context import homebrew_calc as hbc
+
+
+def get_targets(target):
+    this_dir, this_filename = os.path.split(hbc.__file__)
+    resources = os.path.join(this_dir, 'resources')
+    config = {
+        'water': json.load(open(os.path.join(resources, 'water.json'), 'r')),
+        'unit_parser': hbc.get_unit_parser(os.path.join(resources, 'units.txt'))
+    }
+    recipe_config = {
+        'Water Profile': {
+            'saltAdditions': {'Food-grade Chalk': '0 grams'},
+            'target': target
+        }
+    }
+    return hbc.get_targets(config, recipe_config)
+
+
+def test_constraints():
+    """Tests that the solution honors the constraints from get_targets.
+
+    """
+    (waters, salts, minerals, tgt_cmp, cl_to_sl, res_alk,
+     Aw, As, B, b, C, c, rac) = get_targets({'chlorideToSulfateRatio': 2,
+                                             'residualAlkalinity': -20})
+    optimizer = hbc.get_salt_optimizer(Aw, As, rac)
+    assert hbc.get_salt_optimizer(Aw, As, rac) is optimizer
+
+    x_waters, x_salts = optimizer.solve(tgt_cmp, cl_to_sl, res_alk, B, b, C, c)
+    x_mp = Aw.dot(x_waters) + As.dot(x_salts)
+    assert x_waters.sum() == pytest.approx(1.)
+    assert (x_salts >= -1e-6).all()
+    assert rac.dot(x_mp) == pytest.approx(-20, abs=1e-4)
+    assert x_mp[minerals.index('chloride')] == pytest.approx(
+        2 * x_mp[minerals.index('sulfate')], abs=1e-4)
+    assert (C.dot(x_mp) <= c + 1e-4).all()
+    assert x_salts[salts.index('Food-grade Chalk')] == pytest.approx(0., abs=1e-6)
+
+
+def test_retarget():
+    """Tests that re-targeting matches solving from scratch.
+
+    """
+    (waters, salts, minerals, tgt_cmp, cl_to_sl, res_alk,
+     Aw, As, B, b, C, c, rac) = get_targets({'chlorideToSulfateRatio': 1,
+                                             'residualAlkalinity': 0})
+    optimizer = hbc.get_salt_optimizer(Aw, As, rac)
+    optimizer.solve(tgt_cmp, cl_to_sl, res_alk, B, b, C, c)
+
+    tgt_cmp = [60., None, None, None, None, None]
+    x_waters, x_salts = optimizer.solve(tgt_cmp, None, -10, B, b, C, c)
+    fresh = hbc.SaltOptimizer(Aw, As, rac)
+    expected = fresh.solve(tgt_cmp, None, -10, B, b, C, c, backend='cvxpy',
+                           warm_start=False)
+    assert optimizer.objective(x_waters, x_salts) == pytest.approx(
+        fresh.objective(*expected), rel=1e-6)
+    assert Aw.dot(x_waters)[0] + As.dot(x_salts)[0] == pytest.approx(60., abs=1e-4)
+
+
+@pytest.mark.parametrize('chloride_to_sulfate', [0.5, 1., 2., 3.])
+@pytest.mark.parametrize('residual_alkalinity', [-60, -20, 0, 20])
+@pytest.mark.parametrize('calcium', [None, 40., 120.])
+def test_backend_parity(chloride_to_sulfate, residual_alkalinity, calcium):
+    """Tests that the simplex and cvxpy backends agree.
+
+    The problem is a linear program and its solution need not be
+    unique, so we compare objective values and constraints.
+
+    """
+    target = {'chlorideToSulfateRatio': chloride_to_sulfate,
+              'residualAlkalinity': residual_alkalinity}
+    if calcium is not None:
+        target['calcium'] = calcium
+
+    (waters, salts, minerals, tgt_cmp, cl_to_sl, res_alk,
+     Aw, As, B, b, C, c, rac) = get_targets(target)
+    optimizer = hbc.get_salt_optimizer(Aw, As, rac)
+
+    solutions = {}
+    for backend in ['simplex', 'cvxpy']:
+        try:
+            solutions[backend] = optimizer.solve(tgt_cmp, cl_to_sl, res_alk,
+                                                 B, b, C, c, backend=backend)
+        except ValueError:
+            solutions[backend] = None
+
+    if solutions['cvxpy'] is None:
+        assert solutions['simplex'] is None
+        return
+
+    x_waters, x_salts = solutions['simplex']
+    x_mp = Aw.dot(x_waters) + As.dot(x_salts)
+    assert optimizer.objective(x_waters, x_salts) == pytest.approx(
+        optimizer.objective(*solutions['cvxpy']), rel=1e-6, abs=1e-6)
+    assert x_waters.sum() == pytest.approx(1.)
+    assert (x_salts >= 0).all()
+    assert rac.dot(x_mp) == pytest.approx(residual_alkalinity, abs=1e-6)
+    assert (C.dot(x_mp) <= c + 1e-6).all()
+
+
+def test_fallback():
+    """Tests that 'auto' falls back on cvxpy, which reports infeasibility.
+
+    """
+    (waters, salts, minerals, tgt_cmp, cl_to_sl, res_alk,
+     Aw, As, B, b, C, c, rac) = get_targets({'residualAlkalinity': 500})
+    optimizer = hbc.get_salt_optimizer(Aw, As, rac)
+    with pytest.raises(ValueError):
+        optimizer.solve(tgt_cmp, cl_to_sl, res_alk, B, b, C, c, backend='simplex')
+    with pytest.raises(ValueError):
+        optimizer.solve(tgt_cmp, cl_to_sl, res_alk, B, b, C, c)
+    assert optimizer.backend == 'cvxpy'
+    with pytest.raises(ValueError):
+        optimizer.solve(tgt_cmp, cl_to_sl, res_alk, B, b, C, c, backend='glpk')
+
+
+def test_sweep():
+    """Tests that a sweep matches solving each grid point separately.
+
+    """
+    (waters, salts, minerals, tgt_cmp, cl_to_sl, res_alk,
+     Aw, As, B, b, C, c, rac) = get_targets({'calcium': 50,
+                                             'residualAlkalinity': 0})
+    optimizer = hbc.get_salt_optimizer(Aw, As, rac)
+    rows = []
+    for ratio in [0.5, 1., 2.]:
+        row = np.zeros((len(minerals),))
+        row[minerals.index('chloride')] = 1
+        row[minerals.index('sulfate')] = -ratio
+        rows.append(row)
+    residual_alkalinity = [-60., -20., 0., 40., 500.]
+
+    res = optimizer.sweep(rows, residual_alkalinity, tgt_cmp, B, b, C, c)
+    assert res['feasible'].shape == (3, 5)
+    assert not res['feasible'][:, -1].any()
+    assert np.isnan(res['objective'][:, -1]).all()
+    assert (res['residual_alkalinity_range'][:, 1] < 500).all()
+
+    fresh = hbc.SaltOptimizer(Aw, As, rac)
+    for i, row in enumerate(rows):
+        for j, ra in enumerate(residual_alkalinity[:-1]):
+            x_waters, x_salts = fresh.solve(tgt_cmp, row, ra, B, b, C, c,
+                                            warm_start=False)
+            assert res['feasible'][i, j]
+            assert res['objective'][i, j] == pytest.approx(
+                fresh.objective(x_waters, x_salts), rel=1e-6, abs=1e-6)
+            assert rac.dot(res['mineral_profile'][i, j]) == pytest.approx(ra, abs=1e-4)
+
+
+def random_waters(num_waters, seed=0):
+    rng = np.random.RandomState(seed)
+    high = np.array([150., 40., 250., 80., 150., 300.])
+    Aw = rng.uniform(0.05, 1., (6, num_waters)) * high[:, None]
+    Aw[:, 0] = 0.
+    return Aw
+
+
+@pytest.mark.parametrize('residual_alkalinity', [-60, 0, 40])
+def test_screening(residual_alkalinity):
+    """Tests that screening a large catalog of waters matches solving
+    over all of them.
+
+    """
+    (waters, salts, minerals, tgt_cmp, cl_to_sl, res_alk,
+     Aw, As, B, b, C, c, rac) = get_targets({'calcium': 40, 'magnesium': 5,
+                                             'sulfate': 40, 'chloride': 90,
+                                             'residualAlkalinity': residual_alkalinity})
+    Aw = random_waters(2 * hbc.salt_optimizer.SCREEN_WATERS)
+    optimizer = hbc.SaltOptimizer(Aw, As, rac)
+    x_waters, x_salts = optimizer.solve(tgt_cmp, cl_to_sl, res_alk, B, b, C, c)
+    assert len(optimizer._working) < Aw.shape[1]
+
+    lp = optimizer._standard_form()
+    x, status, basis = hbc.salt_optimizer._simplex(*lp[:5])
+    assert status == 0
+    assert optimizer.objective(x_waters, x_salts) == pytest.approx(lp[0].dot(x), abs=1e-6)
+
+    # Warm start from the working set of the previous solve.
+    x_waters, x_salts = optimizer.solve(tgt_cmp, cl_to_sl, res_alk + 10, B, b, C, c)
+    fresh = hbc.SaltOptimizer(Aw, As, rac)
+    expected = fresh.solve(tgt_cmp, cl_to_sl, res_alk + 10, B, b, C, c,
+                           warm_start=False)
+    assert optimizer.objective(x_waters, x_salts) == pytest.approx(
+        fresh.objective(*expected), abs=1e-6)
+
+
+def test_max_sources():
+    """Tests limiting the number of waters blended.
+
+    """
+    (waters, salts, minerals, tgt_cmp, cl_to_sl, res_alk,
+     Aw, As, B, b, C, c, rac) = get_targets({'calcium': 40, 'sulfate': 40,
+                                             'chloride': 90,
+                                             'residualAlkalinity': -60})
+    Aw = random_waters(40, seed=1)
+    optimizer = hbc.SaltOptimizer(Aw, As, rac)
+    x_waters, x_salts = optimizer.solve(tgt_cmp, cl_to_sl, res_alk, B, b, C, c)
+    unlimited = optimizer.objective(x_waters, x_salts)
+
+    for max_sources in [1, 2]:
+        x_waters, x_salts = optimizer.solve(tgt_cmp, cl_to_sl, res_alk, B, b, C, c,
+                                            max_sources=max_sources)
+        x_mp = Aw.dot(x_waters) + As.dot(x_salts)
+        assert (x_waters > 1e-9).sum() <= max_sources
+        assert x_waters.sum() == pytest.approx(1.)
+        assert rac.dot(x_mp) == pytest.approx(-60, abs=1e-6)
+        assert (C.dot(x_mp) <= c + 1e-6).all()
+        assert optimizer.objective(x_waters, x_salts) >= unlimited - 1e-6
+
+    with pytest.raises(ValueError):
+        optimizer.solve(tgt_cmp, cl_to_sl, res_alk, B, b, C, c, backend='cvxpy',
+                        max_sources=1)
+
+
+@pytest.mark.parametrize('criterion', ['worst', 'expected'])
+def test_robust(criterion):
+    """Tests that the robust solution beats the nominal one on its
+    criterion, and honors the mineral bounds in every scenario.
+
+    """
+    (waters, salts, minerals, tgt_cmp, cl_to_sl, res_alk,
+     Aw, As, B, b, C, c, rac) = get_targets({'calcium': 50, 'sulfate': 80,
+                                             'chloride': 90,
+                                             'residualAlkalinity': -20})
+    Aw = np.column_stack((Aw[:, 0], [40., 8., 30., 20., 35., 120.],
+                          [90., 20., 60., 30., 70., 250.]))
+    rng = np.random.RandomState(0)
+    Aw_scenarios = np.repeat(Aw[None], 50, axis=0)
+    Aw_scenarios[:, :, 1:] *= rng.lognormal(0., 0.2, (50, 6, 2))
+    targets = [i for i, t in enumerate(tgt_cmp) if t is not None]
+
+    def deviations(x_waters, x_salts):
+        x_mp = Aw_scenarios.dot(x_waters) + As.dot(x_salts)
+        return (x_salts.sum()
+                + np.abs(x_mp[:, targets] - np.array(tgt_cmp)[targets].astype(float)).sum(axis=1)
+                + np.abs(x_mp.dot(rac) - res_alk))
+
+    optimizer = hbc.SaltOptimizer(Aw, As, rac)
+    nominal = deviations(*optimizer.solve(tgt_cmp, cl_to_sl, res_alk, B, b, C, c))
+    x_waters, x_salts = optimizer.solve_robust(Aw_scenarios, tgt_cmp, cl_to_sl,
+                                               res_alk, B, b, C, c, criterion)
+    robust = deviations(x_waters, x_salts)
+    assert x_waters.sum() == pytest.approx(1.)
+    assert x_salts[salts.index('Food-grade Chalk')] == pytest.approx(0., abs=1e-9)
+    x_mp = Aw_scenarios.dot(x_waters) + As.dot(x_salts)
+    assert (x_mp.dot(C.T) <= c + 1e-6).all()
+    if criterion == 'worst':
+        assert robust.max() <= nominal.max() + 1e-6
+    else:
+        assert robust.mean() <= nominal.mean() + 1e-6
+
+    # With a single scenario, the nominal solution is optimal too.
+    x = optimizer.solve_robust(Aw[None], tgt_cmp, cl_to_sl, res_alk, B, b, C, c,
+                               criterion)
+    assert optimizer.objective(*x) == pytest.approx(
+        optimizer.objective(*optimizer.solve(tgt_cmp, cl_to_sl, res_alk, B, b, C, c)),
+        abs=1e-6)
+
+
+def test_linprog_method():
+    """Tests that the robust problem falls back on the interior-point
+    method with scipy older than 1.6, which has no HiGHS."""
+    import scipy
+    try:
+        from unittest.mock import patch
+    except ImportError:
+        from mock import patch
+
+    with patch.object(scipy, '__version__', '1.5.4'):
+        assert hbc.salt_optimizer._linprog_method() == ('interior-point', {'sparse': True})
+    with patch.object(scipy, '__version__', '1.10.0rc1'):
+        assert hbc.salt_optimizer._linprog_method() == ('highs', None)
@@ -0,0 +1,91 @@
+import pytest
+import json
+import os
+from unit_parser import unit_parser
+from .context import homebrew_calc as hbc
+
+
+def get_units():
+    this_dir, this_filename = os.path.split(hbc.__file__)
+    return os.path.join(this_dir, 'resources', 'units.txt')
+
+
+def test_cached_conversion():
+    """Tests that cached conversions match unit_parser.
+
+    """
+    up = unit_parser(get_units())
+    cup = hbc.CachedUnitParser(get_units())
+    assert cup.convert('6 pounds', 'kilograms') == pytest.approx(up.convert('6 pounds', 'kilograms'))
+    assert cup.convert(6, 'pounds', 'kilograms') == pytest.approx(up.convert(6, 'pounds', 'kilograms'))
+    assert cup.convert('6 pounds', 'kilograms') == pytest.approx(up.convert('6 pounds', 'kilograms'))
+
+    info = cup.cache_info()
+    assert info.hits == 1
+    assert info.misses == 1
+    assert info.factor_hits == 1
+    assert info.factor_misses == 1
+    assert info.currsize == 1
+
+    with pytest.raises(ValueError):
+        cup.convert('6 pounds', 'gallons')
+
+
+def test_cache_eviction():
+    """Tests least-recently-used eviction.
+
+    """
+    cup = hbc.CachedUnitParser(get_units(), maxsize=2)
+    cup.convert('1 pound', 'ounces')
+    cup.convert('2 pounds', 'ounces')
+    cup.convert('1 pound', 'ounces')
+    cup.convert('3 pounds', 'ounces')
+    assert cup.cache_info().currsize == 2
+
+    # '2 pounds' was least recently used, so it was evicted.
+    cup.convert('1 pound', 'ounces')
+    assert cup.cache_info().hits == 2
+    cup.convert('2 pounds', 'ounces')
+    assert cup.cache_info().misses == 4
+
+    cup.cache_clear()
+    assert cup.cache_info() == (0, 0, 0, 0, 2, 0)
+
+
+def test_shared_unit_parser(tmpdir, monkeypatch):
+    """Tests the process-wide unit parser registry and its snapshot.
+
+    """
+    monkeypatch.setenv('HOMEBREW_CALC_CACHE_DIR', str(tmpdir.join('cache')))
+    units = tmpdir.join('units.txt')
+    units.write(open(get_units()).read())
+    hbc.clear_unit_parsers()
+
+    up = hbc.get_unit_parser(str(units))
+    assert hbc.get_unit_parser(str(units)) is up
+    assert len(tmpdir.join('cache').listdir()) == 1
+
+    # A new process would load the snapshot instead of parsing.
+    loaded = hbc.load_unit_parser(str(units))
+    assert loaded._units == up.parser._units
+    assert loaded.convert('6 pounds', 'kilograms') == pytest.approx(2.72155422)
+
+    # A malformed snapshot is ignored, and replaced.
+    snapshot = tmpdir.join('cache').listdir()[0]
+    data = json.loads(snapshot.read())
+    data['units']['pound']['signature'] = 'import os'
+    snapshot.write(json.dumps(data))
+    loaded = hbc.load_unit_parser(str(units))
+    assert loaded.convert('6 pounds', 'kilograms') == pytest.approx(2.72155422)
+    assert json.loads(snapshot.read())['units'] == up.parser._units
+    snapshot.write('not json')
+    assert hbc.load_unit_parser(str(units))._units == up.parser._units
+
+    # Modifying the unit definitions invalidates both.
+    units.write('\nstone: 14 pounds\n', mode='a')
+    os.utime(str(units), (0, 12345))
+    up2 = hbc.get_unit_parser(str(units))
+    assert up2 is not up
+    assert up2.convert('1 stone', 'pounds') == pytest.approx(14)
+    assert hbc.load_unit_parser(str(units)).convert('1 stone', 'pounds') == pytest.approx(14)
+    hbc.clear_unit_parsers()
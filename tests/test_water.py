@@ -1,6 +1,9 @@
 import pytest
+import copy
+import json
 import sys
 import os
+import numpy as np
 try:
     from unittest.mock import patch
 except ImportError:
@@ -39,11 +42,169 @@ def test_ph_temp_clu():
         assert res == expected
 
 
-def test_functional():
+def test_functional(tmpdir):
     this_dir, this_filename = os.path.split(__file__)
     beer_recipe = os.path.join(this_dir, 'resources', 'weddingBrownWater.json')
-    output_recipe = os.path.join(this_dir, 'resources', 'weddingBrownWater_1.json')
+    output_recipe = str(tmpdir.join('weddingBrownWater_1.json'))
     testargs = ['water_composition', beer_recipe, '-o', output_recipe]
     with patch.object(sys, 'argv', testargs):
         hbc.water_composition.main()
         assert os.path.isfile(output_recipe)
+
+
+def test_batch_mash_ph():
+    this_dir, this_filename = os.path.split(hbc.__file__)
+    resources = os.path.join(this_dir, 'resources')
+    config = {
+        'units': os.path.join(resources, 'units.txt'),
+        'malt': json.load(open(os.path.join(resources, 'malt.json'), 'r')),
+        'water': json.load(open(os.path.join(resources, 'water.json'), 'r')),
+        'mineral_profile': np.array([60., 5., 80., 10., 90., 30.])
+    }
+    config['unit_parser'] = hbc.get_unit_parser(config['units'])
+    recipe_config = {
+        'Mash Water Volume': '3 gallons',
+        'Malt': [
+            {'name': 'Maris Otter', 'mass': '8 pounds'},
+            {'name': 'CaraRed', 'mass': '1 pound'},
+            {'name': 'Acidulated Malt', 'mass': '4 ounces'}
+        ]
+    }
+    recipe_configs = []
+    for lactic_acid in ['0 milliliters', '1 milliliters', '3 milliliters']:
+        r = copy.deepcopy(recipe_config)
+        r['Lactic Acid'] = lactic_acid
+        recipe_configs.append(r)
+
+    res = hbc.batch_mash_ph(config, recipe_configs)
+    assert res['Converged'].all()
+    for i, r in enumerate(recipe_configs):
+        hbc.mash_ph(config, r)
+        assert res['Mash pH'][i] == pytest.approx(r['Mash pH'], abs=1e-6)
+
+
+def test_solution_cache(tmpdir, monkeypatch):
+    monkeypatch.setenv('HOMEBREW_CALC_CACHE_DIR', str(tmpdir))
+    this_dir, this_filename = os.path.split(hbc.__file__)
+    resources = os.path.join(this_dir, 'resources')
+    config = {
+        'water': json.load(open(os.path.join(resources, 'water.json'), 'r')),
+        'unit_parser': hbc.get_unit_parser(os.path.join(resources, 'units.txt'))
+    }
+    recipe_config = {
+        'Water Profile': {
+            'target': {'chlorideToSulfateRatio': 2, 'residualAlkalinity': -20}
+        }
+    }
+
+    config, expected = hbc.salt_additions(config, copy.deepcopy(recipe_config))
+    entries = tmpdir.join('water').listdir()
+    assert len(entries) == 1
+
+    # Hits come from the cache, so tamper with the entry to tell.
+    entry = json.loads(entries[0].read())
+    entry['mineral_profile'][0] += 1
+    entries[0].write(json.dumps(entry))
+    config, res = hbc.salt_additions(config, copy.deepcopy(recipe_config))
+    assert res['Salts'] == expected['Salts']
+    assert (res['Water Profile Achieved']['calcium']
+            == pytest.approx(expected['Water Profile Achieved']['calcium'] + 1))
+
+    config, res = hbc.salt_additions(config, copy.deepcopy(recipe_config),
+                                     use_cache=False)
+    assert res['Water Profile Achieved'] == pytest.approx(expected['Water Profile Achieved'])
+
+
+def test_salt_sweep():
+    this_dir, this_filename = os.path.split(hbc.__file__)
+    resources = os.path.join(this_dir, 'resources')
+    config = {
+        'units': os.path.join(resources, 'units.txt'),
+        'water': json.load(open(os.path.join(resources, 'water.json'), 'r'))
+    }
+    recipe_config = {
+        'Water Profile': {
+            'saltAdditions': {},
+            'target': {'chlorideToSulfateRatio': 1, 'residualAlkalinity': 0}
+        }
+    }
+
+    res = hbc.salt_sweep(config, recipe_config, [0.5, 2.], [-20., 0., 20.])
+    assert res['feasible'].all()
+    assert res['salts'].shape == (2, 3, len(res['salt_names']))
+    mp = res['mineral_profile']
+    chloride = mp[..., res['minerals'].index('chloride')]
+    sulfate = mp[..., res['minerals'].index('sulfate')]
+    assert chloride[0] == pytest.approx(0.5 * sulfate[0], abs=1e-4)
+    assert chloride[1] == pytest.approx(2. * sulfate[1], abs=1e-4)
+
+
+def test_acidify_mash():
+    this_dir, this_filename = os.path.split(hbc.__file__)
+    resources = os.path.join(this_dir, 'resources')
+    config = {
+        'units': os.path.join(resources, 'units.txt'),
+        'malt': json.load(open(os.path.join(resources, 'malt.json'), 'r')),
+        'water': json.load(open(os.path.join(resources, 'water.json'), 'r')),
+        'Solution Cache': False
+    }
+    config['unit_parser'] = hbc.get_unit_parser(config['units'])
+    recipe_config = {
+        'Mash Water Volume': '3 gallons',
+        'Malt': [
+            {'name': 'Maris Otter', 'mass': '8 pounds'},
+            {'name': 'CaraRed', 'mass': '1 pound'},
+            {'name': 'Acidulated Malt', 'mass': '2 ounces'}
+        ],
+        'Water Profile': {
+            'target': {'chlorideToSulfateRatio': 0.5, 'residualAlkalinity': 20}
+        },
+        'Target Mash pH': 5.3
+    }
+
+    config, recipe_config = hbc.acidify_mash(config, recipe_config)
+    assert 'Salts' in recipe_config
+    assert float(recipe_config['Lactic Acid'].split()[0]) > 0
+    assert recipe_config['Mash pH'] == pytest.approx(5.3, abs=5e-3)
+    assert recipe_config['Mash pH Evaluations'] > 1
+
+    # Same as mash_ph, given the lactic acid.
+    pH = recipe_config['Mash pH']
+    hbc.mash_ph(config, recipe_config)
+    assert recipe_config['Mash pH'] == pytest.approx(pH, abs=1e-6)
+
+    # Unreachable with acid.
+    config, recipe_config = hbc.acidify_mash(config, recipe_config, target_pH=6.5)
+    assert recipe_config['Lactic Acid'] == '0.00 milliliters'
+    assert recipe_config['Mash pH'] < 6.5
+
+
+def test_robust_salt_additions():
+    this_dir, this_filename = os.path.split(hbc.__file__)
+    resources = os.path.join(this_dir, 'resources')
+    config = {
+        'units': os.path.join(resources, 'units.txt'),
+        'water': json.load(open(os.path.join(resources, 'water.json'), 'r'))
+    }
+    config['water']['water']['tap'] = {'calcium': 40, 'magnesium': 8,
+                                       'sulfate': 30, 'sodium': 20,
+                                       'chloride': 35, 'alkalinity': 120}
+    recipe_config = {
+        'Water Profile': {
+            'target': {'calcium': 50, 'chlorideToSulfateRatio': 1,
+                       'residualAlkalinity': 0}
+        }
+    }
+    scenarios = [{'tap': {'calcium': 40 + k, 'sulfate': 30 - k, 'chloride': 35,
+                          'alkalinity': 100 + 5 * k}}
+                 for k in range(10)]
+
+    res = hbc.robust_salt_additions(config, recipe_config, scenarios)
+    assert res['mineral_profile'].shape == (10, len(res['minerals']))
+    assert res['waters'].sum() == pytest.approx(1.)
+    assert res['residual_alkalinity'].shape == (10,)
+    calcium = res['mineral_profile'][:, res['minerals'].index('calcium')]
+    assert (calcium >= 50 - 1e-6).all()
+
+    with pytest.raises(ValueError):
+        hbc.robust_salt_additions(config, recipe_config, [{'well': {}}])
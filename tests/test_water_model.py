@@ -0,0 +1,104 @@
+import pytest
+import copy
+import json
+import os
+import numpy as np
+from .context import homebrew_calc as hbc
+
+
+def get_config():
+    this_dir, this_filename = os.path.split(hbc.__file__)
+    resources = os.path.join(this_dir, 'resources')
+    config = {
+        'water': json.load(open(os.path.join(resources, 'water.json'), 'r')),
+        'unit_parser': hbc.get_unit_parser(os.path.join(resources, 'units.txt'))
+    }
+    return config
+
+
+def test_water_model():
+    config = get_config()
+    model = hbc.get_water_model(config)
+    assert hbc.get_water_model(config) is model
+    assert hbc.get_water_model(get_config()) is model
+
+    assert model.waters == list(config['water']['water'].keys())
+    assert model.salts == list(config['water']['salts'].keys())
+    chalk = config['water']['salts']['Food-grade Chalk']
+    j = model.salt_ids['Food-grade Chalk']
+    assert model.As[model.mineral_ids['calcium'], j] == chalk['calcium']
+    assert model.As[model.mineral_ids['alkalinity'], j] == pytest.approx(
+        chalk['carbonate'] * 50. / 61)
+    with pytest.raises(ValueError):
+        model.Aw[0, 0] = 1.
+
+    # Constraints: minimum and maximum calcium, etc.
+    assert model.C.shape == (7, 6)
+    assert (model.C.dot(np.full((6,), 100.)) <= model.c).all()
+
+
+def test_invalidation():
+    config = get_config()
+    model = hbc.get_water_model(config)
+
+    water = copy.deepcopy(config['water'])
+    water['water']['tap'] = {'calcium': 40, 'alkalinity': 80}
+    config['water'] = water
+    updated = hbc.get_water_model(config)
+    assert updated is not model
+    assert updated.waters[-1] == 'tap'
+    assert updated.Aw.shape == (6, model.Aw.shape[1] + 1)
+
+
+def test_targets():
+    model = hbc.get_water_model(get_config())
+    tgt = {'calcium': 50, 'magnesium': 10, 'sulfate': 100, 'sodium': 20,
+           'chloride': 50, 'carbonate': 61}
+    tgt_cmp, cl_to_sl, res_alk = model.targets(tgt)
+    assert tgt_cmp[model.mineral_ids['alkalinity']] == pytest.approx(50.)
+    assert res_alk == pytest.approx(50. - 50 / 1.4 - 10 / 1.7, abs=1e-6)
+    assert cl_to_sl.dot(tgt_cmp) == pytest.approx(0.)
+
+    tgt_cmp, cl_to_sl, res_alk = model.targets({'calcium': 50})
+    assert res_alk is None
+    assert cl_to_sl is None
+
+
+def test_get_targets():
+    config = get_config()
+    recipe_config = {
+        'Water Profile': {
+            'target': {'chlorideToSulfateRatio': 2},
+            'mineralConstraints': {'sodium': {'maximum': 50}}
+        }
+    }
+    (waters, salts, minerals, tgt_cmp, cl_to_sl, res_alk,
+     Aw, As, B, b, C, c, rac) = hbc.get_targets(config, recipe_config)
+    default_salts = config['water']['defaultSaltAdditions']
+    assert B.shape == (len(default_salts), len(salts))
+    assert (b == 0).all()
+    assert C.shape == (1, len(minerals))
+    assert c[0] == 50
+    assert res_alk is None
+
+
+def test_scenario_matrices():
+    config = get_config()
+    config['water']['water']['tap'] = {'calcium': 40, 'magnesium': 8,
+                                       'sulfate': 30, 'alkalinity': 120}
+    model = hbc.get_water_model(config)
+    j = model.water_ids['tap']
+    Aw_scenarios = model.scenario_matrices([{}, {'tap': {'calcium': 45, 'carbonate': 61}}])
+    assert Aw_scenarios.shape == (2,) + model.Aw.shape
+    assert (Aw_scenarios[0] == model.Aw).all()
+
+    # Minerals missing from the report keep their nominal content.
+    tap = dict(zip(model.minerals, Aw_scenarios[1, :, j]))
+    assert tap['calcium'] == 45
+    assert tap['alkalinity'] == pytest.approx(50.)
+    assert tap['magnesium'] == 8
+    assert tap['sulfate'] == 30
+    assert tap['sodium'] == 0
+
+    with pytest.raises(ValueError):
+        model.scenario_matrices([{'well': {}}])
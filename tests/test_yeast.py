@@ -1,4 +1,15 @@
 import pytest
+import sys
+import numpy as np
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
 from .context import homebrew_calc as hbc
 
 
@@ -50,3 +61,52 @@ def test_deg_plato_to_gravity():
     sg = 1.050
     deg_plato = 12.5
     assert hbc.deg_plato_to_gravity(deg_plato) == sg
+
+
+def test_abv_calc_array():
+    """Tests calculating ABV on arrays, choosing the formula per element.
+
+    """
+    og = np.array([1.050, 1.100])
+    fg = np.array([1.010, 1.020])
+    expected = [hbc.abv_calc(1.050, 1.010), hbc.abv_calc(1.100, 1.020)]
+    assert expected[1] == pytest.approx(hbc.abv_calc(1.100, 1.020, simple=False))
+    assert hbc.abv_calc(og, fg) == pytest.approx(expected)
+    assert hbc.abv_calc(og, fg, simple=True) == pytest.approx((og - fg) * 1.3125)
+    assert hbc.attenuation(og, fg) == pytest.approx([0.8, 0.8])
+    assert hbc.predict_final_gravity(og, 0.8) == pytest.approx(fg)
+    assert hbc.gravity_to_deg_plato(og) == pytest.approx([12.5, 25.])
+    assert hbc.deg_plato_to_gravity([12.5, 25.]) == pytest.approx(og)
+
+
+def test_abv_stream():
+    """Tests streaming ABV calculations in chunks.
+
+    """
+    infile = StringIO('batch,OG,FG\n1,1.050,1.010\n\n2,1.100,1.020\n3,1.040,1.008\n')
+    outfile = StringIO()
+    assert hbc.abv_stream(infile, outfile, chunk_size=2) == 3
+
+    lines = outfile.getvalue().splitlines()
+    assert lines[0] == 'batch,OG,FG,abv,attenuation'
+    assert len(lines) == 4
+    batch, og, fg, abv, att = lines[2].split(',')
+    assert batch == '2'
+    assert float(abv) == pytest.approx(hbc.abv_calc(1.100, 1.020), abs=1e-6)
+    assert float(att) == pytest.approx(0.8)
+
+    with pytest.raises(ValueError):
+        hbc.abv_stream(StringIO('batch,original,final\n1,1.050,1.010\n'), StringIO())
+
+
+def test_abvcalc_clu_batch(capsys):
+    """Tests the abvcalc command line script in batch mode.
+
+    """
+    testargs = ['abvcalc', '--batch', '-']
+    with patch.object(sys, 'argv', testargs):
+        with patch.object(sys, 'stdin', StringIO('1.050,1.010\n')):
+            hbc.yeast_composition.abvcalc_main()
+
+    out, err = capsys.readouterr()
+    assert out == '1.050,1.010,0.052500,0.800000\n'